@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Exercise Media Pipeline
+
+Processing stages for the GIFs in public/exercise-gifs. Each stage records
+its results in public/exercise-gifs/media-manifest.json so rebuilds only
+redo what changed.
+
+Usage:
+    python3 scripts/media_pipeline.py <command> [options]
+    python3 scripts/media_pipeline.py --help
+
+Commands:
+    discover      Find real GIF URLs from site sitemaps and exercise pages (cached)
+    fetch         Resumable download of every exercise the download scripts list
+    loop-trim     Trim multi-rep GIFs to a single seamless repetition
+    encode        Smallest GIF/WebP encode above an SSIM threshold
+    audit         Check the catalog for missing, orphaned, truncated or corrupt files
+    placeholders  BlurHash/LQIP placeholders, intrinsic size and dominant colour
+    sprites       Pack first-frame posters into sprite sheets for list views
+    precache      Usage-ranked service-worker precache manifest within a byte budget
+    weight        Media bytes per workout and the assets that weigh most
+    pack          Single-file indexed media packs (build, list, get, bench)
+    publish       Publish manifest of dist/ and the delta against the deployed one
+    release       Versioned catalog snapshots with atomic switch and rollback
+    queue         Shared SQLite work queue for multi-worker builds
+    sources       Raw-source cache: status, import, restore, quota, gc
+    serve         On-demand resized/WebP variants with an LRU disk cache
+    watch         Rebuild only the affected media steps when inputs change
+    mock-origin   Local HTTPS origin (h2 + HTTP/1.1) for testing the fetcher
+"""
+
+import argparse
+import sys
+
+from pipeline import (audit, discover, encode, fetch, loop_trim, mock_origin, pack, placeholders, precache,
+                      publish, release, sourcecache, sprites, variants, watch, weight, workqueue)
+from pipeline.config import PipelineError
+
+COMMANDS = [
+    discover,
+    fetch,
+    loop_trim,
+    encode,
+    placeholders,
+    audit,
+    sprites,
+    precache,
+    weight,
+    pack,
+    publish,
+    release,
+    workqueue,
+    sourcecache,
+    variants,
+    watch,
+    mock_origin,
+]
+
+def main():
+    parser = argparse.ArgumentParser(description="Exercise media pipeline")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for command in COMMANDS:
+        command.register(subparsers)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n\n⚠️  Cancelled")
+        sys.exit(1)
+    except PipelineError as e:
+        print(f"\n❌ {e}")
+        sys.exit(1)
@@ -0,0 +1,6 @@
+"""
+Exercise media pipeline
+
+Shared building blocks for the exercise GIF scripts: manifest handling,
+frame analysis and the processing stages run by scripts/media_pipeline.py
+"""
@@ -0,0 +1,296 @@
+"""
+Catalog integrity audit
+
+Checks public/exercise-gifs against what references it:
+
+    missing      referenced by exerciseMedia.js or the manifest, not on disk
+    truncated    file ends early (no GIF trailer, short RIFF body, tiny file)
+    undecodable  not a GIF/WebP, or a malformed block structure
+    orphaned     GIF on disk that exerciseMedia.js never references
+    stale        manifest hash differs from the file (a stage was bypassed)
+
+The download scripts only check `size > 1000`, so a cut-off transfer or an
+HTML error page with a .gif name passes them.
+
+Each file is checked without decoding pixels. Its GIF block structure is
+walked (header, colour tables, extensions, image data sub-blocks, trailer),
+or its RIFF length is compared for WebP. Hashing and checking run in a
+process pool over mmap'd files. Results are cached in
+.media-cache/audit-cache.json by (inode, mtime, size), so an unchanged tree
+is only stat()ed. --deep also fully decodes every frame with Pillow.
+
+The exit status is 1 when anything is missing, truncated or undecodable,
+so the audit can gate a build.
+
+Usage:
+    python3 scripts/media_pipeline.py audit
+    python3 scripts/media_pipeline.py audit --deep --json audit.json
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from .catalog import load_media_map
+from .config import CACHE_DIR, OUTPUT_DIR, PipelineError
+from .fetcher import GIF_SIGNATURES, MIN_VALID_BYTES
+from .manifest import MANIFEST_PATH, load_manifest, write_json
+
+AUDIT_CACHE_PATH = CACHE_DIR / "audit-cache.json"
+CACHE_VERSION = 1
+AUDITED_SUFFIXES = ('.gif', '.webp')
+# Below this many changed files the pool costs more than it saves
+POOL_THRESHOLD = 8
+
+class Truncated(Exception):
+    pass
+
+class Malformed(Exception):
+    pass
+
+def _skip_sub_blocks(data, pos):
+    """Skip a chain of GIF data sub-blocks; returns the position after the terminator"""
+    size = len(data)
+    while True:
+        if pos >= size:
+            raise Truncated("ends inside image data")
+        length = data[pos]
+        pos += 1 + length
+        if length == 0:
+            return pos
+
+def check_gif(data):
+    """Walk the block structure of a GIF; returns {frames, width, height}"""
+    if len(data) < 13:
+        raise Truncated("shorter than a GIF header")
+    if bytes(data[:6]) not in GIF_SIGNATURES:
+        raise Malformed("not a GIF (bad signature)")
+    width = int.from_bytes(data[6:8], 'little')
+    height = int.from_bytes(data[8:10], 'little')
+    flags = data[10]
+    pos = 13
+    if flags & 0x80:
+        pos += 3 * (2 << (flags & 0x07))
+
+    frames = 0
+    size = len(data)
+    while True:
+        if pos >= size:
+            raise Truncated(f"no trailer after {frames} frame(s)")
+        block = data[pos]
+        if block == 0x3B:
+            break
+        if block == 0x21:
+            if pos + 2 > size:
+                raise Truncated("ends inside an extension")
+            pos = _skip_sub_blocks(data, pos + 2)
+        elif block == 0x2C:
+            if pos + 10 > size:
+                raise Truncated("ends inside an image descriptor")
+            local = data[pos + 9]
+            pos += 10
+            if local & 0x80:
+                pos += 3 * (2 << (local & 0x07))
+            # LZW minimum code size, then the image data
+            pos = _skip_sub_blocks(data, pos + 1)
+            frames += 1
+        else:
+            raise Malformed(f"unknown block 0x{block:02x} at byte {pos}")
+    if frames == 0:
+        raise Malformed("no image data")
+    return {"frames": frames, "width": width, "height": height}
+
+def check_webp(data):
+    """Compare the RIFF length field with the file size"""
+    if len(data) < 12:
+        raise Truncated("shorter than a RIFF header")
+    if bytes(data[:4]) != b'RIFF' or bytes(data[8:12]) != b'WEBP':
+        raise Malformed("not a WebP (bad RIFF header)")
+    expected = int.from_bytes(data[4:8], 'little') + 8
+    if len(data) < expected:
+        raise Truncated(f"{len(data)} of {expected} bytes")
+    return {}
+
+def deep_decode(path):
+    """Decode every frame with Pillow; returns an error string or None"""
+    from .frames import require_imaging
+    _, Image = require_imaging()
+    try:
+        with Image.open(path) as im:
+            for index in range(getattr(im, 'n_frames', 1)):
+                im.seek(index)
+                im.load()
+    except Exception as e:
+        return f"Pillow: {e}"
+    return None
+
+def inspect_file(path, deep=False):
+    """Hash and structurally check one file (runs in a pool worker)"""
+    path = Path(path)
+    result = {"sha256": None, "status": "ok", "detail": None}
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            result.update(sha256=hashlib.sha256().hexdigest(), status="truncated", detail="empty file")
+            return result
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            result["sha256"] = hashlib.sha256(data).hexdigest()
+            try:
+                info = check_gif(data) if path.suffix == '.gif' else check_webp(data)
+                result.update(info)
+            except Truncated as e:
+                result.update(status="truncated", detail=str(e))
+            except Malformed as e:
+                result.update(status="undecodable", detail=str(e))
+    if result["status"] == "ok" and path.suffix == '.gif' and size <= MIN_VALID_BYTES:
+        result.update(status="truncated", detail=f"only {size} bytes")
+    if result["status"] == "ok" and deep:
+        error = deep_decode(path)
+        if error:
+            result.update(status="undecodable", detail=error)
+    result["deep"] = deep
+    return result
+
+def _inspect_batch(paths, deep):
+    return [inspect_file(path, deep) for path in paths]
+
+def load_cache(path=AUDIT_CACHE_PATH):
+    try:
+        with open(path, 'r') as f:
+            cache = json.load(f)
+        if cache.get("version") == CACHE_VERSION:
+            return cache
+    except (OSError, ValueError):
+        pass
+    return {"version": CACHE_VERSION, "files": {}}
+
+def stat_key(stat):
+    return [stat.st_ino, stat.st_mtime_ns, stat.st_size]
+
+def scan(directory, cache, deep=False, workers=None):
+    """{filename: result} for every audited file, re-inspecting only changed ones; returns (results, inspected)"""
+    files = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.endswith(AUDITED_SUFFIXES) and entry.is_file():
+                files[entry.name] = stat_key(entry.stat())
+
+    results = {}
+    todo = []
+    for name, key in files.items():
+        cached = cache["files"].get(name)
+        if cached and cached["stat"] == key and (cached["result"].get("deep") or not deep):
+            results[name] = cached["result"]
+        else:
+            todo.append(name)
+
+    if len(todo) < POOL_THRESHOLD:
+        inspected = [inspect_file(directory / name, deep) for name in todo]
+    else:
+        workers = workers or os.cpu_count() or 1
+        batches = [todo[i::workers] for i in range(workers)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            outputs = pool.map(_inspect_batch, [[str(directory / name) for name in batch] for batch in batches],
+                               [deep] * len(batches))
+            by_name = {}
+            for batch, output in zip(batches, outputs):
+                by_name.update(zip(batch, output))
+        inspected = [by_name[name] for name in todo]
+
+    for name, result in zip(todo, inspected):
+        results[name] = result
+    cache["files"] = {name: {"stat": files[name], "result": results[name]} for name in files}
+    return results, len(todo)
+
+def cross_check(results, media_map, manifest):
+    """Findings {kind: [(filename, detail)]} from file results, the mapping and the manifest"""
+    findings = {"missing": [], "truncated": [], "undecodable": [], "orphaned": [], "stale": []}
+    referenced = {}
+    for exercise, (filename, _) in sorted(media_map.items()):
+        referenced.setdefault(filename, []).append(exercise)
+
+    for filename, exercises in sorted(referenced.items()):
+        if filename not in results:
+            findings["missing"].append((filename, f"exerciseMedia.js: {', '.join(exercises)}"))
+
+    for filename, result in sorted(results.items()):
+        if result["status"] != "ok":
+            findings[result["status"]].append((filename, result["detail"]))
+        if filename.endswith('.gif') and filename not in referenced:
+            findings["orphaned"].append((filename, "not in exerciseMedia.js"))
+
+    for filename, entry in sorted(manifest["assets"].items()):
+        if filename not in results:
+            if filename in referenced:
+                continue
+            findings["missing"].append((filename, "manifest entry without a file"))
+            continue
+        recorded = entry.get("sha256")
+        if recorded and recorded != results[filename]["sha256"]:
+            findings["stale"].append((filename, "manifest sha256 differs from the file"))
+        for fmt, record in sorted((entry.get("encode") or {}).items()):
+            output = record.get("output")
+            if not output or output == filename:
+                continue
+            if output not in results:
+                findings["missing"].append((output, f"{fmt} encode of {filename} in the manifest"))
+            elif record.get("output_sha256") and record["output_sha256"] != results[output]["sha256"]:
+                findings["stale"].append((output, f"differs from the manifest's {fmt} encode record"))
+    return findings
+
+FINDING_LABELS = [
+    ("missing", "❌", "Missing"),
+    ("truncated", "❌", "Truncated"),
+    ("undecodable", "❌", "Undecodable"),
+    ("orphaned", "⚠️ ", "Orphaned"),
+    ("stale", "⚠️ ", "Stale manifest"),
+]
+ERROR_KINDS = ("missing", "truncated", "undecodable")
+
+def run(args):
+    started = time.perf_counter()
+    if not args.dir.is_dir():
+        raise PipelineError(f"Catalog directory not found: {args.dir}")
+    media_map = load_media_map()
+    manifest = load_manifest(args.manifest)
+    cache = load_cache()
+
+    results, inspected = scan(args.dir, cache, args.deep, args.workers)
+    write_json(AUDIT_CACHE_PATH, cache)
+    findings = cross_check(results, media_map, manifest)
+    elapsed = time.perf_counter() - started
+
+    print("🩺 Catalog audit\n")
+    print(f"  Files:   {len(results)} in {args.dir}")
+    print(f"  Checked: {inspected} changed, {len(results) - inspected} from the stat cache"
+          f"{' (deep decode)' if args.deep else ''}\n")
+    for kind, icon, label in FINDING_LABELS:
+        for filename, detail in findings[kind]:
+            print(f"  {icon} {label}: {filename} ({detail})")
+
+    print("\n" + "="*60)
+    for kind, icon, label in FINDING_LABELS:
+        print(f"{icon} {label}: {len(findings[kind])}")
+    print(f"⏱️  {elapsed * 1000:.0f} ms")
+    print("="*60 + "\n")
+
+    if args.json:
+        write_json(args.json, {kind: [{"file": filename, "detail": detail} for filename, detail in items]
+                               for kind, items in findings.items()})
+        print(f"📄 Findings written to {args.json}\n")
+    if any(findings[kind] for kind in ERROR_KINDS):
+        sys.exit(1)
+
+def register(subparsers):
+    parser = subparsers.add_parser('audit', help='Check the catalog for missing, orphaned, truncated or corrupt files')
+    parser.add_argument('--dir', type=Path, default=OUTPUT_DIR, help='Catalog directory (default: public/exercise-gifs)')
+    parser.add_argument('--manifest', type=Path, default=MANIFEST_PATH, help='Media manifest to cross-check')
+    parser.add_argument('--deep', action='store_true', help='Also decode every frame with Pillow')
+    parser.add_argument('--workers', type=int, help='Hashing processes (default: one per CPU)')
+    parser.add_argument('--json', type=Path, help='Also write the findings as JSON')
+    parser.set_defaults(func=run)
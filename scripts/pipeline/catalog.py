@@ -0,0 +1,52 @@
+"""
+Exercise catalog
+
+Reads the exercise → GIF mapping from src/utils/exerciseMedia.js so the
+pipeline works from the same source of truth as the app. The section
+comments in the mapping ("// Chest Exercises") become categories.
+"""
+
+import re
+
+from .config import PROJECT_ROOT, PipelineError
+
+MEDIA_MAP_PATH = PROJECT_ROOT / "src" / "utils" / "exerciseMedia.js"
+
+_SECTION_RE = re.compile(r"^\s*//\s*(\w+)\s+Exercises\s*$")
+_ENTRY_RE = re.compile(r"""^\s*(['"])(.+?)\1\s*:\s*(['"])(.+?)\3\s*,?\s*$""")
+
+def load_media_map(path=MEDIA_MAP_PATH):
+    """Parse exerciseMediaMap into {exercise name: (filename, category)}
+
+    Later duplicates win, matching how the JS object literal behaves.
+    """
+    if not path.exists():
+        raise PipelineError(f"Media mapping not found: {path}")
+
+    media_map = {}
+    category = 'other'
+    in_map = False
+    with open(path, 'r') as f:
+        for line in f:
+            if not in_map:
+                in_map = line.strip().startswith('const exerciseMediaMap')
+                continue
+            if line.strip().startswith('};'):
+                break
+
+            section = _SECTION_RE.match(line)
+            if section:
+                category = section.group(1).lower()
+                continue
+
+            entry = _ENTRY_RE.match(line)
+            if entry:
+                media_map[entry.group(2)] = (entry.group(4), category)
+    return media_map
+
+def file_categories(media_map):
+    """Map each referenced filename to the first category that uses it"""
+    categories = {}
+    for filename, category in media_map.values():
+        categories.setdefault(filename, category)
+    return categories
@@ -0,0 +1,64 @@
+"""
+Shared paths and helpers for the media pipeline
+"""
+
+from pathlib import Path
+
+PIPELINE_DIR = Path(__file__).parent
+SCRIPT_DIR = PIPELINE_DIR.parent
+PROJECT_ROOT = SCRIPT_DIR.parent
+OUTPUT_DIR = PROJECT_ROOT / "public" / "exercise-gifs"
+CACHE_DIR = PROJECT_ROOT / ".media-cache"
+
+class PipelineError(Exception):
+    """Raised when a pipeline stage cannot run"""
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+def to_kebab_case(text):
+    """Convert exercise name to kebab-case filename"""
+    return text.lower().replace(' ', '-').replace('_', '-')
+
+def format_size(size_bytes):
+    """Format bytes to MB"""
+    return f"{size_bytes / (1024 * 1024):.2f} MB"
+
+def parse_size(value):
+    """Parse a byte size like '5MB', '750KB' or '1048576'"""
+    units = {'': 1, 'B': 1, 'K': 1024, 'KB': 1024, 'M': 1024 ** 2, 'MB': 1024 ** 2, 'G': 1024 ** 3, 'GB': 1024 ** 3}
+    text = str(value).strip().upper().replace(' ', '')
+    number = text.rstrip('KMGB')
+    unit = text[len(number):]
+    if unit not in units or not number:
+        raise PipelineError(f"Invalid size: {value} (use e.g. 5MB, 750KB)")
+    try:
+        return int(float(number) * units[unit])
+    except ValueError:
+        raise PipelineError(f"Invalid size: {value} (use e.g. 5MB, 750KB)")
+
+def parse_duration(value):
+    """Parse a duration like '60s', '5m', '1h' or '90' (seconds)"""
+    units = {'': 1, 'S': 1, 'M': 60, 'H': 3600}
+    text = str(value).strip().upper().replace(' ', '')
+    number = text.rstrip('SMH')
+    unit = text[len(number):]
+    if unit not in units or not number:
+        raise PipelineError(f"Invalid duration: {value} (use e.g. 60s, 5m)")
+    try:
+        return float(number) * units[unit]
+    except ValueError:
+        raise PipelineError(f"Invalid duration: {value} (use e.g. 60s, 5m)")
+
+def catalog_files(directory=OUTPUT_DIR):
+    """List the GIFs in the catalog directory, sorted by name"""
+    return sorted(p for p in directory.glob("*.gif") if p.is_file())
+
+def selected_files(names, directory=OUTPUT_DIR):
+    """Resolve filenames given on the command line, or default to the whole catalog"""
+    if not names:
+        return catalog_files(directory)
+    files = [directory / name for name in names]
+    missing = [f.name for f in files if not f.exists()]
+    if missing:
+        raise PipelineError(f"Not found in {directory}: {', '.join(missing)}")
+    return files
@@ -0,0 +1,159 @@
+"""
+Connection setup for the shared fetcher
+
+urllib resolves the hostname on every request and tries the addresses one
+at a time, so on a network with broken IPv6 each request can stall on the
+first AAAA address until the timeout. This module replaces both steps:
+
+    resolve()   getaddrinfo() results cached per host for DNS_TTL seconds
+                (failures for NEGATIVE_TTL), shared by every thread
+    connect()   Happy Eyeballs (RFC 8305): addresses alternate between
+                IPv6 and IPv4, a new attempt starts every ATTEMPT_DELAY
+                while earlier ones are still pending, the first to connect
+                wins and the rest are closed
+
+The HTTP(S) handlers plug both into urllib, so callers keep using
+urllib.request with build_opener(HTTPHandler, HTTPSHandler).
+"""
+
+import errno
+import http.client
+import selectors
+import socket
+import threading
+import time
+import urllib.request
+
+DNS_TTL = 300        # getaddrinfo() exposes no TTL; re-resolve after this long
+NEGATIVE_TTL = 30    # remember hosts that don't resolve, briefly
+ATTEMPT_DELAY = 0.25 # RFC 8305 recommends 250 ms between connection attempts
+
+_cache = {}
+_cache_lock = threading.Lock()
+_host_locks = {}
+
+def _host_lock(key):
+    with _cache_lock:
+        return _host_locks.setdefault(key, threading.Lock())
+
+def resolve(host, port):
+    """getaddrinfo() for a TCP connection, cached; concurrent misses resolve once"""
+    key = (host, port)
+    with _host_lock(key):
+        cached = _cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            if isinstance(cached[1], Exception):
+                raise cached[1]
+            return cached[1]
+        try:
+            infos = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            _cache[key] = (time.monotonic() + NEGATIVE_TTL, e)
+            raise
+        _cache[key] = (time.monotonic() + DNS_TTL, infos)
+        return infos
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+def interleave_families(infos):
+    """Alternate address families, starting with the first one getaddrinfo preferred"""
+    if not infos:
+        return []
+    first = [info for info in infos if info[0] == infos[0][0]]
+    rest = [info for info in infos if info[0] != infos[0][0]]
+    ordered = []
+    for i in range(max(len(first), len(rest))):
+        ordered.extend(group[i] for group in (first, rest) if i < len(group))
+    return ordered
+
+def connect(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+    """Drop-in for socket.create_connection() that races addresses Happy Eyeballs style"""
+    host, port = address
+    if timeout is socket._GLOBAL_DEFAULT_TIMEOUT:
+        timeout = socket.getdefaulttimeout()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    candidates = interleave_families(resolve(host, port))
+
+    selector = selectors.DefaultSelector()
+    pending = []
+    errors = []
+    winner = None
+    next_attempt = time.monotonic()
+    try:
+        while winner is None:
+            now = time.monotonic()
+            if candidates and (now >= next_attempt or not pending):
+                family, type_, proto, _, sockaddr = candidates.pop(0)
+                sock = socket.socket(family, type_, proto)
+                sock.setblocking(False)
+                try:
+                    if source_address:
+                        sock.bind(source_address)
+                    result = sock.connect_ex(sockaddr)
+                except OSError as e:
+                    result = e.errno
+                if result == 0:
+                    winner = sock
+                    break
+                if result in (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN):
+                    selector.register(sock, selectors.EVENT_WRITE, sockaddr)
+                    pending.append(sock)
+                    next_attempt = now + ATTEMPT_DELAY
+                else:
+                    errors.append(OSError(result, f"{sockaddr[0]}: {errno.errorcode.get(result, result)}"))
+                    sock.close()
+                continue
+
+            if not pending:
+                break
+            if deadline is not None and now >= deadline:
+                raise socket.timeout(f"connect to {host}:{port} timed out")
+
+            wait = next_attempt - now if candidates else None
+            if deadline is not None:
+                wait = deadline - now if wait is None else min(wait, deadline - now)
+            for key, _ in selector.select(wait):
+                sock = key.fileobj
+                selector.unregister(sock)
+                pending.remove(sock)
+                error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if error == 0:
+                    winner = sock
+                    break
+                errors.append(OSError(error, f"{key.data[0]}: {errno.errorcode.get(error, error)}"))
+                sock.close()
+                # A failed attempt starts the next one right away
+                next_attempt = time.monotonic()
+    finally:
+        for sock in pending:
+            if sock is not winner:
+                sock.close()
+        selector.close()
+
+    if winner is None:
+        if errors:
+            raise errors[-1]
+        raise OSError(f"no addresses for {host}")
+    winner.setblocking(True)
+    winner.settimeout(timeout)
+    return winner
+
+class HTTPConnection(http.client.HTTPConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = connect
+
+class HTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = connect
+
+class HTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(HTTPConnection, req)
+
+class HTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(HTTPSConnection, req, context=self._context)
@@ -0,0 +1,445 @@
+"""
+Source discovery
+
+Finds the real GIF URL for an exercise instead of guessing upload paths.
+For each site, the sitemaps are streamed through a parser that picks out
+page URLs and image URLs (<loc>, <image:loc>). An exercise whose GIF is
+listed there costs no extra request. Otherwise its exercise page is
+fetched and parsed as it arrives. The read stops as soon as a matching
+GIF shows up.
+
+Pages and sitemaps are fetched concurrently through the per-host limiter.
+Results are cached in .media-cache/discovery.json:
+
+    sitemap indexes      SITEMAP_TTL
+    found mappings       FOUND_TTL
+    misses               MISS_TTL (sites add exercises over time)
+
+A repeat run makes no requests at all until something expires. Fresh found
+mappings are also a fetch source ('discovered', see sources.py).
+
+Usage:
+    python3 scripts/media_pipeline.py discover                  # scrape_all_gifs.py's exercise list
+    python3 scripts/media_pipeline.py discover "Bench Press" Squat
+    python3 scripts/media_pipeline.py discover --refresh
+"""
+
+import codecs
+import importlib
+import json
+import re
+import socket
+import threading
+import time
+import urllib.error
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit
+
+from .config import CACHE_DIR
+from .fetcher import CHUNK_SIZE, CONGESTION_STATUSES, DEFAULT_TIMEOUT, open_url
+from .hostlimits import HostLimiter, host_of
+from .manifest import write_json
+
+DISCOVERY_PATH = CACHE_DIR / "discovery.json"
+DISCOVERY_VERSION = 1
+SITEMAP_TTL = 24 * 3600
+FOUND_TTL = 30 * 24 * 3600
+MISS_TTL = 3 * 24 * 3600
+DEFAULT_WORKERS = 8
+# Timeouts and resets on this many requests in a row mark a host unreachable;
+# DNS failures and refused connections do so at once
+MAX_HOST_FAILURES = 3
+
+# sitemaps: where to start; page_url: exercise page for a slug, used when the
+# sitemap is unavailable; sitemap_match: which child sitemaps list exercises
+Site = namedtuple('Site', ['name', 'sitemaps', 'page_url', 'sitemap_match'])
+
+SITES = [
+    Site('fitnessprogramer',
+         ['https://fitnessprogramer.com/sitemap_index.xml'],
+         'https://fitnessprogramer.com/exercise/{slug}/',
+         r'exercise'),
+]
+
+GIF_URL = re.compile(r'https?://[^\s"\'<>()]+?\.gif\b', re.IGNORECASE)
+URL_ATTRIBUTES = ('src', 'href', 'content', 'data-src', 'data-lazy-src', 'data-gif', 'data-original')
+SRCSET_ATTRIBUTES = ('srcset', 'data-srcset', 'data-lazy-srcset')
+LOC_TAGS = ('loc', 'image:loc')
+
+def slug_of(text):
+    """Lowercase, hyphen-separated form used to compare names and URLs"""
+    return re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-')
+
+def name_keys(name):
+    """Slugs an exercise might be published under ("Push-ups" -> push-ups, push-up)"""
+    slug = slug_of(name)
+    singular = '-'.join(word[:-1] if word.endswith('s') and not word.endswith('ss') else word
+                        for word in slug.split('-'))
+    return [slug] if singular == slug else [slug, singular]
+
+def url_key(url):
+    """Slug of a URL's last path segment, without extension or re-upload suffix"""
+    segment = [part for part in urlsplit(url).path.split('/') if part]
+    if not segment:
+        return ''
+    stem = segment[-1].rsplit('.', 1)[0] if '.' in segment[-1] else segment[-1]
+    return re.sub(r'-\d$', '', slug_of(stem))  # WordPress re-uploads: name-1
+
+class LinkParser(HTMLParser):
+    """Collects GIF URLs and sitemap <loc> entries from HTML or XML fed in chunks"""
+
+    def __init__(self, base_url):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.gifs = []
+        self.locs = []
+        self._seen = set()
+        self._loc = None
+
+    def _add_gif(self, url):
+        url = urljoin(self.base_url, url.strip())
+        if url not in self._seen:
+            self._seen.add(url)
+            self.gifs.append(url)
+
+    def _attribute(self, value):
+        if re.search(r'\.gif(\?|#|$)', value.strip(), re.IGNORECASE):
+            self._add_gif(value)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in LOC_TAGS:
+            self._loc = []
+            return
+        for name, value in attrs:
+            if not value:
+                continue
+            if name in URL_ATTRIBUTES:
+                self._attribute(value)
+            elif name in SRCSET_ATTRIBUTES:
+                for candidate in value.split(','):
+                    if candidate.strip():
+                        self._attribute(candidate.split()[0])
+
+    def handle_endtag(self, tag):
+        if tag in LOC_TAGS and self._loc is not None:
+            url = ''.join(self._loc).strip()
+            self._loc = None
+            if GIF_URL.fullmatch(url):
+                self._add_gif(url)
+            elif url:
+                self.locs.append(url)
+
+    def handle_data(self, data):
+        if self._loc is not None:
+            self._loc.append(data)
+            return
+        # Inline scripts and JSON-LD often carry the full-size URL
+        for match in GIF_URL.finditer(data):
+            self._add_gif(match.group(0))
+
+class DiscoveryCache:
+    """Sitemap indexes and exercise -> GIF mappings, each with its own TTL"""
+
+    def __init__(self, path=DISCOVERY_PATH, refresh=False):
+        self.path = path
+        self.sitemaps = {}
+        self.exercises = {}
+        self._lock = threading.Lock()
+        if path.exists() and not refresh:
+            with open(path, 'r') as f:
+                saved = json.load(f)
+            if saved.get("version") == DISCOVERY_VERSION:
+                self.sitemaps = saved.get("sitemaps", {})
+                self.exercises = saved.get("exercises", {})
+
+    @staticmethod
+    def fresh(entry):
+        if entry is None:
+            return False
+        if "pages" in entry:
+            ttl = SITEMAP_TTL
+        else:
+            ttl = FOUND_TTL if entry.get("url") else MISS_TTL
+        return time.time() - entry["checked"] < ttl
+
+    def exercise(self, name):
+        entry = self.exercises.get(name)
+        return entry if self.fresh(entry) else None
+
+    def put_exercise(self, name, url, page=None, site=None, via=None):
+        with self._lock:
+            self.exercises[name] = {"url": url, "page": page, "site": site, "via": via,
+                                    "checked": round(time.time())}
+
+    def sitemap(self, site):
+        entry = self.sitemaps.get(site)
+        return entry if self.fresh(entry) else None
+
+    def put_sitemap(self, site, pages, gifs):
+        with self._lock:
+            self.sitemaps[site] = {"pages": pages, "gifs": gifs, "checked": round(time.time())}
+
+    def save(self):
+        with self._lock:
+            data = {
+                "version": DISCOVERY_VERSION,
+                "sitemaps": {site: entry for site, entry in self.sitemaps.items() if self.fresh(entry)},
+                "exercises": {name: entry for name, entry in self.exercises.items() if self.fresh(entry)},
+            }
+        write_json(self.path, data)
+
+def _connect_failure(error):
+    """Whether error means the host cannot be reached at all (not just this one request)"""
+    return isinstance(error, (socket.gaierror, ConnectionRefusedError)) or (
+        type(error) is OSError and str(error).startswith('no addresses'))
+
+class Discovery:
+    """Resolves exercise names to GIF URLs with as few requests as possible"""
+
+    def __init__(self, cache=None, limiter=None, timeout=DEFAULT_TIMEOUT, workers=DEFAULT_WORKERS):
+        self.cache = cache or DiscoveryCache()
+        self.limiter = limiter or HostLimiter()
+        self.timeout = timeout
+        self.workers = workers
+        self.requests = 0
+        self.failures = []
+        self.unreachable = set()
+        self._host_failures = {}
+        self._transient = set()
+        self._lock = threading.Lock()
+
+    def stream(self, url, stop=None):
+        """Fetch url through a LinkParser chunk by chunk; None if the request failed
+
+        stop(parser) is checked after every chunk and ends the read early.
+        """
+        host = host_of(url)
+        self.limiter.acquire(host)
+        with self._lock:
+            self.requests += 1
+        parser = LinkParser(url)
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        started = time.monotonic()
+        ttfb = None
+        congested = False
+        try:
+            with open_url(url, self.timeout) as response:
+                ttfb = time.monotonic() - started
+                while True:
+                    chunk = response.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    parser.feed(decoder.decode(chunk))
+                    if stop and stop(parser):
+                        break
+            parser.feed(decoder.decode(b'', final=True))
+            parser.close()
+            with self._lock:
+                self._host_failures.pop(host, None)
+            return parser
+        except urllib.error.HTTPError as e:
+            ttfb = time.monotonic() - started
+            congested = e.code in CONGESTION_STATUSES
+            self._failed(url, f"HTTP {e.code}", transient=congested)
+        except (urllib.error.URLError, OSError) as e:
+            reason = getattr(e, 'reason', e)
+            self._failed(url, str(reason) or type(e).__name__, transient=True)
+            with self._lock:
+                failures = self._host_failures[host] = self._host_failures.get(host, 0) + 1
+                if _connect_failure(reason) or failures >= MAX_HOST_FAILURES:
+                    self.unreachable.add(host)
+        finally:
+            self.limiter.release(host, ttfb, congested)
+        return None
+
+    def _failed(self, url, error, transient=False):
+        with self._lock:
+            self.failures.append((url, error))
+            if transient:
+                self._transient.add(url)
+
+    def site_index(self, site, pool):
+        """{'pages': [...], 'gifs': [...]} from the site's sitemaps, cached for SITEMAP_TTL"""
+        cached = self.cache.sitemap(site.name)
+        if cached:
+            return cached
+        pages = []
+        gifs = []
+        fetched = 0
+        queue = list(site.sitemaps)
+        seen = set(queue)
+        while queue:
+            # Each level (index, then child sitemaps) is fetched concurrently
+            parsers = list(pool.map(self.stream, queue))
+            children = []
+            for parser in parsers:
+                if parser is None:
+                    continue
+                fetched += 1
+                gifs.extend(url for url in parser.gifs if url not in gifs)
+                for loc in parser.locs:
+                    if urlsplit(loc).path.endswith('.xml'):
+                        if loc not in seen:
+                            seen.add(loc)
+                            children.append(loc)
+                    else:
+                        pages.append(loc)
+            # Only the sitemaps that list exercises, if the site names them that way
+            matching = [loc for loc in children if re.search(site.sitemap_match, loc)]
+            queue = matching or children
+        if not fetched:
+            return None
+        self.cache.put_sitemap(site.name, pages, gifs)
+        return self.cache.sitemap(site.name)
+
+    def scan_page(self, name, page):
+        """Best GIF on an exercise page, reading only until a matching one appears"""
+        keys = name_keys(name)
+        parser = self.stream(page, stop=lambda p: any(url_key(url) in keys for url in p.gifs))
+        if parser is None or not parser.gifs:
+            return None
+        for url in parser.gifs:
+            if url_key(url) in keys:
+                return url
+        # The page is this exercise's; its first upload is the demo animation
+        uploads = [url for url in parser.gifs if '/uploads/' in url and host_of(url) == host_of(page)]
+        return uploads[0] if uploads else None
+
+    def resolve(self, names, sites=SITES, on_result=None):
+        """{name: cache entry} for every name; only stale names cause requests
+
+        on_result(name, entry, cached) is called as each name is settled.
+        """
+        results = {}
+        pending = []
+        for name in names:
+            entry = self.cache.exercise(name)
+            if entry:
+                results[name] = entry
+                if on_result:
+                    on_result(name, entry, True)
+            else:
+                pending.append(name)
+
+        unsettled = set()  # lookups that failed on the network, retried next run
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for site in sites:
+                if not pending:
+                    break
+                index = self.site_index(site, pool)
+                gif_by_key = {}
+                page_by_key = {}
+                if index:
+                    for url in index["gifs"]:
+                        gif_by_key.setdefault(url_key(url), url)
+                    for url in index["pages"]:
+                        page_by_key.setdefault(url_key(url), url)
+
+                found = {}
+                targets = {}
+                reachable = host_of(site.page_url) not in self.unreachable
+                for name in pending:
+                    keys = name_keys(name)
+                    gif = next((gif_by_key[key] for key in keys if key in gif_by_key), None)
+                    if gif:
+                        found[name] = (gif, None, 'sitemap')
+                        continue
+                    page = next((page_by_key[key] for key in keys if key in page_by_key), None)
+                    if page is None and index is None:
+                        if not reachable:
+                            # The site is down; don't turn an outage into cached misses
+                            unsettled.add(name)
+                            continue
+                        # No sitemap to go by: one targeted request for the canonical page
+                        page = site.page_url.format(slug=keys[0])
+                    if page:
+                        targets[name] = page
+
+                scanned = pool.map(lambda item: (item[0], item[1], self.scan_page(*item)), targets.items())
+                for name, page, gif in scanned:
+                    if gif:
+                        found[name] = (gif, page, 'page')
+                    elif page in self._transient:
+                        unsettled.add(name)
+
+                for name, (gif, page, via) in found.items():
+                    self.cache.put_exercise(name, gif, page, site.name, via)
+                    results[name] = self.cache.exercise(name)
+                    if on_result:
+                        on_result(name, results[name], False)
+                pending = [name for name in pending if name not in found]
+
+        for name in pending:
+            if name in unsettled:
+                results[name] = {"url": None, "page": None, "site": None, "via": None,
+                                 "checked": None, "failed": True}
+            else:
+                self.cache.put_exercise(name, None)
+                results[name] = self.cache.exercise(name)
+            if on_result:
+                on_result(name, results[name], False)
+        return results
+
+def cached_entries(path=DISCOVERY_PATH):
+    """(exercise name, url) for every fresh discovered mapping; no requests"""
+    cache = DiscoveryCache(path)
+    return [(name, entry["url"]) for name, entry in sorted(cache.exercises.items())
+            if entry["url"] and cache.fresh(entry)]
+
+def default_exercises():
+    """The exercise list scrape_all_gifs.py searches for"""
+    return list(dict.fromkeys(importlib.import_module('scrape_all_gifs').EXERCISES))
+
+def run(args):
+    names = args.names or default_exercises()
+    sites = SITES
+    if args.sitemap:
+        host = host_of(args.sitemap[0])
+        sites = [Site(host, args.sitemap, args.page_url or f"https://{host}/exercise/{{slug}}/", r'.')]
+
+    print("🔎 Source discovery\n")
+    print(f"Resolving {len(names)} exercise(s) via {', '.join(site.name for site in sites)}...\n")
+    cache = DiscoveryCache(refresh=args.refresh)
+    limiter = HostLimiter()
+    discovery = Discovery(cache, limiter, args.timeout, args.workers)
+    settled = []
+
+    def report(name, entry, cached):
+        settled.append(name)
+        progress = f"[{len(settled)}/{len(names)}]"
+        if entry["url"]:
+            how = "cached" if cached else f"via {entry['via']}"
+            print(f"{progress} {name}... ✅ {entry['url']} ({how})")
+        else:
+            note = ' (cached miss)' if cached else ' (request failed, not cached)' if entry.get("failed") else ''
+            print(f"{progress} {name}... ❌{note}")
+
+    try:
+        results = discovery.resolve(names, sites, report)
+    finally:
+        cache.save()
+        limiter.save()
+
+    found = sum(1 for entry in results.values() if entry["url"])
+    print("\n" + "="*60)
+    print(f"✅ Found: {found}")
+    if len(results) > found:
+        print(f"❌ Not found: {len(results) - found}")
+    print(f"🌐 Requests: {discovery.requests}")
+    if discovery.failures:
+        print(f"⚠️  Failed requests: {len(discovery.failures)}")
+    print("="*60)
+    print(f"\n💾 Mappings cached in {cache.path}")
+    print("   Fetch them with: python3 scripts/media_pipeline.py fetch --source discovered\n")
+
+def register(subparsers):
+    parser = subparsers.add_parser('discover', help='Find real GIF URLs from site sitemaps and exercise pages')
+    parser.add_argument('names', nargs='*', help='Exercise names (default: scrape_all_gifs.py list)')
+    parser.add_argument('--refresh', action='store_true', help='Ignore cached sitemaps and mappings')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Concurrent requests')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='Per-request timeout in seconds')
+    parser.add_argument('--sitemap', action='append', help='Crawl this sitemap instead of the built-in sites')
+    parser.add_argument('--page-url', help='Exercise page pattern for --sitemap, with {slug}')
+    parser.set_defaults(func=run)
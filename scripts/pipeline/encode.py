@@ -0,0 +1,237 @@
+"""
+Quality-targeted encoding
+
+For each exercise GIF, search encoder settings for the smallest output whose
+SSIM against the original stays above a threshold:
+
+    webp  quality 5-100 (binary search) x frame step 1/2
+    gif   palette 8-256 colors (binary search) x frame step 1/2
+
+The winning parameters and scores are stored in the manifest. Later runs
+re-encode with the stored parameters when the source changed hash but the
+threshold did not, and skip files whose output is already up to date.
+
+Usage:
+    python3 scripts/media_pipeline.py encode
+    python3 scripts/media_pipeline.py encode --format gif --threshold 0.97
+    python3 scripts/media_pipeline.py encode --research bench-press.gif
+"""
+
+import io
+
+from .config import OUTPUT_DIR, format_size, selected_files
+from .frames import encode_gif, encode_webp, load_clip, write_atomic
+from .journal import Journal
+from .manifest import asset_entry, file_sha256, load_manifest, save_manifest
+from .sourcecache import SourceCache, place_original, stage_input
+from .ssim import clip_ssim
+
+DEFAULT_THRESHOLD = 0.95
+SAMPLE_FRAMES = 8
+
+# (low, high) search range of the quality knob for each format
+PARAM_RANGES = {
+    'webp': (5, 100),
+    'gif': (8, 256),
+}
+
+# Keep every frame, or every second frame (half the FPS)
+FRAME_STEPS = (1, 2)
+
+def reduce_fps(clip, step):
+    """Keep every `step`-th frame, folding the dropped delays into the kept ones"""
+    if step == 1:
+        return clip.frames, clip.durations
+    frames = clip.frames[::step]
+    durations = [sum(clip.durations[i:i + step]) for i in range(0, len(clip.durations), step)]
+    return frames, durations
+
+def encode(clip, fmt, value, step):
+    """Encode a clip with one parameter set and return the bytes"""
+    frames, durations = reduce_fps(clip, step)
+    if fmt == 'webp':
+        return encode_webp(frames, durations, quality=value)
+    return encode_gif(frames, durations, colors=value)
+
+def score(clip, data, samples=SAMPLE_FRAMES):
+    """SSIM of encoded bytes against the original clip"""
+    return clip_ssim(clip, load_clip(io.BytesIO(data)), samples)
+
+def search(clip, fmt, threshold, samples=SAMPLE_FRAMES):
+    """Find the smallest encode meeting the threshold; returns a result dict or None"""
+    best = None
+    for step in FRAME_STEPS:
+        if len(clip.frames) < 2 * step:
+            continue
+        low, high = PARAM_RANGES[fmt]
+
+        # SSIM rises with the quality knob, so binary search for the lowest passing value
+        found = None
+        while low <= high:
+            value = (low + high) // 2
+            data = encode(clip, fmt, value, step)
+            mean, minimum = score(clip, data, samples)
+            if mean >= threshold:
+                found = (value, data, mean, minimum)
+                high = value - 1
+            else:
+                low = value + 1
+
+        if found and (best is None or len(found[1]) < len(best["data"])):
+            value, data, mean, minimum = found
+            best = {"value": value, "frame_step": step, "data": data, "ssim": mean, "ssim_min": minimum}
+    return best
+
+def output_path(filepath, fmt):
+    """Where the encoded variant is written"""
+    return filepath if fmt == 'gif' else filepath.with_suffix(f".{fmt}")
+
+def encode_file(filepath, manifest, fmt, threshold, research=False, samples=SAMPLE_FRAMES, cache=None):
+    """Encode one asset; returns (status, record)
+
+    With a source cache, untrimmed assets are encoded from the held original
+    instead of from an earlier encode.
+    """
+    entry = asset_entry(manifest, filepath.name)
+    records = entry.setdefault("encode", {})
+    previous = records.get(fmt)
+    target = output_path(filepath, fmt)
+    source = stage_input(filepath, entry, cache)
+    sha = file_sha256(source)
+
+    if previous and not research and previous.get("threshold") == threshold:
+        # gif output replaces its source, so the current file may be our own output
+        up_to_date = target.exists() and file_sha256(target) == previous.get("output_sha256")
+        if up_to_date and sha in (previous["source_sha256"], previous["output_sha256"]):
+            return 'unchanged', previous
+
+    clip = load_clip(source)
+    original_bytes = source.stat().st_size
+
+    result = None
+    reused = bool(previous) and not research and previous.get("threshold") == threshold
+    if reused:
+        # Same threshold, new source: try the stored parameters before searching
+        params = previous["params"]
+        data = encode(clip, fmt, params["value"], params["frame_step"])
+        mean, minimum = score(clip, data, samples)
+        if mean >= threshold:
+            result = {"value": params["value"], "frame_step": params["frame_step"],
+                      "data": data, "ssim": mean, "ssim_min": minimum}
+        else:
+            reused = False
+    if result is None:
+        result = search(clip, fmt, threshold, samples)
+
+    if result is None:
+        return 'unmet', None
+
+    data = result.pop("data")
+    if fmt == 'gif' and len(data) >= original_bytes:
+        # Nothing to gain over the source; record the search so it is not repeated
+        status = 'kept'
+        output_sha = sha
+        place_original(source, filepath)
+    else:
+        write_atomic(target, data)
+        status = 'reused' if reused else 'encoded'
+        output_sha = file_sha256(target)
+
+    record = {
+        "threshold": threshold,
+        "params": {"value": result["value"], "frame_step": result["frame_step"]},
+        "param_name": 'quality' if fmt == 'webp' else 'colors',
+        "ssim": round(result["ssim"], 4),
+        "ssim_min": round(result["ssim_min"], 4),
+        "source_sha256": sha,
+        "source_bytes": original_bytes,
+        "output": target.name,
+        "output_sha256": output_sha,
+        "bytes": len(data) if status != 'kept' else original_bytes,
+    }
+    records[fmt] = record
+    if fmt == 'gif' and status != 'kept':
+        entry["sha256"] = output_sha
+        entry["bytes"] = record["bytes"]
+    return status, record
+
+def run(args):
+    files = selected_files(args.files)
+    manifest = load_manifest()
+    cache = SourceCache()
+
+    print(f"🎚️  Encoding {len(files)} GIFs as {args.format} (SSIM ≥ {args.threshold})...\n")
+
+    journal = Journal(f"encode-{args.format}")
+    if journal.resumed:
+        # Drop half-written outputs of the interrupted run; those files are redone
+        for task_id in journal.in_progress():
+            target = output_path(OUTPUT_DIR / task_id.split(':', 1)[1], args.format)
+            target.with_name(target.name + ".tmp").unlink(missing_ok=True)
+        print(f"↩️  Resuming interrupted run ({len(journal.in_progress())} file(s) were in progress)\n")
+
+    counts = {'encoded': 0, 'reused': 0, 'kept': 0, 'unchanged': 0, 'unmet': 0}
+    before = 0
+    after = 0
+    for i, filepath in enumerate(files, 1):
+        progress = f"[{i}/{len(files)}]"
+        print(f"{progress} {filepath.name}... ", end='', flush=True)
+
+        task_id = f"encode:{filepath.name}"
+        if journal.is_finished(task_id):
+            counts['unchanged'] += 1
+            print("⏭️  (done before interruption)")
+            continue
+
+        journal.record(task_id, 'started')
+        status, record = encode_file(filepath, manifest, args.format, args.threshold,
+                                     args.research, args.samples, cache)
+        counts[status] += 1
+
+        if status == 'unmet':
+            journal.record(task_id, 'failed', result=status)
+            print("❌ no setting reaches the threshold")
+            continue
+        if status == 'unchanged':
+            journal.record(task_id, 'done', result=status)
+            print("⏭️  (unchanged)")
+            continue
+
+        before += record["source_bytes"]
+        after += record["bytes"]
+        params = record["params"]
+        label = f"{record['param_name']}={params['value']}, every {params['frame_step']} frame(s)"
+        if status == 'kept':
+            print(f"➖ source already smallest ({label})")
+        else:
+            icon = '♻️ ' if status == 'reused' else '✅'
+            print(f"{icon} {format_size(record['source_bytes'])} → {format_size(record['bytes'])} "
+                  f"(SSIM {record['ssim']:.3f}, {label})")
+
+        save_manifest(manifest, precompress=False)
+        journal.record(task_id, 'done', result=status, sha256=record["output_sha256"])
+
+    save_manifest(manifest)
+    journal.close(complete=True)
+
+    print("\n" + "="*60)
+    print(f"✅ Searched: {counts['encoded']}")
+    print(f"♻️  Reused stored settings: {counts['reused']}")
+    print(f"⏭️  Unchanged: {counts['unchanged']}")
+    if counts['kept']:
+        print(f"➖ Source kept: {counts['kept']}")
+    if counts['unmet']:
+        print(f"❌ Threshold not reachable: {counts['unmet']}")
+    if before:
+        print(f"💾 {format_size(before)} → {format_size(after)}")
+    print("="*60 + "\n")
+
+def register(subparsers):
+    parser = subparsers.add_parser('encode', help='Find the smallest encode above an SSIM threshold')
+    parser.add_argument('files', nargs='*', help='GIF filenames in public/exercise-gifs (default: all)')
+    parser.add_argument('--format', choices=sorted(PARAM_RANGES), default='webp', help='Output format')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Minimum mean SSIM against the original')
+    parser.add_argument('--samples', type=int, default=SAMPLE_FRAMES, help='Frames sampled for SSIM')
+    parser.add_argument('--research', action='store_true', help='Ignore stored parameters and search again')
+    parser.set_defaults(func=run)
@@ -0,0 +1,143 @@
+"""
+Progress events
+
+Commands report what they are doing as a stream of events, one JSON object
+per line (NDJSON), instead of printing as they go:
+
+    {"ts": 1760000000.123, "event": "started", "task": "fetch:squat.gif", ...}
+
+Events:
+    run-started        command, task counts
+    queued             task, name, priority
+    started            task, name
+    progress           task, bytes so far (at most every PROGRESS_INTERVAL)
+    candidate-failed   task, url, error
+    finished           task, name, status (done/failed), bytes, seconds, url, error
+    run-finished       totals for the run
+
+The stream can go to a file, stdout ("-") or an inherited file descriptor
+("fd:3"). The human-readable output is just one more consumer:
+ConsoleRenderer collects events and redraws on its own thread at most every
+REDRAW_INTERVAL, so a slow terminal never slows the workers down.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+
+from .config import format_size
+
+PROGRESS_INTERVAL = 0.5
+REDRAW_INTERVAL = 0.25
+
+def open_sink(spec):
+    """File object for an --events value: a path, '-' for stdout, or 'fd:N'"""
+    if spec == '-':
+        return sys.stdout
+    if spec.startswith('fd:'):
+        return os.fdopen(int(spec[3:]), 'w', buffering=1, closefd=False)
+    return open(spec, 'a', buffering=1)
+
+class EventStream:
+    """Thread-safe NDJSON writer that also fans events out to consumers"""
+
+    def __init__(self, sink=None):
+        self._file = open_sink(sink) if sink else None
+        self._lock = threading.Lock()
+        self._consumers = []
+        self._last_progress = {}
+
+    def subscribe(self, consumer):
+        """consumer(event) is called for every event; it must not block"""
+        self._consumers.append(consumer)
+
+    def emit(self, event, **fields):
+        record = {"ts": round(time.time(), 3), "event": event, **fields}
+        with self._lock:
+            if self._file:
+                self._file.write(json.dumps(record, sort_keys=True) + "\n")
+            for consumer in self._consumers:
+                consumer(record)
+        return record
+
+    def progress(self, task_id, size, **fields):
+        """Emit a progress event unless this task reported one very recently"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_progress.get(task_id, 0) < PROGRESS_INTERVAL:
+                return
+            self._last_progress[task_id] = now
+        self.emit('progress', task=task_id, bytes=size, **fields)
+
+    def close(self):
+        with self._lock:
+            if self._file and self._file is not sys.stdout:
+                self._file.close()
+            self._file = None
+
+class ConsoleRenderer:
+    """Human-readable progress drawn from events, rate-limited on its own thread"""
+
+    def __init__(self, out=None, interval=REDRAW_INTERVAL):
+        self.out = out or sys.stdout
+        self.interval = interval
+        self.live = self.out.isatty()
+        self.total = 0
+        self.finished = 0
+        self.active = {}
+        self._lines = []
+        self._status_shown = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="console", daemon=True)
+        self._thread.start()
+
+    def __call__(self, event):
+        kind = event["event"]
+        with self._lock:
+            if kind == 'queued':
+                self.total += 1
+            elif kind == 'started':
+                self.active[event["task"]] = [event.get("name", event["task"]), 0]
+            elif kind == 'progress' and event["task"] in self.active:
+                self.active[event["task"]][1] = event["bytes"]
+            elif kind == 'finished':
+                self.active.pop(event["task"], None)
+                self.finished += 1
+                progress = f"[{self.finished}/{self.total}]"
+                if event["status"] == 'done':
+                    held = ", source cache" if event.get("cached") else ""
+                    self._lines.append(f"{progress} {event['name']}... ✅ ({format_size(event['bytes'])}{held})")
+                else:
+                    self._lines.append(f"{progress} {event['name']}... ❌")
+
+    def _status(self):
+        received = sum(size for _, size in self.active.values())
+        return (f"  ⏳ {len(self.active)} downloading, {self.finished}/{self.total} done, "
+                f"{format_size(received)} in flight")
+
+    def _draw(self, final=False):
+        with self._lock:
+            lines, self._lines = self._lines, []
+            status = self._status() if self.live and not final and self.active else ''
+        if not lines and not status and not self._status_shown:
+            return
+        text = '\r\033[K' if self._status_shown else ''
+        self._status_shown = bool(status)
+        if lines:
+            text += "\n".join(lines) + "\n"
+        text += status
+        if text:
+            self.out.write(text)
+            self.out.flush()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self._draw()
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self._draw(final=True)
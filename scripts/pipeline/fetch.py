@@ -0,0 +1,285 @@
+"""
+Catalog fetch
+
+Downloads every exercise listed by the download scripts (see sources.py) in
+one resumable run. Progress goes to an fsync'd journal
+(.media-cache/journal/fetch.jsonl); if the run is interrupted, the next run
+replays it and continues with only the unfinished tasks, skipping URLs that
+already failed.
+
+Concurrency adapts per host (see hostlimits.py): --workers only caps the
+total number of downloads in flight. Tasks run most-used first (see
+scheduler.py), so with --time-budget a short run still gets the exercises
+the app shows most. Giphy candidates are swapped for the smallest
+rendition wide enough for the app (see giphy.py, --giphy-width).
+
+Usage:
+    python3 scripts/media_pipeline.py fetch
+    python3 scripts/media_pipeline.py fetch --source multi-source --source giphy
+    python3 scripts/media_pipeline.py fetch --restart
+    python3 scripts/media_pipeline.py fetch --time-budget 60s
+    python3 scripts/media_pipeline.py fetch --events - --quiet | jq .   # NDJSON events
+    python3 scripts/media_pipeline.py fetch --plan        # HEAD-only dry run, saves the plan
+    python3 scripts/media_pipeline.py fetch --from-plan   # run the saved plan later
+"""
+
+import contextlib
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+
+from .config import OUTPUT_DIR, format_size, parse_duration
+from .events import ConsoleRenderer, EventStream
+from .fetcher import DEFAULT_TIMEOUT, fetch_task, protocol_summary
+from .giphy import TARGET_WIDTH, RenditionCache
+from .hostlimits import DEMOTE_SUCCESS, HostLimiter, host_of
+from .journal import Journal
+from .plan import PLAN_PATH, build_plan, format_duration, load_plan, save_plan
+from .scheduler import PriorityScheduler
+from .sources import SOURCE_NAMES, load_tasks, output_path
+from .sourcecache import SourceCache
+from .usage import fetch_priorities
+
+DEFAULT_WORKERS = 16
+
+def plan_tasks(tasks, journal, retry_failed=False, directory=OUTPUT_DIR):
+    """Split tasks into (pending, already done this run, existing on disk)"""
+    pending = []
+    finished = []
+    existing = []
+    for task in tasks:
+        outcome = journal.outcome(task.task_id)
+        if journal.is_finished(task.task_id) and not (retry_failed and outcome["status"] == 'failed'):
+            finished.append(task)
+        elif output_path(task, directory).exists():
+            existing.append(task)
+        else:
+            pending.append(task)
+    return pending, finished, existing
+
+def fetch_worker(scheduler, journal, args, limiter, events, cache, renditions):
+    """Run tasks from the scheduler until it runs dry; returns (downloaded, failed, from cache)"""
+    success = 0
+    fail = 0
+    restored = 0
+    while True:
+        task = scheduler.next()
+        if task is None:
+            return success, fail, restored
+        # A plan already put the chosen rendition first
+        if not args.from_plan and not cache.lookup(task.filename, task.candidates):
+            task = renditions.with_renditions(task, args.giphy_width, args.timeout)
+        record = fetch_task(task, output_path(task, args.output_dir), journal, args.timeout,
+                            args.retry_failed, limiter, events, cache, renditions, ranked=True)
+        if record.get("cached"):
+            restored += 1
+        elif record["status"] == 'done':
+            success += 1
+        else:
+            fail += 1
+
+def print_host_limits(limiter):
+    rows = limiter.summary()
+    if not rows:
+        return
+    print("\nPer-host concurrency:")
+    for host, start, end, ok, congestion, success in rows:
+        trend = '↑' if end > start else '↓' if end < start else '='
+        print(f"  {host:<36} {start:>5.1f} → {end:>5.1f} {trend}  ({ok} ok, {congestion} congestion, "
+              f"{success:.0%} valid{', demoted' if success < DEMOTE_SUCCESS else ''})")
+
+def print_protocols():
+    summary = protocol_summary()
+    if not summary:
+        return
+    print("\nProtocol per host:")
+    for host, counts in summary.items():
+        used = ', '.join(f"{protocol} ×{count}" for protocol, count in sorted(counts.items()))
+        print(f"  {host:<36} {used}")
+
+def print_plan(plan, path):
+    entries = plan["tasks"]
+    planned = [entry for entry in entries if entry["action"] == 'fetch']
+    for i, entry in enumerate(entries, 1):
+        progress = f"[{i}/{len(entries)}]"
+        if entry["action"] == 'fetch':
+            size = format_size(entry["bytes"]) if entry["bytes"] else "size ?"
+            print(f"{progress} {entry['name']:<32} {host_of(entry['url']):<32} {size:>10}  ~{entry['expected_seconds']}s")
+        elif entry["action"] == 'cached':
+            print(f"{progress} {entry['name']:<32} ♻️  in source cache {format_size(entry['bytes']):>21}")
+        else:
+            print(f"{progress} {entry['name']:<32} ❌ every candidate failed its HEAD check")
+
+    print("\n" + "="*60)
+    unknown = f", {plan['unknown_sizes']} size(s) unknown" if plan["unknown_sizes"] else ""
+    print(f"📥 To fetch: {len(planned)} ({format_size(plan['total_bytes'])}{unknown})")
+    unavailable = sum(1 for entry in entries if entry["action"] == 'unavailable')
+    if unavailable:
+        print(f"🚫 Unavailable: {unavailable}")
+    print(f"⏭️  On disk: {plan['on_disk']}")
+    if plan.get("cached"):
+        print(f"♻️  From source cache: {plan['cached']} (no network)")
+    print(f"⏱️  ETA: ~{format_duration(plan['eta_seconds'])} with {plan['workers']} workers")
+    print("="*60)
+
+    if plan["hosts"]:
+        print("\nPer-host estimate:")
+        for host, stats in sorted(plan["hosts"].items(), key=lambda item: -item[1]["seconds"]):
+            note = "" if stats["measured"] else "  (no history, default throughput)"
+            print(f"  {host:<36} {stats['tasks']:>3} task(s) {format_size(stats['bytes']):>10}  "
+                  f"limit {stats['limit']:>4.1f}  ttfb {stats['ttfb'] * 1000:.0f} ms  "
+                  f"{stats['throughput'] / (1024 * 1024):.2f} MB/s{note}")
+    print(f"\n💾 Plan saved to {path}")
+    print("   Run it with: python3 scripts/media_pipeline.py fetch --from-plan\n")
+
+def run_plan(args):
+    """--plan: HEAD-only dry run that saves an executable plan"""
+    tasks = load_tasks(args.source, args.url_file)
+    print("📋 Fetch plan (HEAD requests only, nothing is downloaded)\n")
+    limiter = HostLimiter()
+    plan = build_plan(tasks, limiter, args.workers, args.timeout, args.output_dir, args.refresh,
+                      args.giphy_width)
+    limiter.save()
+    save_plan(plan, args.plan)
+    print_plan(plan, args.plan)
+
+def run(args):
+    if args.plan:
+        return run_plan(args)
+    events = EventStream(args.events)
+    if args.events == '-':
+        # stdout carries the event stream; keep the human-readable output off it
+        with contextlib.redirect_stdout(sys.stderr):
+            return run_fetch(args, events)
+    return run_fetch(args, events)
+
+def run_fetch(args, events):
+    if args.from_plan:
+        plan, tasks = load_plan(args.from_plan)
+        if args.output_dir == OUTPUT_DIR:
+            args.output_dir = Path(plan["output_dir"])
+    else:
+        tasks = load_tasks(args.source, args.url_file)
+    journal = Journal('fetch')
+    if args.restart:
+        journal.close(complete=True)
+        journal = Journal('fetch')
+
+    print("📥 Catalog fetch\n")
+    if args.from_plan:
+        print(f"📋 Running plan {args.from_plan} "
+              f"(~{format_size(plan['total_bytes'])}, ETA ~{format_duration(plan['eta_seconds'])})\n")
+    if journal.resumed:
+        interrupted = journal.in_progress()
+        print(f"↩️  Resuming interrupted run ({journal.resumed} journal records, "
+              f"{len(interrupted)} task(s) were in progress)\n")
+
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    pending, finished, existing = plan_tasks(tasks, journal, args.retry_failed, args.output_dir)
+    print(f"Tasks: {len(tasks)} total, {len(pending)} to fetch, "
+          f"{len(existing)} already on disk, {len(finished)} finished earlier in this run\n")
+
+    priorities = fetch_priorities([task.filename for task in pending], args.history)
+    deadline = time.monotonic() + args.time_budget if args.time_budget else None
+    if args.time_budget:
+        print(f"⏱️  Time budget: {format_duration(args.time_budget)}, most-used exercises first\n")
+
+    console = None if args.quiet else ConsoleRenderer()
+    if console:
+        events.subscribe(console)
+    started = time.monotonic()
+    events.emit('run-started', command='fetch', tasks=len(tasks), pending=len(pending),
+                existing=len(existing), finished=len(finished), time_budget=args.time_budget)
+    for task in pending:
+        events.emit('queued', task=task.task_id, name=task.name, priority=priorities[task.filename])
+
+    limiter = HostLimiter()
+    cache = SourceCache()
+    renditions = RenditionCache(limiter=limiter)
+    scheduler = PriorityScheduler(pending, priorities, limiter, deadline, keep_first=bool(args.from_plan))
+    pool = ThreadPoolExecutor(max_workers=args.workers)
+    try:
+        workers = [pool.submit(fetch_worker, scheduler, journal, args, limiter, events, cache, renditions)
+                   for _ in range(min(args.workers, len(pending)))]
+        while wait(workers, timeout=0.5).not_done:
+            pass
+        counts = [worker.result() for worker in workers]
+    except KeyboardInterrupt:
+        # Nothing new starts; in-flight downloads still journal their outcome
+        scheduler.stop()
+        pool.shutdown(wait=False)
+        limiter.save()
+        renditions.save()
+        if console:
+            console.close()
+        events.emit('run-finished', interrupted=True, seconds=round(time.monotonic() - started, 3))
+        events.close()
+        print(f"\n\n⚠️  Interrupted. Progress is saved in {journal.path}")
+        print("   Run the same command again to resume.")
+        raise
+    pool.shutdown()
+    limiter.save()
+    renditions.save()
+    if console:
+        console.close()
+
+    success = sum(ok for ok, _, _ in counts)
+    fail = sum(failed for _, failed, _ in counts)
+    restored = sum(held for _, _, held in counts)
+    left = scheduler.remaining()
+    journal.close(complete=not left)
+    evicted = cache.evict()
+    events.emit('run-finished', downloaded=success, failed=fail, restored=restored,
+                skipped=len(existing) + len(finished), left=len(left), seconds=round(time.monotonic() - started, 3))
+    events.close()
+
+    print("\n" + "="*60)
+    print(f"✅ Downloaded: {success}")
+    if restored:
+        print(f"♻️  From source cache: {restored} (no network)")
+    if renditions.chosen:
+        print(f"🎞️  Giphy renditions: {renditions.chosen} downloaded instead of the original "
+              f"({format_size(renditions.saved_bytes)} less to download)")
+    print(f"⏭️  Skipped: {len(existing) + len(finished)}")
+    if fail > 0:
+        print(f"❌ Failed: {fail}")
+    if left:
+        print(f"⏱️  Time budget used up: {len(left)} task(s) left for the next run")
+    print("="*60)
+    print_host_limits(limiter)
+    print_protocols()
+    if evicted:
+        print(f"\n🗄️  Source cache over quota: evicted {len(evicted)} unpinned original(s), "
+              f"{format_size(sum(size for _, size in evicted))}")
+    print(f"\n📁 {args.output_dir}\n")
+
+def register(subparsers):
+    parser = subparsers.add_parser('fetch', help='Resumable download of every script-listed exercise GIF')
+    parser.add_argument('--source', action='append', choices=SOURCE_NAMES,
+                        help='Only fetch from these script lists (repeatable, default: all)')
+    parser.add_argument('--url-file', type=Path,
+                        help='Read the url-file source from this file instead of scripts/gif-urls.txt')
+    parser.add_argument('--output-dir', type=Path, default=OUTPUT_DIR, help='Where downloaded GIFs go')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Maximum downloads in flight across all hosts')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='Per-request timeout (seconds)')
+    parser.add_argument('--retry-failed', action='store_true',
+                        help='When resuming, also retry tasks that already failed in this run')
+    parser.add_argument('--restart', action='store_true', help='Discard the journal of an interrupted run')
+    parser.add_argument('--time-budget', type=parse_duration,
+                        help='Stop starting downloads after this long, e.g. 60s or 5m (most-used first)')
+    parser.add_argument('--events', metavar='PATH|-|fd:N',
+                        help='Write NDJSON progress events to a file, stdout (-) or a file descriptor')
+    parser.add_argument('--quiet', action='store_true', help='No per-task console output (summary only)')
+    parser.add_argument('--giphy-width', type=int, default=TARGET_WIDTH,
+                        help=f'Smallest Giphy rendition at least this wide; 0 always fetches the original '
+                             f'(default: {TARGET_WIDTH})')
+    parser.add_argument('--history', type=Path,
+                        help='Exported history/templates JSON to include in the usage priorities')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--plan', type=Path, nargs='?', const=PLAN_PATH,
+                      help=f'Dry run: HEAD-check candidates, estimate bytes/ETA and save the plan (default: {PLAN_PATH})')
+    mode.add_argument('--from-plan', type=Path, nargs='?', const=PLAN_PATH,
+                      help='Fetch exactly what a saved plan lists, without planning again')
+    parser.add_argument('--refresh', action='store_true', help='With --plan, ignore cached HEAD results')
+    parser.set_defaults(func=run)
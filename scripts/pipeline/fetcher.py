@@ -0,0 +1,271 @@
+"""
+Shared fetcher
+
+Downloads one asset at a time into a partial file, hashing while streaming,
+and only moves it into place once it looks like a complete GIF. Task-level
+fetching records every outcome in the run journal, so an interrupted run
+never re-probes a URL that already failed.
+"""
+
+import hashlib
+import http.client
+import os
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from urllib.parse import urljoin, urlsplit
+
+from . import connect, http2
+from .config import CACHE_DIR, USER_AGENT
+from .hostlimits import host_of
+
+PARTIAL_DIR = CACHE_DIR / "partial"
+CHUNK_SIZE = 64 * 1024
+DEFAULT_TIMEOUT = 30
+
+# Anything smaller is an error page, not an exercise animation
+MIN_VALID_BYTES = 1000
+GIF_SIGNATURES = (b'GIF87a', b'GIF89a')
+
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+MAX_REDIRECTS = 5
+
+# Responses that mean "slow down" rather than "this URL is wrong"
+CONGESTION_STATUSES = (429, 503)
+
+class FetchError(Exception):
+    """Raised when a URL does not produce a valid asset"""
+
+    def __init__(self, message, congestion=False, ttfb=None):
+        super().__init__(message)
+        self.congestion = congestion
+        self.ttfb = ttfb
+
+def _is_timeout(error):
+    reason = getattr(error, 'reason', error)
+    return isinstance(reason, (socket.timeout, TimeoutError))
+
+# Cached DNS + Happy Eyeballs connects (see connect.py)
+_opener = urllib.request.build_opener(connect.HTTPHandler, connect.HTTPSHandler)
+# HTTPS hosts that negotiate h2 share one multiplexed connection (see http2.py)
+_h2_pool = http2.H2Pool()
+_protocols = Counter()
+_protocols_lock = threading.Lock()
+
+def _count_protocol(url, protocol):
+    with _protocols_lock:
+        _protocols[(urlsplit(url).netloc, protocol)] += 1
+
+def protocol_summary():
+    """{host[:port]: {protocol: requests}} for every request made so far"""
+    summary = {}
+    with _protocols_lock:
+        for (host, protocol), count in sorted(_protocols.items()):
+            summary.setdefault(host, {})[protocol] = count
+    return summary
+
+def open_url(url, timeout=DEFAULT_TIMEOUT, method='GET', redirects=MAX_REDIRECTS, extra_headers=None):
+    """Open a URL with the browser-like headers the download scripts use (plus extra_headers, e.g. Range)"""
+    headers = {'User-Agent': USER_AGENT, **(extra_headers or {})}
+    if method == 'GET':
+        try:
+            response = _h2_pool.open(url, headers, timeout)
+        except http2.H2Closed:
+            response = None
+        if response is not None:
+            _count_protocol(url, 'h2')
+            if response.status in REDIRECT_STATUSES and redirects:
+                location = response.getheader('location')
+                response.close()
+                return open_url(urljoin(url, location), timeout, method, redirects - 1, extra_headers)
+            if response.status >= 400:
+                response.close()
+                raise urllib.error.HTTPError(url, response.status,
+                                             http.client.responses.get(response.status, ''), None, None)
+            return response
+
+    request = urllib.request.Request(url, headers=headers, method=method)
+    response = _opener.open(request, timeout=timeout)
+    _count_protocol(url, 'http/1.1' if response.version == 11 else 'http/1.0')
+    return response
+
+def download(url, filepath, timeout=DEFAULT_TIMEOUT, limiter=None, on_progress=None):
+    """Download url to filepath atomically; returns {url, bytes, sha256, seconds, ttfb}
+
+    on_progress(bytes so far) is called after every chunk.
+    """
+    if limiter is None:
+        return _download(url, filepath, timeout, on_progress)
+
+    host = host_of(url)
+    limiter.acquire(host)
+    ttfb = None
+    congested = False
+    error = None
+    result = {}
+    try:
+        result = _download(url, filepath, timeout, on_progress)
+        ttfb = result["ttfb"]
+        return result
+    except FetchError as e:
+        congested = e.congestion
+        ttfb = e.ttfb
+        error = str(e)
+        raise
+    finally:
+        limiter.release(host, ttfb, congested, result.get("bytes"), result.get("seconds"))
+        if result or error:
+            limiter.record(host, bool(result), error)
+
+def _download(url, filepath, timeout, on_progress=None):
+    PARTIAL_DIR.mkdir(parents=True, exist_ok=True)
+    part = PARTIAL_DIR / f"{filepath.name}.{os.getpid()}.{threading.get_ident()}.part"
+    digest = hashlib.sha256()
+    size = 0
+    head = b''
+    started = time.monotonic()
+    ttfb = None
+
+    try:
+        try:
+            with open_url(url, timeout) as response, open(part, 'wb') as f:
+                ttfb = time.monotonic() - started
+                if response.status != 200:
+                    raise FetchError(f"HTTP {response.status}", ttfb=ttfb)
+                while True:
+                    chunk = response.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    if len(head) < len(GIF_SIGNATURES[0]):
+                        head += chunk[:len(GIF_SIGNATURES[0])]
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+                    if on_progress:
+                        on_progress(size)
+        except urllib.error.HTTPError as e:
+            raise FetchError(f"HTTP {e.code}", congestion=e.code in CONGESTION_STATUSES,
+                             ttfb=time.monotonic() - started)
+        except (urllib.error.URLError, OSError) as e:
+            raise FetchError(str(getattr(e, 'reason', e)) or type(e).__name__, congestion=_is_timeout(e))
+
+        if size < MIN_VALID_BYTES:
+            raise FetchError(f"too small ({size} bytes)", ttfb=ttfb)
+        if head[:6] not in GIF_SIGNATURES:
+            raise FetchError("not a GIF", ttfb=ttfb)
+
+        os.replace(part, filepath)
+    finally:
+        part.unlink(missing_ok=True)
+
+    return {
+        "url": url,
+        "bytes": size,
+        "sha256": digest.hexdigest(),
+        "seconds": round(time.monotonic() - started, 3),
+        "ttfb": round(ttfb, 3),
+    }
+
+def head(url, timeout=DEFAULT_TIMEOUT, limiter=None):
+    """HEAD a URL; returns {status, bytes, content_type} (bytes is None when unknown)"""
+    host = host_of(url)
+    if limiter:
+        limiter.acquire(host)
+    started = time.monotonic()
+    ttfb = None
+    congested = False
+    try:
+        try:
+            with open_url(url, timeout, method='HEAD') as response:
+                ttfb = time.monotonic() - started
+                status = response.status
+                length = response.getheader('Content-Length')
+                content_type = response.getheader('Content-Type', '')
+        except urllib.error.HTTPError as e:
+            ttfb = time.monotonic() - started
+            congested = e.code in CONGESTION_STATUSES
+            return {"status": e.code, "bytes": None, "content_type": None}
+        except (urllib.error.URLError, OSError) as e:
+            congested = _is_timeout(e)
+            return {"status": None, "bytes": None, "content_type": None,
+                    "error": str(getattr(e, 'reason', e)) or type(e).__name__}
+    finally:
+        if limiter:
+            limiter.release(host, ttfb, congested)
+    return {
+        "status": status,
+        "bytes": int(length) if length and length.isdigit() else None,
+        "content_type": content_type.split(';')[0].strip(),
+    }
+
+def fetch_candidates(task, filepath, timeout=DEFAULT_TIMEOUT, skip=(), on_failure=None, limiter=None,
+                     on_progress=None, ranked=False):
+    """Try a task's candidate URLs, best host first; returns the download result or raises FetchError
+
+    With a limiter the candidates are tried in limiter.rank() order (measured
+    host health and speed), otherwise in the order the sources list them.
+    ranked means the caller has already ordered them (the fetch scheduler).
+    """
+    errors = []
+    for url in limiter.rank(task.candidates) if limiter and not ranked else task.candidates:
+        if url in skip:
+            continue
+        progress = (lambda size, url=url: on_progress(url, size)) if on_progress else None
+        try:
+            return download(url, filepath, timeout, limiter, progress)
+        except FetchError as e:
+            errors.append(f"{url}: {e}")
+            if on_failure:
+                on_failure(url, e)
+    raise FetchError('; '.join(errors) or 'all candidates failed previously')
+
+def fetch_task(task, filepath, journal, timeout=DEFAULT_TIMEOUT, retry_failed=False, limiter=None, events=None,
+               cache=None, renditions=None, ranked=False):
+    """Fetch one task, journaling (and emitting, if given an event stream) every outcome
+
+    With a source cache, an original already held is restored without any
+    request, and new downloads are added to it. With a Giphy rendition cache,
+    downloads that came from a smaller rendition are counted. Returns the
+    task's final journal record.
+    """
+    skip = set() if retry_failed else journal.skip_candidates(task.task_id)
+    journal.record(task.task_id, 'started')
+    if events:
+        events.emit('started', task=task.task_id, name=task.name)
+
+    held = cache.lookup(task.filename, task.candidates) if cache else None
+    if held:
+        result = cache.restore(held, filepath, task.filename)
+        record = journal.record(task.task_id, 'done', file=filepath.name, seconds=0.0, ttfb=None,
+                                cached=True, **result)
+        if events:
+            events.emit('finished', task=task.task_id, name=task.name, status='done', url=result["url"],
+                        bytes=result["bytes"], seconds=0.0, ttfb=None, sha256=held, error=None, cached=True)
+        return record
+
+    def on_failure(url, error):
+        journal.record(task.task_id, 'candidate-failed', url=url, error=str(error))
+        if events:
+            events.emit('candidate-failed', task=task.task_id, url=url, error=str(error))
+
+    def on_progress(url, size):
+        events.progress(task.task_id, size, url=url)
+
+    try:
+        result = fetch_candidates(task, filepath, timeout, skip, on_failure, limiter,
+                                  on_progress if events else None, ranked)
+    except FetchError as e:
+        record = journal.record(task.task_id, 'failed', file=filepath.name, error=str(e))
+    else:
+        if cache:
+            cache.add(filepath, result["url"], task.filename)
+        if renditions:
+            renditions.downloaded(result["url"])
+        record = journal.record(task.task_id, 'done', file=filepath.name, **result)
+    if events:
+        fields = {key: record.get(key) for key in ('status', 'url', 'bytes', 'seconds', 'ttfb', 'sha256', 'error')}
+        events.emit('finished', task=task.task_id, name=task.name, **fields)
+    return record
@@ -0,0 +1,113 @@
+"""
+GIF frame loading and saving
+
+NumPy and Pillow are only needed by the stages that look at pixels, so they
+are imported lazily and reported with an install hint when missing.
+"""
+
+import io
+import os
+from collections import namedtuple
+
+from .config import PipelineError
+
+# frames: list of RGB PIL images, durations: per-frame delay in ms
+Clip = namedtuple('Clip', ['frames', 'durations', 'size'])
+
+# Browsers treat delays of 10ms or less as 100ms
+MIN_FRAME_DELAY_MS = 20
+DEFAULT_FRAME_DELAY_MS = 100
+
+def require_imaging():
+    """Import NumPy and Pillow, or explain how to install them"""
+    try:
+        import numpy
+        from PIL import Image
+    except ImportError:
+        raise PipelineError("This stage needs NumPy and Pillow: pip install numpy Pillow")
+    return numpy, Image
+
+def _frame_delay(frame):
+    delay = frame.info.get('duration') or 0
+    return delay if delay >= MIN_FRAME_DELAY_MS else DEFAULT_FRAME_DELAY_MS
+
+def load_clip(source):
+    """Decode every frame of an animation (path or file object) as composited RGB"""
+    _, Image = require_imaging()
+    from PIL import ImageSequence
+
+    frames = []
+    durations = []
+    with Image.open(source) as im:
+        for frame in ImageSequence.Iterator(im):
+            durations.append(_frame_delay(frame))
+            rgb = frame.convert('RGB')
+            rgb.info = {}
+            frames.append(rgb)
+        size = im.size
+    return Clip(frames, durations, size)
+
+def load_poster(path):
+    """Decode only the first frame; returns (RGB image, (width, height))"""
+    _, Image = require_imaging()
+    with Image.open(path) as im:
+        im.seek(0)
+        poster = im.convert('RGB')
+        poster.info = {}
+        return poster, im.size
+
+def gray_vectors(frames, size=32):
+    """Downsample frames to size x size grayscale, one row vector per frame"""
+    np, Image = require_imaging()
+    stack = np.stack([
+        np.asarray(frame.convert('L').resize((size, size), Image.BILINEAR), dtype=np.float32)
+        for frame in frames
+    ])
+    return stack.reshape(len(frames), -1) / 255.0
+
+def encode_gif(frames, durations, colors=256):
+    """Encode frames as a looping GIF and return the bytes"""
+    _, Image = require_imaging()
+
+    palettized = [frame.quantize(colors=colors, dither=Image.Dither.NONE) for frame in frames]
+    buffer = io.BytesIO()
+    palettized[0].save(
+        buffer,
+        format='GIF',
+        save_all=True,
+        append_images=palettized[1:],
+        duration=list(durations),
+        loop=0,
+        optimize=True,
+        disposal=1,
+    )
+    return buffer.getvalue()
+
+def encode_webp(frames, durations, quality=80):
+    """Encode frames as a looping animated WebP and return the bytes"""
+    require_imaging()
+
+    buffer = io.BytesIO()
+    frames[0].save(
+        buffer,
+        format='WEBP',
+        save_all=True,
+        append_images=frames[1:],
+        duration=list(durations),
+        loop=0,
+        quality=quality,
+        method=4,
+    )
+    return buffer.getvalue()
+
+def write_atomic(path, data):
+    """Write bytes through a temp file so readers never see a partial asset"""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return len(data)
+
+def save_gif(path, frames, durations, colors=256):
+    """Encode frames as a looping GIF, writing through a temp file"""
+    return write_atomic(path, encode_gif(frames, durations, colors))
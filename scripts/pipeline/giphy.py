@@ -0,0 +1,211 @@
+"""
+Giphy renditions
+
+Giphy serves each GIF in several renditions under the same media id:
+
+    100w.gif              100 px wide
+    200w.gif              200 px wide
+    200.gif               200 px high
+    giphy-downsized.gif   reduced to under 2 MB
+    giphy.gif             the original, and usually by far the largest
+
+download_giphy_exercises.py lists giphy.gif. The app never shows a GIF
+wider than TARGET_WIDTH (the demo box is max-w-md, 448 CSS px), and
+`serve` never upscales, so anything wider is downloaded, trimmed and
+encoded only to be thrown away.
+
+Each rendition is probed with one Range request for the first 10 bytes.
+The GIF header gives its width and Content-Range its full size. The
+smallest rendition at least TARGET_WIDTH wide (or as wide as the original,
+if the original is narrower) becomes the first candidate, with the
+original as its fallback. Probes go through the host limiter like any
+other request; a probe that fails for any reason counts as no rendition.
+Concurrent lookups of the same media id share one set of probes. Probes
+are cached in .media-cache/giphy-renditions.json (merged under a file lock,
+so queue workers keep each other's entries); renditions do not change once
+Giphy has made them.
+
+Savings are counted when a download actually comes from a rendition, not
+when the rendition is chosen.
+
+Only GIF renditions are used. Giphy also has .webp and .mp4 renditions,
+but fetch, loop-trim and encode all take a GIF original, and encode makes
+the WebP from the trimmed frames itself.
+"""
+
+import json
+import re
+import threading
+import time
+import urllib.error
+from concurrent.futures import Future
+
+from .config import CACHE_DIR
+from .fetcher import CONGESTION_STATUSES, DEFAULT_TIMEOUT, GIF_SIGNATURES, open_url
+from .hostlimits import host_of
+from .manifest import manifest_lock, write_json
+
+RENDITIONS_PATH = CACHE_DIR / "giphy-renditions.json"
+RENDITION_TTL = 30 * 24 * 3600
+TARGET_WIDTH = 480
+RENDITIONS = ('100w.gif', '200w.gif', '200.gif', 'giphy-downsized.gif', 'giphy.gif')
+ORIGINAL = 'giphy.gif'
+RENDITION_HOST = 'media.giphy.com'
+
+GIPHY_URLS = (
+    re.compile(r'^https?://(?:media\d?|i)\.giphy\.com/media/(\w+)/[\w.-]+$'),
+    re.compile(r'^https?://i\.giphy\.com/(\w+)\.gif$'),
+)
+
+def media_id(url):
+    """The Giphy media id in url, or None for other hosts"""
+    for pattern in GIPHY_URLS:
+        match = pattern.match(url)
+        if match:
+            return match.group(1)
+    return None
+
+def rendition_url(media, name):
+    return f"https://{RENDITION_HOST}/media/{media}/{name}"
+
+def probe(url, timeout=DEFAULT_TIMEOUT, limiter=None):
+    """{width, height, bytes} of the GIF at url from its first 10 bytes, or None"""
+    host = host_of(url)
+    if limiter:
+        limiter.acquire(host)
+    started = time.monotonic()
+    ttfb = None
+    congested = False
+    try:
+        with open_url(url, timeout, extra_headers={'Range': 'bytes=0-9'}) as response:
+            ttfb = time.monotonic() - started
+            status = response.status
+            data = response.read(10)
+            content_range = response.getheader('Content-Range') or ''
+            length = response.getheader('Content-Length')
+    except urllib.error.HTTPError as e:
+        ttfb = time.monotonic() - started
+        congested = e.code in CONGESTION_STATUSES
+        return None
+    except Exception as e:
+        # urllib, http.client and h2 errors alike: a probe never takes its worker down
+        congested = isinstance(getattr(e, 'reason', e), TimeoutError)
+        return None
+    finally:
+        if limiter:
+            limiter.release(host, ttfb, congested)
+    if status not in (200, 206) or len(data) < 10 or data[:6] not in GIF_SIGNATURES:
+        return None
+    total = content_range.rpartition('/')[2] if status == 206 else length
+    return {
+        "width": int.from_bytes(data[6:8], 'little'),
+        "height": int.from_bytes(data[8:10], 'little'),
+        "bytes": int(total) if total and total.isdigit() else None,
+    }
+
+def choose(renditions, target=TARGET_WIDTH):
+    """Name of the smallest rendition at least target wide (capped at the original's width), or None"""
+    available = {name: info for name, info in renditions.items() if info}
+    if not available:
+        return None
+    widest = max(info["width"] for info in available.values())
+    needed = min(target, widest)
+    fits = [name for name, info in available.items() if info["width"] >= needed]
+    # Unknown size sorts last; ties keep RENDITIONS order (smaller renditions first)
+    return min(fits, key=lambda name: (available[name]["bytes"] is None, available[name]["bytes"] or 0,
+                                       RENDITIONS.index(name)))
+
+class RenditionCache:
+    """Probed renditions per media id, persisted between runs"""
+
+    def __init__(self, path=RENDITIONS_PATH, limiter=None):
+        self.path = path
+        self.limiter = limiter
+        self.entries = self._load()
+        self.fresh = {}  # media id -> entry probed by this process, merged into the file by save()
+        self.pending = {}  # media id -> Future of the probes in flight
+        self.chosen = 0
+        self.saved_bytes = 0
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            # Missing or corrupt (e.g. a run killed mid-write): probe again
+            return {}
+
+    def renditions(self, media, timeout=DEFAULT_TIMEOUT):
+        """{rendition name: {width, height, bytes} or None}, probing when not cached"""
+        with self._lock:
+            entry = self.entries.get(media)
+            if entry and time.time() - entry["checked"] < RENDITION_TTL:
+                return entry["renditions"]
+            coalesced = media in self.pending
+            if coalesced:
+                future = self.pending[media]
+            else:
+                future = self.pending[media] = Future()
+        if coalesced:
+            return future.result()
+
+        try:
+            renditions = {name: probe(rendition_url(media, name), timeout, self.limiter) for name in RENDITIONS}
+            future.set_result(renditions)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self.pending[media]
+        # Offline or blocked is not a fact about the GIF: only cache what answered
+        if any(renditions.values()):
+            with self._lock:
+                self.entries[media] = self.fresh[media] = {"checked": round(time.time()), "renditions": renditions}
+        return renditions
+
+    def select(self, url, target=TARGET_WIDTH, timeout=DEFAULT_TIMEOUT):
+        """The rendition URL to try before url, or None to keep url as it is"""
+        media = media_id(url)
+        if media is None or not target:
+            return None
+        name = choose(self.renditions(media, timeout), target)
+        if name is None or name == ORIGINAL:
+            return None
+        return rendition_url(media, name)
+
+    def with_renditions(self, task, target=TARGET_WIDTH, timeout=DEFAULT_TIMEOUT):
+        """task with each Giphy candidate preceded by its best-fitting rendition"""
+        candidates = []
+        for url in task.candidates:
+            rendition = self.select(url, target, timeout)
+            for candidate in (rendition, url):
+                if candidate and candidate not in candidates:
+                    candidates.append(candidate)
+        return task._replace(candidates=candidates)
+
+    def downloaded(self, url):
+        """Count a finished download of url if it came from a rendition smaller than the original"""
+        media = media_id(url)
+        name = url.rpartition('/')[2]
+        if media is None or name == ORIGINAL or url != rendition_url(media, name):
+            return
+        with self._lock:
+            renditions = self.entries.get(media, {}).get("renditions", {})
+            size = (renditions.get(name) or {}).get("bytes")
+            original = (renditions.get(ORIGINAL) or {}).get("bytes")
+            self.chosen += 1
+            if size and original:
+                self.saved_bytes += original - size
+
+    def save(self):
+        """Merge new probes into the file (nothing to write when every media id was cached)"""
+        with self._lock:
+            fresh = dict(self.fresh)
+        if not fresh:
+            return
+        with manifest_lock(self.path):
+            entries = self._load()
+            entries.update(fresh)
+            write_json(self.path, entries)
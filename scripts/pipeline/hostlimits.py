@@ -0,0 +1,250 @@
+"""
+Adaptive per-host concurrency
+
+Each host gets its own concurrency limit, tuned with AIMD (additive
+increase, multiplicative decrease) the same way TCP tunes its window:
+
+    success, normal latency      limit += 1 / limit   (about +1 per window)
+    timeout, 429/503, slow TTFB  limit *= 0.5         (at most once per window)
+
+"Slow" means the time to first byte is well above the host's smoothed
+baseline. Learned limits, baselines and per-connection throughput are saved to
+.media-cache/host-limits.json, so the next run starts where this one left
+off instead of probing from scratch.
+
+The same file keeps each host's health: a decayed count of downloads that
+did or did not produce a valid asset, and when it last failed. rank()
+orders an exercise's mirror URLs by expected time to a valid asset. With
+attempt time t (TTFB + typical size / throughput) and success rate p,
+trying candidates in ascending t / p minimises the expected total. Hosts
+whose success rate falls below DEMOTE_SUCCESS go last. Every
+REPROBE_INTERVAL one task tries a demoted host first, so a mirror that has
+recovered gets its place back.
+"""
+
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+
+from .config import CACHE_DIR
+from .manifest import write_json
+
+LIMITS_PATH = CACHE_DIR / "host-limits.json"
+INITIAL_LIMIT = 2.0
+MIN_LIMIT = 1.0
+MAX_LIMIT = 16.0
+DECREASE_FACTOR = 0.5
+SPIKE_FACTOR = 3.0       # TTFB this many times the baseline counts as congestion
+LATENCY_SMOOTHING = 0.2  # EWMA weight of each new TTFB sample
+
+# Used for hosts we have never downloaded from
+DEFAULT_TTFB = 0.5
+DEFAULT_THROUGHPUT = 1024 * 1024
+DEFAULT_BYTES = 500 * 1024
+
+HEALTH_DECAY = 0.9       # weight left on past outcomes per new one (roughly the last 10 count)
+PRIOR_SUCCESS = 0.8      # an unknown host is assumed to serve most URLs...
+PRIOR_WEIGHT = 2.0       # ...with the weight of two downloads, so one 404 does not demote it
+DEMOTE_SUCCESS = 0.5
+REPROBE_INTERVAL = 6 * 3600
+
+def host_of(url):
+    return urlsplit(url).hostname or ''
+
+class HostState:
+    """Limit, in-flight count and latency baseline for one host"""
+
+    def __init__(self, limit=INITIAL_LIMIT, latency=None, throughput=None, health=None):
+        health = health or {}
+        self.limit = limit
+        self.initial = limit
+        self.latency = latency
+        self.throughput = throughput
+        self.attempts = health.get("attempts", 0.0)
+        self.valid = health.get("valid", 0.0)
+        self.last_attempt = health.get("last_attempt")
+        self.last_failure = health.get("last_failure")
+        self.last_error = health.get("last_error")
+        self.in_flight = 0
+        self.last_decrease = 0.0
+        self.successes = 0
+        self.congestion = 0
+
+    def success_rate(self):
+        """Decayed share of downloads that produced a valid asset, pulled towards PRIOR_SUCCESS"""
+        return (self.valid + PRIOR_SUCCESS * PRIOR_WEIGHT) / (self.attempts + PRIOR_WEIGHT)
+
+    def attempt_seconds(self, size=DEFAULT_BYTES):
+        """Expected duration of one download of size bytes"""
+        return (self.latency or DEFAULT_TTFB) + size / (self.throughput or DEFAULT_THROUGHPUT)
+
+    def demoted(self):
+        return self.success_rate() < DEMOTE_SUCCESS
+
+class HostLimiter:
+    """Blocks callers while a host is at its current concurrency limit"""
+
+    def __init__(self, path=LIMITS_PATH):
+        self.path = path
+        self.hosts = {}
+        self._cond = threading.Condition()
+        self._probed = set()
+        self._listeners = []
+        try:
+            with open(path, 'r') as f:
+                saved_hosts = json.load(f).get("hosts", {})
+        except (OSError, ValueError):
+            # Missing or corrupt (e.g. a run killed mid-write): start fresh
+            saved_hosts = {}
+        for host, saved in saved_hosts.items():
+            latency = saved.get("ttfb_ms")
+            self.hosts[host] = HostState(
+                min(max(saved.get("limit", INITIAL_LIMIT), MIN_LIMIT), MAX_LIMIT),
+                latency / 1000 if latency else None,
+                saved.get("throughput_bps"),
+                saved)
+
+    def _state(self, host):
+        if host not in self.hosts:
+            self.hosts[host] = HostState()
+        return self.hosts[host]
+
+    def acquire(self, host):
+        """Wait for a free slot on host"""
+        with self._cond:
+            state = self._state(host)
+            while state.in_flight >= int(state.limit):
+                self._cond.wait()
+            state.in_flight += 1
+
+    def on_release(self, callback):
+        """Call callback() after every release, e.g. to wake a scheduler waiting for capacity"""
+        self._listeners.append(callback)
+
+    def release(self, host, ttfb=None, congested=False, size=None, seconds=None):
+        """Free a slot and adjust the host's limit from the request's outcome
+
+        size/seconds (body bytes, total request time) update the host's
+        throughput estimate, which the fetch planner uses for ETAs.
+        """
+        self._release(host, ttfb, congested, size, seconds)
+        # Outside our lock: listeners take their own, and may call back into us while holding it
+        for callback in self._listeners:
+            callback()
+
+    def _release(self, host, ttfb, congested, size, seconds):
+        with self._cond:
+            state = self._state(host)
+            state.in_flight -= 1
+            now = time.monotonic()
+
+            spike = (ttfb is not None and state.latency is not None
+                     and ttfb > SPIKE_FACTOR * state.latency)
+            if congested or spike:
+                state.congestion += 1
+                # One burst of failures is one congestion event, not several:
+                # only back off again once a full round trip has passed
+                window = state.latency or 1.0
+                if now - state.last_decrease > window:
+                    state.limit = max(MIN_LIMIT, state.limit * DECREASE_FACTOR)
+                    state.last_decrease = now
+            elif ttfb is not None:
+                state.successes += 1
+                state.limit = min(MAX_LIMIT, state.limit + 1 / state.limit)
+                state.latency = ttfb if state.latency is None else (
+                    (1 - LATENCY_SMOOTHING) * state.latency + LATENCY_SMOOTHING * ttfb)
+                if size and seconds and seconds > ttfb:
+                    rate = size / (seconds - ttfb)
+                    state.throughput = rate if state.throughput is None else (
+                        (1 - LATENCY_SMOOTHING) * state.throughput + LATENCY_SMOOTHING * rate)
+            self._cond.notify_all()
+
+    def record(self, host, valid, error=None):
+        """Count a finished download towards the host's health"""
+        with self._cond:
+            state = self._state(host)
+            state.attempts = state.attempts * HEALTH_DECAY + 1
+            state.valid = state.valid * HEALTH_DECAY + (1 if valid else 0)
+            state.last_attempt = time.time()
+            if not valid:
+                state.last_failure = state.last_attempt
+                state.last_error = error
+
+    def rank(self, urls, probe=True, keep_first=False, peek=False):
+        """urls in the order to try them: lowest expected time to a valid asset first
+
+        Demoted hosts go last. With probe, the first demoted host not tried
+        for REPROBE_INTERVAL goes first instead, once per run; peek shows
+        that order without using up the probe. With keep_first, urls[0] (a
+        plan's chosen URL) stays first and only the fallbacks are ranked.
+        """
+        if keep_first:
+            return list(urls[:1]) + self.rank(urls[1:], probe, peek=peek)
+        now = time.time()
+        with self._cond:
+            states = {host_of(url): self.hosts.get(host_of(url)) or HostState() for url in urls}
+            probe_host = None
+            if probe:
+                probe_host = next((host for host, state in states.items()
+                                   if state.demoted() and host not in self._probed
+                                   and now - (state.last_attempt or 0) >= REPROBE_INTERVAL), None)
+                if probe_host and not peek:
+                    self._probed.add(probe_host)
+
+            def key(item):
+                index, url = item
+                state = states[host_of(url)]
+                return (host_of(url) != probe_host, state.demoted(),
+                        state.attempt_seconds() / state.success_rate(), index)
+            return [url for _, url in sorted(enumerate(urls), key=key)]
+
+    def health(self, host):
+        """(success rate, demoted, last failure epoch or None, last error) for a host"""
+        with self._cond:
+            state = self.hosts.get(host) or HostState()
+            return state.success_rate(), state.demoted(), state.last_failure, state.last_error
+
+    def has_capacity(self, host):
+        """Whether acquire(host) would return without waiting"""
+        with self._cond:
+            state = self._state(host)
+            return state.in_flight < int(state.limit)
+
+    def limit(self, host):
+        with self._cond:
+            return self._state(host).limit
+
+    def estimates(self, host):
+        """(limit, ttfb seconds or None, bytes/s per connection or None) for a host"""
+        with self._cond:
+            state = self._state(host)
+            return state.limit, state.latency, state.throughput
+
+    def save(self):
+        """Persist learned limits for the next run"""
+        with self._cond:
+            hosts = {
+                host: {
+                    "limit": round(state.limit, 2),
+                    "ttfb_ms": round(state.latency * 1000) if state.latency else None,
+                    "throughput_bps": round(state.throughput) if state.throughput else None,
+                    "attempts": round(state.attempts, 3),
+                    "valid": round(state.valid, 3),
+                    "last_attempt": round(state.last_attempt) if state.last_attempt else None,
+                    "last_failure": round(state.last_failure) if state.last_failure else None,
+                    "last_error": state.last_error,
+                    "updated": round(time.time()),
+                }
+                for host, state in self.hosts.items()
+            }
+        write_json(self.path, {"hosts": hosts})
+
+    def summary(self):
+        """[(host, start limit, end limit, ok, congestion events, success rate)] for hosts used this run"""
+        with self._cond:
+            return sorted(
+                (host, state.initial, state.limit, state.successes, state.congestion, state.success_rate())
+                for host, state in self.hosts.items()
+                if state.successes or state.congestion
+            )
@@ -0,0 +1,349 @@
+"""
+HTTP/2 for the shared fetcher
+
+HTTPS hosts are offered h2 and http/1.1 via ALPN. A host that picks h2 gets
+one connection per run, and every download from that host becomes a stream
+on it instead of a separate TCP+TLS connection. A host that picks
+http/1.1, or any host when the optional h2 library is missing
+(pip install h2), is remembered and served by the normal urllib path.
+Hosts that picked http/1.1 are also saved to .media-cache/alpn-cache.json
+for HTTP1_TTL, so later runs skip the extra TLS handshake that only found
+out h2 is not on offer.
+
+Each connection has one I/O thread that owns the socket. Requests are
+queued under a lock and the I/O thread is woken to send them, so TLS reads
+and writes never happen on two threads at once.
+"""
+
+import json
+import queue
+import select
+import selectors
+import socket
+import ssl
+import threading
+import time
+from urllib.parse import urlsplit
+
+from . import connect
+from .config import CACHE_DIR
+from .manifest import write_json
+
+try:
+    import h2.config
+    import h2.connection
+    import h2.events
+    import h2.exceptions
+except ImportError:
+    h2 = None
+
+ALPN_PROTOCOLS = ['h2', 'http/1.1']
+ALPN_CACHE_PATH = CACHE_DIR / "alpn-cache.json"
+HTTP1_TTL = 24 * 3600
+RECV_SIZE = 65536
+CONNECTION_WINDOW = 16 * 1024 * 1024
+
+class H2Closed(OSError):
+    """The HTTP/2 connection went away before the stream finished"""
+
+class H2Response:
+    """Enough of http.client.HTTPResponse for fetcher.download()"""
+
+    version = 20
+
+    def __init__(self, connection, stream_id, url):
+        self.url = url
+        self.status = None
+        self.headers = {}
+        self._connection = connection
+        self._stream_id = stream_id
+        self._chunks = queue.Queue()
+        self._buffer = b''
+        self._ended = False
+        self._received_headers = threading.Event()
+        self._error = None
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name.lower(), default)
+
+    def read(self, amt=None, timeout=None):
+        """Read up to amt body bytes (everything when amt is None); b'' at the end"""
+        while not self._ended and (amt is None or len(self._buffer) < amt):
+            try:
+                chunk = self._chunks.get(timeout=timeout or self._connection.timeout)
+            except queue.Empty:
+                raise socket.timeout("HTTP/2 stream read timed out")
+            if chunk is None:
+                self._ended = True
+            elif isinstance(chunk, Exception):
+                raise chunk
+            else:
+                self._buffer += chunk
+                self._connection.acknowledge(self._stream_id, len(chunk))
+        if amt is None:
+            data, self._buffer = self._buffer, b''
+        else:
+            data, self._buffer = self._buffer[:amt], self._buffer[amt:]
+        return data
+
+    def close(self):
+        if not self._ended:
+            self._connection.cancel(self._stream_id)
+            self._ended = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class H2Connection:
+    """One multiplexed HTTP/2 connection shared by all threads fetching from a host"""
+
+    def __init__(self, tls_sock, host, timeout):
+        self.host = host
+        self.timeout = timeout
+        self.closed = False
+        self._sock = tls_sock
+        self._sock.setblocking(False)
+        self._lock = threading.Condition()
+        self._streams = {}
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+
+        config = h2.config.H2Configuration(client_side=True, header_encoding='utf-8')
+        self._conn = h2.connection.H2Connection(config=config)
+        self._conn.initiate_connection()
+        self._conn.increment_flow_control_window(CONNECTION_WINDOW)
+        self._thread = threading.Thread(target=self._io_loop, name=f"h2-{host}", daemon=True)
+        self._thread.start()
+        self._wake()
+
+    def _wake(self):
+        try:
+            self._wake_w.send(b'\0')
+        except OSError:
+            pass
+
+    def request(self, url, headers):
+        """Send a GET for url and wait for the response headers"""
+        parts = urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        with self._lock:
+            # Stay under the server's stream limit; queue here instead of getting RST_STREAM
+            while not self.closed and (self._conn.open_outbound_streams
+                                       >= self._conn.remote_settings.max_concurrent_streams):
+                self._lock.wait(self.timeout)
+            if self.closed:
+                raise H2Closed(f"HTTP/2 connection to {self.host} closed")
+            stream_id = self._conn.get_next_available_stream_id()
+            response = H2Response(self, stream_id, url)
+            self._streams[stream_id] = response
+            self._conn.send_headers(stream_id, [
+                (':method', 'GET'),
+                (':authority', parts.netloc),
+                (':scheme', 'https'),
+                (':path', path),
+            ] + [(name.lower(), value) for name, value in headers.items()], end_stream=True)
+        self._wake()
+
+        if not response._received_headers.wait(self.timeout):
+            response.close()
+            raise socket.timeout(f"HTTP/2 response from {self.host} timed out")
+        if response._error:
+            raise response._error
+        return response
+
+    def acknowledge(self, stream_id, length):
+        """Give flow-control credit back once a chunk has been consumed"""
+        with self._lock:
+            if self.closed:
+                return
+            self._conn.acknowledge_received_data(length, stream_id)
+        self._wake()
+
+    def cancel(self, stream_id):
+        with self._lock:
+            if stream_id in self._streams and not self.closed:
+                del self._streams[stream_id]
+                try:
+                    self._conn.reset_stream(stream_id)
+                except h2.exceptions.StreamClosedError:
+                    pass
+                self._lock.notify_all()
+        self._wake()
+
+    def _io_loop(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self._sock, selectors.EVENT_READ)
+        selector.register(self._wake_r, selectors.EVENT_READ)
+        error = None
+        try:
+            while not self.closed:
+                self._flush()
+                for key, _ in selector.select():
+                    if key.fileobj is self._wake_r:
+                        try:
+                            self._wake_r.recv(4096)
+                        except BlockingIOError:
+                            pass
+                        continue
+                    self._receive()
+        except (OSError, ssl.SSLError, h2.exceptions.ProtocolError) as e:
+            error = e
+        finally:
+            selector.close()
+            self._shutdown(error or H2Closed(f"HTTP/2 connection to {self.host} closed"))
+
+    def _flush(self):
+        with self._lock:
+            data = self._conn.data_to_send()
+        view = memoryview(data)
+        while view:
+            try:
+                sent = self._sock.send(view)
+            except (ssl.SSLWantWriteError, BlockingIOError):
+                select.select([], [self._sock], [], self.timeout)
+                continue
+            view = view[sent:]
+
+    def _receive(self):
+        while True:
+            try:
+                data = self._sock.recv(RECV_SIZE)
+            except (ssl.SSLWantReadError, BlockingIOError):
+                return
+            if not data:
+                raise H2Closed(f"{self.host} closed the connection")
+            with self._lock:
+                events = self._conn.receive_data(data)
+                for event in events:
+                    self._dispatch(event)
+                self._lock.notify_all()
+            if not self._sock.pending():
+                return
+
+    def _dispatch(self, event):
+        response = self._streams.get(getattr(event, 'stream_id', None))
+        if isinstance(event, h2.events.ResponseReceived) and response:
+            response.headers = {name: value for name, value in event.headers}
+            response.status = int(response.headers.get(':status', 0))
+            response._received_headers.set()
+        elif isinstance(event, h2.events.DataReceived):
+            if response:
+                response._chunks.put(event.data)
+                if event.flow_controlled_length > len(event.data):
+                    # Padding counts against the window but never reaches the reader
+                    self._conn.acknowledge_received_data(
+                        event.flow_controlled_length - len(event.data), event.stream_id)
+            else:
+                self._conn.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+        elif isinstance(event, h2.events.StreamEnded) and response:
+            response._chunks.put(None)
+            del self._streams[event.stream_id]
+        elif isinstance(event, h2.events.StreamReset) and response:
+            error = H2Closed(f"stream reset by {self.host} (error {event.error_code})")
+            response._error = error
+            response._chunks.put(error)
+            response._received_headers.set()
+            del self._streams[event.stream_id]
+        elif isinstance(event, h2.events.ConnectionTerminated):
+            self.closed = True
+
+    def _shutdown(self, error):
+        with self._lock:
+            self.closed = True
+            for response in self._streams.values():
+                response._error = error
+                response._chunks.put(error)
+                response._received_headers.set()
+            self._streams.clear()
+            self._lock.notify_all()
+        for sock in (self._sock, self._wake_r, self._wake_w):
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+class H2Pool:
+    """HTTP/2 connections by (host, port), plus which protocol each HTTPS origin negotiated"""
+
+    def __init__(self, context=None, path=ALPN_CACHE_PATH):
+        self.context = context or ssl.create_default_context()
+        self.context.set_alpn_protocols(ALPN_PROTOCOLS)
+        self.path = path
+        self.protocols = {}
+        self._http1 = self._load_http1()
+        self._connections = {}
+        self._lock = threading.Lock()
+        self._host_locks = {}
+
+    def _load_http1(self):
+        """{"host:port": checked} for hosts that recently negotiated http/1.1"""
+        try:
+            with open(self.path, 'r') as f:
+                saved = json.load(f).get("http1", {})
+        except (OSError, ValueError):
+            return {}
+        now = time.time()
+        return {origin: checked for origin, checked in saved.items() if now - checked < HTTP1_TTL}
+
+    def _remember_http1(self, host, port):
+        with self._lock:
+            self._http1[f"{host}:{port}"] = round(time.time())
+            try:
+                write_json(self.path, {"http1": self._http1})
+            except OSError:
+                pass
+
+    def _connection(self, host, port, timeout):
+        key = (host, port)
+        with self._lock:
+            host_lock = self._host_locks.setdefault(key, threading.Lock())
+        # Concurrent first requests to a host share the one handshake
+        with host_lock:
+            existing = self._connections.get(key)
+            if existing and not existing.closed:
+                return existing
+            # Another thread's handshake may have just found out the host is http/1.1
+            if self.protocols.get(key, 'h2') != 'h2':
+                return None
+            sock = connect.connect((host, port), timeout)
+            try:
+                tls = self.context.wrap_socket(sock, server_hostname=host)
+            except BaseException:
+                sock.close()
+                raise
+            protocol = tls.selected_alpn_protocol() or 'http/1.1'
+            self.protocols[key] = protocol
+            if protocol != 'h2':
+                tls.close()
+                self._remember_http1(host, port)
+                return None
+            self._connections[key] = H2Connection(tls, host, timeout)
+            return self._connections[key]
+
+    def open(self, url, headers, timeout):
+        """Fetch url over HTTP/2, or return None if the host should use HTTP/1.1"""
+        if h2 is None:
+            return None
+        parts = urlsplit(url)
+        key = (parts.hostname, parts.port or 443)
+        if parts.scheme != 'https' or self.protocols.get(key, 'h2') != 'h2':
+            return None
+        if f"{key[0]}:{key[1]}" in self._http1:
+            self.protocols[key] = 'http/1.1'
+            return None
+        connection = self._connection(*key, timeout)
+        if connection is None:
+            return None
+        return connection.request(url, headers)
+
+    def close(self):
+        with self._lock:
+            for connection in self._connections.values():
+                connection.closed = True
+                connection._wake()
+            self._connections.clear()
@@ -0,0 +1,97 @@
+"""
+Crash-safe run journal
+
+An append-only JSON-lines log of what a run has done. Every finished task is
+fsync'd before the run moves on, so after Ctrl-C, a crash or a reboot the
+next run replays the journal and only does the unfinished work.
+
+Record statuses:
+    started            task began (no fsync; a crash here just means "redo")
+    candidate-failed   one source URL failed; skipped when the task resumes
+    done               task finished, with its outcome fields
+    failed             every candidate failed
+
+A journal is deleted when its run completes, so a fresh run starts clean
+while an interrupted one resumes.
+"""
+
+import json
+import os
+import threading
+import time
+
+from .config import CACHE_DIR
+
+JOURNAL_DIR = CACHE_DIR / "journal"
+FINISHED = ('done', 'failed')
+
+class Journal:
+    """Append-only task journal for one command"""
+
+    def __init__(self, name, directory=JOURNAL_DIR):
+        directory.mkdir(parents=True, exist_ok=True)
+        self.path = directory / f"{name}.jsonl"
+        self.tasks = {}
+        self.failed_candidates = {}
+        self.resumed = self._replay()
+        self._lock = threading.Lock()
+        self._file = open(self.path, 'a')
+
+    def _replay(self):
+        """Rebuild task state from an existing journal; returns records replayed"""
+        if not self.path.exists():
+            return 0
+        count = 0
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A crash mid-write leaves at most one torn line at the end
+                    continue
+                self._apply(record)
+                count += 1
+        return count
+
+    def _apply(self, record):
+        task_id = record["task"]
+        if record["status"] == 'candidate-failed':
+            self.failed_candidates.setdefault(task_id, set()).add(record.get("url"))
+        else:
+            self.tasks[task_id] = record
+
+    def record(self, task_id, status, **fields):
+        """Append a record; everything except 'started' is fsync'd"""
+        record = {"task": task_id, "status": status, "ts": round(time.time(), 3), **fields}
+        line = json.dumps(record, sort_keys=True) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            if status != 'started':
+                os.fsync(self._file.fileno())
+            self._apply(record)
+        return record
+
+    def is_finished(self, task_id):
+        """Whether a task reached done/failed in this run"""
+        record = self.tasks.get(task_id)
+        return bool(record) and record["status"] in FINISHED
+
+    def in_progress(self):
+        """Tasks that were started but never finished (interrupted)"""
+        return [task_id for task_id, record in self.tasks.items() if record["status"] == 'started']
+
+    def outcome(self, task_id):
+        """Latest record for a task, or None"""
+        return self.tasks.get(task_id)
+
+    def skip_candidates(self, task_id):
+        """URLs already known to fail for this task"""
+        return self.failed_candidates.get(task_id, set())
+
+    def close(self, complete=False):
+        """Close the journal; a completed run's journal is removed"""
+        with self._lock:
+            self._file.close()
+        if complete:
+            self.path.unlink(missing_ok=True)
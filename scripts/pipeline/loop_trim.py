@@ -0,0 +1,226 @@
+"""
+Rep-loop detection
+
+Many scraped exercise GIFs show the same movement several times in a row.
+This stage finds the dominant loop period from frame-to-frame similarity and
+trims the animation to a single repetition that loops seamlessly.
+
+Usage:
+    python3 scripts/media_pipeline.py loop-trim
+    python3 scripts/media_pipeline.py loop-trim --dry-run bench-press.gif
+"""
+
+from .config import OUTPUT_DIR, format_size, selected_files
+from .frames import gray_vectors, load_clip, require_imaging, save_gif
+from .journal import Journal
+from .manifest import asset_entry, file_sha256, load_manifest, save_manifest
+from .sourcecache import SourceCache, place_original
+
+# Shortest repetition we accept, in frames
+MIN_PERIOD = 4
+
+# A lag counts as a repetition when frames that far apart differ by at most
+# this fraction of the clip's typical frame-to-frame distance
+MATCH_RATIO = 0.35
+
+# Clips whose frames barely differ (planks, wall sits) have no loop to find
+MIN_MOTION = 1e-4
+
+def distance_matrix(vectors):
+    """Mean squared distance between every pair of frames"""
+    np, _ = require_imaging()
+    norms = np.einsum('ij,ij->i', vectors, vectors)
+    dist = norms[:, None] + norms[None, :] - 2.0 * (vectors @ vectors.T)
+    return np.maximum(dist, 0.0) / vectors.shape[1]
+
+def lag_profile(dist):
+    """Average distance between frames k apart, for k = 0..n-1 (autocorrelation of the clip)"""
+    np, _ = require_imaging()
+    n = dist.shape[0]
+    return np.array([np.diagonal(dist, k).mean() for k in range(n)])
+
+def find_loop(vectors, min_period=MIN_PERIOD, match_ratio=MATCH_RATIO):
+    """Find (period, start, seam_error) for the dominant repetition, or None"""
+    np, _ = require_imaging()
+    n = len(vectors)
+    if n < 2 * min_period:
+        return None
+
+    dist = distance_matrix(vectors)
+    profile = lag_profile(dist)
+
+    # Typical distance between unrelated frames of this clip
+    scale = float(np.median(dist[np.triu_indices(n, 1)]))
+    if scale < MIN_MOTION:
+        return None
+
+    # The first local minimum below the match threshold is the fundamental
+    # period; later minima are its multiples. Requiring k <= n // 2 means
+    # the clip holds at least two repetitions.
+    for k in range(min_period, n // 2 + 1):
+        prev_ok = profile[k] <= profile[k - 1]
+        next_ok = k + 1 >= n or profile[k] <= profile[k + 1]
+        if prev_ok and next_ok and profile[k] <= match_ratio * scale:
+            # Start where frame s and frame s+k match best so the cut loops cleanly
+            seams = np.diagonal(dist, k)
+            start = int(np.argmin(seams))
+            return k, start, float(seams[start] / scale)
+
+    return None
+
+def partial_paths(filepath):
+    """Temp files an interrupted trim can leave behind
+
+    Hidden and not *.gif, so a leftover is never mistaken for a catalog asset.
+    """
+    trim_path = filepath.with_name(f".{filepath.stem}.trim.tmp")
+    return [trim_path, trim_path.with_name(trim_path.name + ".tmp")]
+
+def trim_file(filepath, manifest, dry_run=False, min_period=MIN_PERIOD, match_ratio=MATCH_RATIO, cache=None):
+    """Analyze one GIF and trim it to a single repetition; returns a status string
+
+    With a source cache, the held original is analyzed rather than the
+    published file, which may be an earlier trim.
+    """
+    entry = asset_entry(manifest, filepath.name)
+    source = filepath
+    if cache:
+        source = cache.original(filepath.name) or filepath
+    sha = file_sha256(source)
+    previous = entry.get("loop")
+    if previous and sha in (previous.get("source_sha256"), previous.get("output_sha256")):
+        # Reading the original says nothing about public/; it must still hold our output
+        if source == filepath or file_sha256(filepath) in (previous["output_sha256"], entry.get("sha256")):
+            return 'unchanged', previous
+
+    clip = load_clip(source)
+    original_bytes = source.stat().st_size
+    original_ms = sum(clip.durations)
+    loop = find_loop(gray_vectors(clip.frames), min_period, match_ratio)
+
+    record = {
+        "source_sha256": sha,
+        "output_sha256": sha,
+        "original_frames": len(clip.frames),
+        "trimmed_frames": len(clip.frames),
+        "original_ms": original_ms,
+        "trimmed_ms": original_ms,
+        "original_bytes": original_bytes,
+        "trimmed_bytes": original_bytes,
+        "period_frames": None,
+        "repetitions": 1,
+        "trimmed": False,
+    }
+
+    status = 'single'
+    if loop:
+        period, start, seam_error = loop
+        frames = clip.frames[start:start + period]
+        durations = clip.durations[start:start + period]
+        record.update({
+            "period_frames": period,
+            "start_frame": start,
+            "seam_error": round(seam_error, 4),
+            "repetitions": round(len(clip.frames) / period, 2),
+            "trimmed_frames": period,
+            "trimmed_ms": sum(durations),
+        })
+        status = 'loop'
+
+        if not dry_run:
+            tmp_path = partial_paths(filepath)[0]
+            trimmed_bytes = save_gif(tmp_path, frames, durations)
+            # Re-encoding can lose to a well-optimized multi-rep source
+            if trimmed_bytes < original_bytes:
+                tmp_path.replace(filepath)
+                record.update({
+                    "trimmed": True,
+                    "trimmed_bytes": trimmed_bytes,
+                    "output_sha256": file_sha256(filepath),
+                })
+                status = 'trimmed'
+            else:
+                tmp_path.unlink()
+                record.update({"trimmed_frames": len(clip.frames), "trimmed_ms": original_ms})
+
+    if not dry_run:
+        if status != 'trimmed':
+            place_original(source, filepath)
+        entry["loop"] = record
+        entry["sha256"] = record["output_sha256"]
+        entry["bytes"] = record["trimmed_bytes"]
+    return status, record
+
+def run(args):
+    files = selected_files(args.files)
+    manifest = load_manifest()
+    cache = SourceCache()
+
+    print(f"🔁 Rep-loop trimming {len(files)} GIFs{' (dry run)' if args.dry_run else ''}...\n")
+
+    journal = None if args.dry_run else Journal('loop-trim')
+    if journal and journal.resumed:
+        # Throw away half-written output from the interrupted run; those files are redone
+        for task_id in journal.in_progress():
+            for path in partial_paths(OUTPUT_DIR / task_id.split(':', 1)[1]):
+                path.unlink(missing_ok=True)
+        print(f"↩️  Resuming interrupted run ({len(journal.in_progress())} file(s) were in progress)\n")
+
+    saved = 0
+    counts = {'trimmed': 0, 'loop': 0, 'single': 0, 'unchanged': 0}
+    for i, filepath in enumerate(files, 1):
+        progress = f"[{i}/{len(files)}]"
+        print(f"{progress} {filepath.name}... ", end='', flush=True)
+
+        task_id = f"loop-trim:{filepath.name}"
+        if journal and journal.is_finished(task_id):
+            counts['unchanged'] += 1
+            print("⏭️  (done before interruption)")
+            continue
+
+        if journal:
+            journal.record(task_id, 'started')
+        status, record = trim_file(filepath, manifest, args.dry_run, args.min_period, args.match_ratio, cache)
+        counts[status] += 1
+        if status == 'unchanged':
+            print("⏭️  (unchanged)")
+            if journal:
+                journal.record(task_id, 'done', result=status)
+            continue
+
+        if status == 'trimmed':
+            saved += record["original_bytes"] - record["trimmed_bytes"]
+            print(f"✂️  {record['repetitions']} reps → 1 "
+                  f"({format_size(record['original_bytes'])} → {format_size(record['trimmed_bytes'])})")
+        elif status == 'loop':
+            print(f"🔁 {record['repetitions']} reps, period {record['period_frames']} frames"
+                  f"{'' if args.dry_run else ' (kept original, re-encode was larger)'}")
+        else:
+            print("➖ single repetition")
+
+        # Save as we go so an interrupted run keeps its progress
+        if not args.dry_run:
+            save_manifest(manifest, precompress=False)
+            journal.record(task_id, 'done', result=status, sha256=record["output_sha256"])
+
+    if journal:
+        save_manifest(manifest)
+        journal.close(complete=True)
+
+    print("\n" + "="*60)
+    print(f"✂️  Trimmed: {counts['trimmed']}")
+    print(f"🔁 Loops kept: {counts['loop']}")
+    print(f"➖ Single rep: {counts['single']}")
+    print(f"⏭️  Unchanged: {counts['unchanged']}")
+    if saved:
+        print(f"💾 Saved: {format_size(saved)}")
+    print("="*60 + "\n")
+
+def register(subparsers):
+    parser = subparsers.add_parser('loop-trim', help='Trim multi-rep GIFs to a single repetition')
+    parser.add_argument('files', nargs='*', help='GIF filenames in public/exercise-gifs (default: all)')
+    parser.add_argument('--dry-run', action='store_true', help='Analyze only, do not rewrite files')
+    parser.add_argument('--min-period', type=int, default=MIN_PERIOD, help='Shortest repetition in frames')
+    parser.add_argument('--match-ratio', type=float, default=MATCH_RATIO,
+                        help='Max distance (relative to typical) for two frames to count as the same pose')
+    parser.set_defaults(func=run)
@@ -0,0 +1,205 @@
+"""
+Media manifest
+
+The manifest (public/exercise-gifs/media-manifest.json) records what each
+pipeline stage did to every asset so rebuilds can skip unchanged work.
+
+Structure:
+    {
+      "version": 1,
+      "assets": {
+        "bench-press.gif": {
+          "sha256": "...",
+          "bytes": 123456,
+          "loop": {...}          # written by the loop-trim stage
+        }
+      }
+    }
+
+Text artifacts the app fetches (this manifest, the precache manifest) are
+published with precompressed .gz and .br siblings at maximum compression,
+for nginx's gzip_static/brotli_static. A content-hashed copy
+(media-manifest.<hash>.json) is written too. artifacts.json in the same
+directory maps each artifact to its current hashed name, so clients can
+cache that copy forever.
+"""
+
+import contextlib
+import fcntl
+import gzip
+import hashlib
+import json
+import os
+import re
+
+from .config import CACHE_DIR, OUTPUT_DIR
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MANIFEST_PATH = OUTPUT_DIR / "media-manifest.json"
+MANIFEST_VERSION = 1
+ARTIFACTS_INDEX = "artifacts.json"
+HASH_LENGTH = 10
+PRECOMPRESSED_SUFFIXES = ('.gz', '.br')
+
+def file_sha256(path):
+    """Hash a file in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_manifest(path=MANIFEST_PATH):
+    """Load the manifest, or return an empty one"""
+    if not path.exists():
+        return {"version": MANIFEST_VERSION, "assets": {}}
+    with open(path, 'r') as f:
+        manifest = json.load(f)
+    manifest.setdefault("version", MANIFEST_VERSION)
+    manifest.setdefault("assets", {})
+    return manifest
+
+def write_bytes(path, data):
+    """Write a file atomically so readers never see a partial file"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def write_json(path, data, precompress=False):
+    """Write JSON atomically; precompress=True publishes it as a text artifact"""
+    text = json.dumps(data, indent=2, sort_keys=True) + "\n"
+    if precompress:
+        return write_text_artifact(path, text)
+    write_bytes(path, text.encode('utf-8'))
+
+def compress_siblings(path, data):
+    """Write path.gz and path.br next to path; returns {suffix: bytes or None}"""
+    sizes = {}
+    # mtime=0 keeps the .gz byte-identical across rebuilds of the same content
+    gz = gzip.compress(data, compresslevel=9, mtime=0)
+    write_bytes(path.with_name(path.name + '.gz'), gz)
+    sizes['.gz'] = len(gz)
+    br_path = path.with_name(path.name + '.br')
+    if brotli is not None:
+        br = brotli.compress(data, mode=brotli.MODE_TEXT, quality=11)
+        write_bytes(br_path, br)
+        sizes['.br'] = len(br)
+    else:
+        # A stale .br would be served in place of the new content
+        br_path.unlink(missing_ok=True)
+        sizes['.br'] = None
+    return sizes
+
+def drop_precompressed(path):
+    """Remove path's .gz/.br siblings (after writing path without them)"""
+    for suffix in PRECOMPRESSED_SUFFIXES:
+        path.with_name(path.name + suffix).unlink(missing_ok=True)
+
+def hashed_path(path, sha256):
+    """media-manifest.json -> media-manifest.<hash>.json"""
+    return path.with_name(f"{path.stem}.{sha256[:HASH_LENGTH]}{path.suffix}")
+
+def _remove_hashed_copies(path, keep):
+    """Delete hashed copies of path (and their siblings) except the names in keep"""
+    pattern = re.compile(rf"{re.escape(path.stem)}\.[0-9a-f]{{{HASH_LENGTH}}}{re.escape(path.suffix)}")
+    for candidate in path.parent.glob(f"{path.stem}.*"):
+        base = candidate.name[:-3] if candidate.suffix in PRECOMPRESSED_SUFFIXES else candidate.name
+        if pattern.fullmatch(base) and base not in keep:
+            candidate.unlink()
+
+def write_text_artifact(path, text):
+    """Publish a text file with .gz/.br siblings and a content-hashed copy
+
+    The previous hashed copy is kept, so a client that read the old
+    artifacts.json can still fetch it. Returns the artifacts.json entry.
+    """
+    data = text.encode('utf-8')
+    sha256 = hashlib.sha256(data).hexdigest()
+    write_bytes(path, data)
+    sizes = compress_siblings(path, data)
+
+    hashed = hashed_path(path, sha256)
+    if not hashed.exists():
+        write_bytes(hashed, data)
+        compress_siblings(hashed, data)
+
+    index_path = path.parent / ARTIFACTS_INDEX
+    with manifest_lock(index_path):
+        index = {}
+        if index_path.exists():
+            with open(index_path, 'r') as f:
+                index = json.load(f)
+        previous = index.get(path.name, {})
+        entry = {
+            "file": hashed.name,
+            "sha256": sha256,
+            "bytes": len(data),
+            "gzip_bytes": sizes['.gz'],
+            "br_bytes": sizes['.br'],
+            "previous": previous.get("file") if previous.get("file") != hashed.name else previous.get("previous"),
+        }
+        index[path.name] = entry
+        _remove_hashed_copies(path, [name for name in (entry["file"], entry["previous"]) if name])
+        index_text = json.dumps(index, indent=2, sort_keys=True) + "\n"
+        write_bytes(index_path, index_text.encode('utf-8'))
+        compress_siblings(index_path, index_text.encode('utf-8'))
+    return entry
+
+def format_compressed(entry):
+    """Sizes of an artifacts.json entry, e.g. 'gzip 4,210 B, br 3,577 B'"""
+    br = f"br {entry['br_bytes']:,} B" if entry["br_bytes"] is not None else "no .br (pip install brotli)"
+    return f"{entry['bytes']:,} B, gzip {entry['gzip_bytes']:,} B, {br}"
+
+def save_manifest(manifest, path=MANIFEST_PATH, precompress=True):
+    """Write the manifest
+
+    Saves in the middle of a run pass precompress=False. The stale .gz/.br
+    are dropped then, and the final save publishes fresh ones.
+    """
+    if precompress:
+        write_json(path, manifest, precompress=True)
+    else:
+        write_json(path, manifest)
+        drop_precompressed(path)
+
+def asset_entry(manifest, filename):
+    """Get (or create) the manifest entry for an asset"""
+    return manifest["assets"].setdefault(filename, {})
+
+def update_file_info(entry, filepath):
+    """Refresh the hash and size recorded for an asset"""
+    entry["sha256"] = file_sha256(filepath)
+    entry["bytes"] = filepath.stat().st_size
+    return entry
+
+@contextlib.contextmanager
+def manifest_lock(path=MANIFEST_PATH):
+    """Hold an exclusive lock on the manifest across processes"""
+    lock_dir = CACHE_DIR / "locks"
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    with open(lock_dir / f"{path.name}.lock", 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+def merge_asset(filename, entry, path=MANIFEST_PATH):
+    """Merge one asset's entry into the manifest on disk (safe with concurrent workers)"""
+    with manifest_lock(path):
+        manifest = load_manifest(path)
+        manifest["assets"].setdefault(filename, {}).update(entry)
+        # Compressing on every merge would serialize the workers; see publish_manifest()
+        save_manifest(manifest, path, precompress=False)
+
+def publish_manifest(path=MANIFEST_PATH):
+    """Precompress the manifest as it is on disk (after a batch of merge_asset calls)"""
+    with manifest_lock(path):
+        if path.exists():
+            write_text_artifact(path, path.read_text())
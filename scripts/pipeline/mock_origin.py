@@ -0,0 +1,205 @@
+"""
+Local mock origin
+
+Serves a directory over HTTPS so the fetcher can be tested without hitting
+the real hosts. ALPN offers h2 (when the optional h2 library is installed)
+and http/1.1, so one origin exercises both fetcher paths;
+--http1-only makes it behave like a host without HTTP/2.
+
+A self-signed certificate for localhost/127.0.0.1 is generated with the
+openssl CLI on first use. Point Python at it with SSL_CERT_FILE.
+
+Usage:
+    python3 scripts/media_pipeline.py mock-origin --dir /tmp/gifs --port 8443
+    python3 scripts/media_pipeline.py mock-origin --dir /tmp/gifs --port 8444 --http1-only
+
+    SSL_CERT_FILE=.media-cache/mock-origin/cert.pem \\
+        python3 scripts/media_pipeline.py fetch --url-file urls.txt --output-dir /tmp/out
+"""
+
+import functools
+import heapq
+import mimetypes
+import os
+import select
+import shutil
+import ssl
+import subprocess
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from .config import CACHE_DIR, PipelineError
+
+try:
+    import h2.config
+    import h2.connection
+    import h2.events
+except ImportError:
+    h2 = None
+
+CERT_DIR = CACHE_DIR / "mock-origin"
+DEFAULT_PORT = 8443
+
+def ensure_certificate(directory=CERT_DIR):
+    """Create (once) a self-signed certificate for localhost; returns (cert, key)"""
+    cert = directory / "cert.pem"
+    key = directory / "key.pem"
+    if cert.exists() and key.exists():
+        return cert, key
+    if not shutil.which('openssl'):
+        raise PipelineError("openssl not found; pass --cert and --key instead")
+    # Generate into a private directory and rename it into place, so two
+    # origins started together never load a mismatched cert/key pair
+    staging = directory.with_name(f"{directory.name}.{os.getpid()}.tmp")
+    staging.mkdir(parents=True, exist_ok=True)
+    subprocess.run([
+        'openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '365',
+        '-subj', '/CN=localhost', '-addext', 'subjectAltName=DNS:localhost,IP:127.0.0.1',
+        '-keyout', str(staging / key.name), '-out', str(staging / cert.name),
+    ], check=True, capture_output=True)
+    try:
+        os.rename(staging, directory)
+    except OSError:
+        # Someone else's pair won the rename, or the directory holds stale
+        # files (a key without its cert); in the second case replace them
+        if not (cert.exists() and key.exists()):
+            directory.mkdir(parents=True, exist_ok=True)
+            os.replace(staging / key.name, key)
+            os.replace(staging / cert.name, cert)
+        shutil.rmtree(staging, ignore_errors=True)
+    if not (cert.exists() and key.exists()):
+        raise PipelineError(f"Could not create a certificate in {directory}; pass --cert and --key instead")
+    return cert, key
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+class MockOrigin(ThreadingHTTPServer):
+    """HTTPS server that hands h2 connections to serve_h2() and the rest to http.server"""
+
+    daemon_threads = True
+
+    def __init__(self, address, directory, context, latency=0.0):
+        self.directory = Path(directory)
+        self.context = context
+        self.latency = latency
+        self.protocols = {'h2': 0, 'http/1.1': 0}
+        handler = functools.partial(QuietHandler, directory=str(directory))
+        super().__init__(address, handler)
+
+    def get_request(self):
+        sock, address = self.socket.accept()
+        # Handshake in the connection's thread, not the accept loop
+        return self.context.wrap_socket(sock, server_side=True, do_handshake_on_connect=False), address
+
+    def finish_request(self, request, client_address):
+        try:
+            request.do_handshake()
+        except (ssl.SSLError, OSError):
+            return
+        protocol = request.selected_alpn_protocol() or 'http/1.1'
+        self.protocols[protocol] = self.protocols.get(protocol, 0) + 1
+        if protocol == 'h2':
+            self.serve_h2(request)
+        else:
+            if self.latency:
+                time.sleep(self.latency)
+            super().finish_request(request, client_address)
+
+    def resolve(self, path):
+        """(status, headers, body) for a request path"""
+        target = (self.directory / path.split('?', 1)[0].lstrip('/')).resolve()
+        if self.directory.resolve() not in target.parents or not target.is_file():
+            return 404, [('content-type', 'text/plain')], b'not found'
+        body = target.read_bytes()
+        content_type = mimetypes.guess_type(target.name)[0] or 'application/octet-stream'
+        return 200, [('content-type', content_type), ('content-length', str(len(body)))], body
+
+    def serve_h2(self, sock):
+        """Minimal single-threaded HTTP/2 server loop for one connection"""
+        conn = h2.connection.H2Connection(
+            config=h2.config.H2Configuration(client_side=False, header_encoding='utf-8'))
+        conn.initiate_connection()
+        sock.sendall(conn.data_to_send())
+        outgoing = {}  # stream id -> body bytes not yet sent
+
+        def pump():
+            for stream_id in list(outgoing):
+                body = outgoing[stream_id]
+                while body:
+                    window = min(conn.local_flow_control_window(stream_id), conn.max_outbound_frame_size)
+                    if window <= 0:
+                        break
+                    conn.send_data(stream_id, body[:window])
+                    body = body[window:]
+                outgoing[stream_id] = body
+                if not body:
+                    conn.end_stream(stream_id)
+                    del outgoing[stream_id]
+
+        scheduled = []  # (ready at, stream id, path): --latency delays streams, not the connection
+        try:
+            while True:
+                wait = max(0.0, scheduled[0][0] - time.monotonic()) if scheduled else None
+                if sock.pending() or select.select([sock], [], [], wait)[0]:
+                    data = sock.recv(65536)
+                    if not data:
+                        return
+                    for event in conn.receive_data(data):
+                        if isinstance(event, h2.events.RequestReceived):
+                            path = dict(event.headers).get(':path', '/')
+                            heapq.heappush(scheduled, (time.monotonic() + self.latency, event.stream_id, path))
+                        elif isinstance(event, h2.events.StreamReset):
+                            outgoing.pop(event.stream_id, None)
+                        elif isinstance(event, h2.events.ConnectionTerminated):
+                            return
+                while scheduled and scheduled[0][0] <= time.monotonic():
+                    _, stream_id, path = heapq.heappop(scheduled)
+                    status, response_headers, body = self.resolve(path)
+                    conn.send_headers(stream_id, [(':status', str(status))] + response_headers)
+                    outgoing[stream_id] = body
+                pump()
+                sock.sendall(conn.data_to_send())
+        except (OSError, ssl.SSLError):
+            return
+        finally:
+            sock.close()
+
+def make_context(cert, key, http1_only=False):
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert, key)
+    context.set_alpn_protocols(['http/1.1'] if http1_only or h2 is None else ['h2', 'http/1.1'])
+    return context
+
+def run(args):
+    if not args.dir.is_dir():
+        raise PipelineError(f"Not a directory: {args.dir}")
+    cert, key = (args.cert, args.key) if args.cert else ensure_certificate()
+    http1_only = args.http1_only or h2 is None
+    server = MockOrigin(('127.0.0.1', args.port), args.dir, make_context(cert, key, http1_only), args.latency)
+
+    print("🧪 Mock origin\n")
+    print(f"  Serving:   {args.dir}")
+    print(f"  URL:       https://localhost:{args.port}/")
+    print(f"  Protocols: {'http/1.1 only' if http1_only else 'h2, http/1.1'}"
+          + (" (h2 library not installed)" if h2 is None else ""))
+    print(f"  CA file:   SSL_CERT_FILE={cert}\n")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        print(f"\nConnections: h2 {server.protocols['h2']}, http/1.1 {server.protocols['http/1.1']}")
+
+def register(subparsers):
+    parser = subparsers.add_parser('mock-origin', help='Local HTTPS origin (h2 + HTTP/1.1) for testing the fetcher')
+    parser.add_argument('--dir', type=Path, required=True, help='Directory to serve')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--http1-only', action='store_true', help='Only offer http/1.1 in ALPN')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds to wait before each response')
+    parser.add_argument('--cert', type=Path, help='PEM certificate (default: generated self-signed)')
+    parser.add_argument('--key', type=Path, help='PEM private key for --cert')
+    parser.set_defaults(func=run)
@@ -0,0 +1,366 @@
+"""
+Indexed media packs
+
+For offline or low-connectivity use, the catalog can also be shipped as a
+few pack files instead of dozens of separate GIFs. A pack is one file with
+a compact index up front:
+
+    0   4s  magic b'EXPK'
+    4   H   format version (1)
+    6   H   flags (reserved, 0)
+    8   I   entry count
+    12  I   index length in bytes (the index starts at byte 16)
+    16      index entries: Q offset, I length, 32s sha256, H name length, name (utf-8)
+    ...     assets, each starting on an ALIGNMENT boundary
+
+All integers are little-endian. Because the index comes first, a client
+needs one small Range request for the index, then one Range request per
+asset. Locally, PackReader mmaps the file and hands out memoryview slices
+without copying. Page-aligned assets can also be mmap'd individually.
+
+Packs are written to public/exercise-gifs/packs/, one per exerciseMedia.js
+category by default. packs.json lists each pack's files, size and hash.
+Unchanged packs are not rewritten.
+
+Usage:
+    python3 scripts/media_pipeline.py pack build [--group category|all] [--webp]
+    python3 scripts/media_pipeline.py pack list public/exercise-gifs/packs/chest.pack
+    python3 scripts/media_pipeline.py pack get https://example.com/exercise-gifs/packs/chest.pack bench-press.gif -o /tmp/b.gif
+    python3 scripts/media_pipeline.py pack bench
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import random
+import shutil
+import struct
+import time
+import urllib.error
+from collections import namedtuple
+from pathlib import Path
+
+from .catalog import file_categories, load_media_map
+from .config import CACHE_DIR, OUTPUT_DIR, PipelineError, catalog_files, format_size
+from .fetcher import open_url
+from .manifest import file_sha256, write_json
+
+PACKS_DIR = OUTPUT_DIR / "packs"
+PACKS_INDEX = "packs.json"
+MAGIC = b'EXPK'
+PACK_VERSION = 1
+ALIGNMENT = 4096
+HEADER = struct.Struct('<4sHHII')
+ENTRY = struct.Struct('<QI32sH')
+# First Range request for a remote pack; big enough for the index of a whole-catalog pack
+INDEX_PROBE_BYTES = 16 * 1024
+
+PackEntry = namedtuple('PackEntry', ['name', 'offset', 'length', 'sha256'])
+
+def _aligned(offset, alignment):
+    return -(-offset // alignment) * alignment
+
+def parse_header(data):
+    """(entry count, index length) from the first 16 bytes of a pack"""
+    if len(data) < HEADER.size:
+        raise PipelineError("Not a media pack (file too short)")
+    magic, version, _, count, index_length = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise PipelineError("Not a media pack (bad magic)")
+    if version != PACK_VERSION:
+        raise PipelineError(f"Unsupported media pack version {version}")
+    return count, index_length
+
+def parse_index(data, count):
+    """{name: PackEntry} from the index bytes that follow the header"""
+    entries = {}
+    pos = 0
+    for _ in range(count):
+        offset, length, sha, name_length = ENTRY.unpack_from(data, pos)
+        pos += ENTRY.size
+        name = bytes(data[pos:pos + name_length]).decode('utf-8')
+        pos += name_length
+        entries[name] = PackEntry(name, offset, length, sha.hex())
+    return entries
+
+def write_pack(path, members, alignment=ALIGNMENT):
+    """Write [(name, file path)] as a pack at path atomically; returns [PackEntry]"""
+    infos = [(name, source, source.stat().st_size, file_sha256(source)) for name, source in members]
+    index = b''.join(ENTRY.pack(0, 0, b'\0' * 32, len(name.encode())) + name.encode() for name, *_ in infos)
+    offset = _aligned(HEADER.size + len(index), alignment)
+    entries = []
+    for name, _, size, sha in infos:
+        entries.append(PackEntry(name, offset, size, sha))
+        offset = _aligned(offset + size, alignment)
+
+    index = b''.join(ENTRY.pack(entry.offset, entry.length, bytes.fromhex(entry.sha256), len(entry.name.encode()))
+                     + entry.name.encode() for entry in entries)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    try:
+        with open(tmp_path, 'wb') as out:
+            out.write(HEADER.pack(MAGIC, PACK_VERSION, 0, len(entries), len(index)))
+            out.write(index)
+            for entry, (_, source, _, _) in zip(entries, infos):
+                out.write(b'\0' * (entry.offset - out.tell()))
+                with open(source, 'rb') as f:
+                    shutil.copyfileobj(f, out)
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    return entries
+
+class PackReader:
+    """A local pack, mmap'd; read() returns zero-copy memoryview slices"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = open(self.path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        count, index_length = parse_header(self._view[:HEADER.size])
+        self.entries = parse_index(self._view[HEADER.size:HEADER.size + index_length], count)
+
+    def names(self):
+        return list(self.entries)
+
+    def read(self, name):
+        entry = self.entries.get(name)
+        if entry is None:
+            raise KeyError(name)
+        return self._view[entry.offset:entry.offset + entry.length]
+
+    def verify(self):
+        """Names whose bytes no longer match the index hash"""
+        return [name for name, entry in self.entries.items()
+                if hashlib.sha256(self.read(name)).hexdigest() != entry.sha256]
+
+    def close(self):
+        self._view.release()
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _read_range(url, start, end, timeout):
+    """Bytes start..end (inclusive) of url, via a Range request"""
+    with open_url(url, timeout, extra_headers={'Range': f'bytes={start}-{end}'}) as response:
+        if response.status == 206:
+            return response.read()
+        # Server ignored Range: take the slice from the full body
+        data = b''
+        while len(data) <= end:
+            chunk = response.read(64 * 1024)
+            if not chunk:
+                break
+            data += chunk
+        return data[start:end + 1]
+
+class HttpPackReader:
+    """A pack on a web server: the index with one Range request, each asset with one more"""
+
+    def __init__(self, url, timeout=30):
+        self.url = url
+        self.timeout = timeout
+        head = _read_range(url, 0, INDEX_PROBE_BYTES - 1, timeout)
+        count, index_length = parse_header(head)
+        end = HEADER.size + index_length
+        if len(head) < end:
+            head += _read_range(url, len(head), end - 1, timeout)
+        self.entries = parse_index(head[HEADER.size:end], count)
+        self.requests = 1 + (end > INDEX_PROBE_BYTES)
+
+    def names(self):
+        return list(self.entries)
+
+    def read(self, name):
+        entry = self.entries.get(name)
+        if entry is None:
+            raise KeyError(name)
+        data = _read_range(self.url, entry.offset, entry.offset + entry.length - 1, self.timeout)
+        self.requests += 1
+        if hashlib.sha256(data).hexdigest() != entry.sha256:
+            raise PipelineError(f"{name}: hash mismatch in {self.url}")
+        return data
+
+def open_pack(location):
+    """PackReader or HttpPackReader for a path or URL; PipelineError if it cannot be opened"""
+    if not location:
+        raise PipelineError("Pass a pack file or URL, e.g. public/exercise-gifs/packs/chest.pack")
+    try:
+        if str(location).startswith(('http://', 'https://')):
+            return HttpPackReader(str(location))
+        return PackReader(location)
+    except urllib.error.HTTPError as e:
+        raise PipelineError(f"{location}: HTTP {e.code}")
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        # ValueError: mmap of an empty file
+        raise PipelineError(f"Cannot open {location}: {getattr(e, 'reason', None) or e}")
+
+def pack_members(grouping, include_webp):
+    """{pack name: [(name, path)]} for the catalog"""
+    categories = file_categories(load_media_map()) if grouping == 'category' else {}
+    groups = {}
+    for filepath in catalog_files():
+        group = 'all' if grouping == 'all' else categories.get(filepath.name, 'other')
+        members = groups.setdefault(group, [])
+        members.append((filepath.name, filepath))
+        webp = filepath.with_suffix('.webp')
+        if include_webp and webp.exists():
+            members.append((webp.name, webp))
+    return groups
+
+def pack_key(members, alignment):
+    digest = hashlib.sha256(f"v={PACK_VERSION};align={alignment}".encode())
+    for name, path in members:
+        digest.update(f"{name}={file_sha256(path)};".encode())
+    return digest.hexdigest()
+
+def run_build(args):
+    groups = pack_members(args.group, args.webp)
+    index_path = args.out_dir / PACKS_INDEX
+    previous = {}
+    if index_path.exists():
+        with open(index_path, 'r') as f:
+            previous = json.load(f).get("packs", {})
+
+    print(f"📦 Building {len(groups)} media pack(s) in {args.out_dir}...\n")
+    packs = {}
+    built = 0
+    for group, members in sorted(groups.items()):
+        filename = f"{group}.pack"
+        path = args.out_dir / filename
+        key = pack_key(members, args.align)
+        print(f"  {filename} ({len(members)} files)... ", end='', flush=True)
+        if previous.get(filename, {}).get("key") == key and path.exists():
+            packs[filename] = previous[filename]
+            print("⏭️  (unchanged)")
+            continue
+        entries = write_pack(path, members, args.align)
+        payload = sum(entry.length for entry in entries)
+        size = path.stat().st_size
+        packs[filename] = {"key": key, "bytes": size, "sha256": file_sha256(path),
+                           "files": [entry.name for entry in entries]}
+        built += 1
+        print(f"✅ {format_size(size)} ({(size - payload) * 100 / size:.1f}% index + padding)")
+
+    for stale in set(previous) - set(packs):
+        (args.out_dir / stale).unlink(missing_ok=True)
+    write_json(index_path, {"version": PACK_VERSION, "alignment": args.align, "packs": packs})
+
+    print("\n" + "="*60)
+    print(f"✅ Built: {built}")
+    print(f"⏭️  Unchanged: {len(packs) - built}")
+    print(f"📦 {sum(pack['bytes'] for pack in packs.values()) / (1024 * 1024):.2f} MB in {len(packs)} pack(s)")
+    print(f"📄 {index_path}")
+    print("="*60 + "\n")
+
+def run_list(args):
+    reader = open_pack(args.pack)
+    print(f"📦 {args.pack}: {len(reader.entries)} files\n")
+    for entry in reader.entries.values():
+        print(f"  {entry.offset:>10}  {entry.length:>9}  {entry.sha256[:12]}  {entry.name}")
+    if isinstance(reader, PackReader):
+        corrupt = reader.verify()
+        print(f"\n{'❌ Hash mismatch: ' + ', '.join(corrupt) if corrupt else '✅ All hashes match'}")
+        reader.close()
+    print()
+
+def run_get(args):
+    if not args.name:
+        raise PipelineError("Pass the asset to extract, e.g. pack get chest.pack bench-press.gif")
+    reader = open_pack(args.pack)
+    try:
+        data = reader.read(args.name)
+    except KeyError:
+        raise PipelineError(f"{args.name} is not in {args.pack}")
+    except urllib.error.HTTPError as e:
+        raise PipelineError(f"{args.pack}: HTTP {e.code} reading {args.name}")
+    except (urllib.error.URLError, OSError) as e:
+        raise PipelineError(f"{args.pack}: {getattr(e, 'reason', None) or e} reading {args.name}")
+    output = args.output or Path(args.name)
+    with open(output, 'wb') as f:
+        f.write(data)
+    print(f"✅ {args.name} → {output} ({format_size(len(data))})")
+    if isinstance(reader, PackReader):
+        reader.close()
+
+def run_bench(args):
+    """Loose files vs one pack: read every asset, then random single-asset reads"""
+    files = catalog_files()
+    if not files:
+        raise PipelineError("No GIFs in the catalog to benchmark")
+    bench_path = CACHE_DIR / "bench.pack"
+    write_pack(bench_path, [(path.name, path) for path in files])
+    names = [path.name for path in files]
+    picks = [random.choice(names) for _ in range(args.reads)]
+
+    def loose_all():
+        for path in files:
+            with open(path, 'rb') as f:
+                hashlib.sha256(f.read()).digest()
+
+    def loose_random():
+        for name in picks:
+            with open(OUTPUT_DIR / name, 'rb') as f:
+                f.read()
+
+    def pack_all():
+        with PackReader(bench_path) as reader:
+            for name in names:
+                hashlib.sha256(reader.read(name)).digest()
+
+    def pack_random():
+        with PackReader(bench_path) as reader:
+            for name in picks:
+                reader.read(name)
+
+    def best_of(function):
+        timings = []
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    try:
+        results = [
+            (f"Read + hash all {len(files)}", best_of(loose_all), best_of(pack_all)),
+            (f"{args.reads} random reads (no copy)", best_of(loose_random), best_of(pack_random)),
+        ]
+        pack_bytes = bench_path.stat().st_size
+    finally:
+        bench_path.unlink(missing_ok=True)
+    loose_bytes = sum(path.stat().st_size for path in files)
+
+    print(f"⏱️  Loose files vs pack (best of {args.rounds}, warm page cache)\n")
+    print(f"  {'':<28} {'loose':>10} {'pack':>10}")
+    for label, loose, packed in results:
+        print(f"  {label:<28} {loose * 1000:>8.2f}ms {packed * 1000:>8.2f}ms  ({loose / packed:.1f}x)")
+    print(f"\n  Files opened:   {len(files)} loose, 1 pack")
+    print(f"  HTTP requests:  {len(files)} loose, 1 for the whole pack, or 1 + 1 per asset with Range")
+    print(f"  Size:           {format_size(loose_bytes)} loose, {format_size(pack_bytes)} pack "
+          f"(+{(pack_bytes - loose_bytes) * 100 / loose_bytes:.1f}% index + alignment)\n")
+
+def run(args):
+    return {'build': run_build, 'list': run_list, 'get': run_get, 'bench': run_bench}[args.action](args)
+
+def register(subparsers):
+    parser = subparsers.add_parser('pack', help='Single-file indexed media packs (build, list, get, bench)')
+    parser.add_argument('action', choices=['build', 'list', 'get', 'bench'])
+    parser.add_argument('pack', nargs='?', help='list/get: pack file or URL')
+    parser.add_argument('name', nargs='?', help='get: asset to extract')
+    parser.add_argument('-o', '--output-file', dest='output', type=Path, help='get: where to write the asset')
+    parser.add_argument('--out-dir', type=Path, default=PACKS_DIR, help='build: pack directory')
+    parser.add_argument('--group', choices=['category', 'all'], default='category',
+                        help='build: one pack per exerciseMedia.js category, or one for everything')
+    parser.add_argument('--webp', action='store_true', help='build: include .webp encodes next to the GIFs')
+    parser.add_argument('--align', type=int, default=ALIGNMENT, help=f'build: asset alignment (default: {ALIGNMENT})')
+    parser.add_argument('--rounds', type=int, default=5, help='bench: repetitions (best is reported)')
+    parser.add_argument('--reads', type=int, default=1000, help='bench: random single-asset reads')
+    parser.set_defaults(func=run)
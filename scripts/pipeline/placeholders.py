@@ -0,0 +1,181 @@
+"""
+Low-quality placeholders
+
+For every asset, store what the UI needs to paint before the animation
+arrives, without any extra request:
+
+    width, height     intrinsic size (reserve the box, no layout shift)
+    dominant_color    flat background colour, e.g. "#3a4b5c"
+    blurhash          ~20 character BlurHash of the first frame
+    lqip              tiny inline WebP data URI of the first frame (~300 bytes)
+
+Usage:
+    python3 scripts/media_pipeline.py placeholders
+    python3 scripts/media_pipeline.py placeholders --components 4x3 bench-press.gif
+"""
+
+import base64
+import io
+
+from .config import PipelineError, selected_files
+from .frames import load_poster, require_imaging
+from .manifest import asset_entry, file_sha256, load_manifest, save_manifest
+
+BASE83 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+DEFAULT_COMPONENTS = (4, 3)
+LQIP_BUDGET = 320  # bytes of WebP before base64
+LQIP_SIZES = (24, 20, 16, 12)
+
+def _base83(value, length):
+    return ''.join(BASE83[(value // 83 ** (length - 1 - i)) % 83] for i in range(length))
+
+def _srgb_to_linear(np, values):
+    v = values / 255.0
+    return np.where(v <= 0.04045, v / 12.92, ((v + 0.055) / 1.055) ** 2.4)
+
+def _linear_to_srgb(value):
+    v = max(0.0, min(1.0, value))
+    if v <= 0.0031308:
+        return int(v * 12.92 * 255 + 0.5)
+    return int((1.055 * v ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+def blurhash(image, components=DEFAULT_COMPONENTS):
+    """Encode a PIL image as a BlurHash string"""
+    np, Image = require_imaging()
+    cx, cy = components
+
+    # BlurHash only needs the low frequencies; 32px keeps it fast
+    small = image.convert('RGB')
+    small.thumbnail((32, 32), Image.BILINEAR)
+    pixels = _srgb_to_linear(np, np.asarray(small, dtype=np.float64))
+    height, width = pixels.shape[:2]
+
+    basis_x = np.cos(np.pi * np.arange(cx)[:, None] * np.arange(width)[None, :] / width)
+    basis_y = np.cos(np.pi * np.arange(cy)[:, None] * np.arange(height)[None, :] / height)
+
+    # factors[j, i] = normalisation * mean(basis_y[j] x basis_x[i] * pixels)
+    factors = np.einsum('jy,ix,yxc->jic', basis_y, basis_x, pixels) / (width * height)
+    norm = np.full((cy, cx, 1), 2.0)
+    norm[0, 0] = 1.0
+    factors = (factors * norm).reshape(cx * cy, 3)
+
+    dc = factors[0]
+    ac = factors[1:]
+
+    result = _base83((cx - 1) + (cy - 1) * 9, 1)
+    if len(ac):
+        actual_max = float(np.abs(ac).max())
+        quantised_max = int(max(0, min(82, int(actual_max * 166 - 0.5))))
+        max_value = (quantised_max + 1) / 166
+        result += _base83(quantised_max, 1)
+    else:
+        max_value = 1.0
+        result += _base83(0, 1)
+
+    r, g, b = (_linear_to_srgb(c) for c in dc)
+    result += _base83((r << 16) + (g << 8) + b, 4)
+
+    # Sign-preserving square root, quantised to 19 levels per channel
+    scaled = np.sign(ac) * np.abs(ac / max_value) ** 0.5
+    quant = np.clip(np.floor(scaled * 9 + 9.5), 0, 18).astype(int)
+    for qr, qg, qb in quant:
+        result += _base83(int(qr) * 19 * 19 + int(qg) * 19 + int(qb), 2)
+    return result
+
+def dominant_color(image):
+    """Most common colour after reducing the image to a small palette"""
+    _, Image = require_imaging()
+    small = image.convert('RGB')
+    small.thumbnail((64, 64), Image.BILINEAR)
+    quantized = small.quantize(colors=5)
+    _, index = max(quantized.getcolors())
+    palette = quantized.getpalette()
+    r, g, b = palette[index * 3:index * 3 + 3]
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+def lqip(image, budget=LQIP_BUDGET):
+    """Smallest useful inline WebP of the image, as a data URI"""
+    _, Image = require_imaging()
+    data = b''
+    for size in LQIP_SIZES:
+        small = image.convert('RGB')
+        small.thumbnail((size, size), Image.BILINEAR)
+        buffer = io.BytesIO()
+        small.save(buffer, format='WEBP', quality=30, method=6)
+        data = buffer.getvalue()
+        if len(data) <= budget:
+            break
+    return "data:image/webp;base64," + base64.b64encode(data).decode('ascii')
+
+def placeholder_file(filepath, manifest, components=DEFAULT_COMPONENTS, force=False):
+    """Compute the placeholder record for one asset; returns (status, record)"""
+    entry = asset_entry(manifest, filepath.name)
+    sha = file_sha256(filepath)
+    previous = entry.get("placeholder")
+    if (previous and not force and previous.get("source_sha256") == sha
+            and previous.get("components") == list(components)):
+        return 'unchanged', previous
+
+    poster, (width, height) = load_poster(filepath)
+    record = {
+        "source_sha256": sha,
+        "width": width,
+        "height": height,
+        "dominant_color": dominant_color(poster),
+        "blurhash": blurhash(poster, components),
+        "components": list(components),
+        "lqip": lqip(poster),
+    }
+    entry["placeholder"] = record
+    return 'updated', record
+
+def parse_components(value):
+    """Parse '4x3' into (4, 3)"""
+    try:
+        cx, cy = (int(part) for part in value.lower().split('x'))
+    except ValueError:
+        raise PipelineError(f"Components must look like 4x3, got: {value}")
+    if not (1 <= cx <= 9 and 1 <= cy <= 9):
+        raise PipelineError("BlurHash components must be between 1 and 9")
+    return cx, cy
+
+def run(args):
+    files = selected_files(args.files)
+    components = parse_components(args.components)
+    manifest = load_manifest()
+
+    print(f"🖼️  Computing placeholders for {len(files)} GIFs...\n")
+
+    updated = 0
+    lqip_bytes = 0
+    for i, filepath in enumerate(files, 1):
+        progress = f"[{i}/{len(files)}]"
+        print(f"{progress} {filepath.name}... ", end='', flush=True)
+
+        status, record = placeholder_file(filepath, manifest, components, args.force)
+        if status == 'unchanged':
+            print("⏭️  (unchanged)")
+            continue
+
+        updated += 1
+        lqip_bytes += len(record["lqip"])
+        print(f"✅ {record['width']}×{record['height']} {record['dominant_color']} {record['blurhash']}")
+
+    if updated:
+        save_manifest(manifest)
+
+    print("\n" + "="*60)
+    print(f"✅ Updated: {updated}")
+    print(f"⏭️  Unchanged: {len(files) - updated}")
+    if updated:
+        print(f"📦 Inline LQIP data: {lqip_bytes / 1024:.1f} KB")
+    print("="*60 + "\n")
+
+def register(subparsers):
+    parser = subparsers.add_parser('placeholders', help='BlurHash/LQIP placeholders, size and colour')
+    parser.add_argument('files', nargs='*', help='GIF filenames in public/exercise-gifs (default: all)')
+    parser.add_argument('--components', default='x'.join(map(str, DEFAULT_COMPONENTS)),
+                        help='BlurHash components, e.g. 4x3')
+    parser.add_argument('--force', action='store_true', help='Recompute even if the source is unchanged')
+    parser.set_defaults(func=run)
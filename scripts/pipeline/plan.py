@@ -0,0 +1,233 @@
+"""
+Fetch planner
+
+Works out what a catalog fetch would do without downloading anything:
+which exercises are missing, which URL each would come from, how many
+bytes that is and roughly how long it takes. Candidates are checked with
+concurrent HEAD requests (through the per-host limiter), and the results
+are cached in .media-cache/head-cache.json for HEAD_TTL, so re-planning is
+mostly offline.
+
+Giphy candidates are swapped for their best-fitting rendition first (see
+giphy.py), so the plan sizes what will actually be downloaded.
+
+The plan is saved as JSON. `fetch --from-plan` runs it later, starting
+each task with the URL the planner chose and skipping candidates that
+already failed their HEAD check. A HEAD that could not get an answer
+(network error, 429/503) is not a failure: that URL stays in the plan,
+after the confirmed ones, and is not cached.
+
+ETA model, per host: (TTFB + bytes / throughput) for each planned
+download, divided by the host's learned concurrency limit. Hosts run in
+parallel, so the ETA is the slowest host, or the total work divided by
+--workers if that is larger. TTFB, throughput and limits come from
+.media-cache/host-limits.json; hosts with no measured throughput use the
+defaults in hostlimits.py and are flagged in the output.
+"""
+
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .config import CACHE_DIR, OUTPUT_DIR, PipelineError
+from .fetcher import MIN_VALID_BYTES, head
+from .giphy import TARGET_WIDTH, RenditionCache
+from .hostlimits import DEFAULT_BYTES, DEFAULT_THROUGHPUT, DEFAULT_TTFB, host_of
+from .manifest import write_json
+from .sourcecache import SourceCache
+from .sources import FetchTask, output_path
+
+PLAN_PATH = CACHE_DIR / "fetch-plan.json"
+HEAD_CACHE_PATH = CACHE_DIR / "head-cache.json"
+PLAN_VERSION = 1
+HEAD_TTL = 24 * 3600
+
+# Servers that reject HEAD but may well serve GET
+HEAD_UNSUPPORTED = (403, 405, 501)
+# No answer about the URL itself (network error, busy server): a GET may still work
+HEAD_TRANSIENT = (None, 429, 503)
+
+class HeadCache:
+    """HEAD results by URL, persisted between plans"""
+
+    def __init__(self, path=HEAD_CACHE_PATH, refresh=False):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+        if path.exists() and not refresh:
+            with open(path, 'r') as f:
+                self.entries = json.load(f)
+
+    def get(self, url):
+        entry = self.entries.get(url)
+        if entry and time.time() - entry["checked"] < HEAD_TTL:
+            return entry
+        return None
+
+    def put(self, url, result):
+        with self._lock:
+            self.entries[url] = {**result, "checked": round(time.time())}
+
+    def save(self):
+        with self._lock:
+            fresh = {url: entry for url, entry in self.entries.items()
+                     if time.time() - entry["checked"] < HEAD_TTL}
+        write_json(self.path, fresh)
+
+def verdict(result):
+    """'ok', 'unknown' (server won't say), 'unreachable' (no answer this time) or 'bad' for a HEAD result"""
+    status = result.get("status")
+    if status in HEAD_TRANSIENT:
+        return 'unreachable'
+    if status == 200:
+        if result.get("content_type", '').startswith('text/'):
+            return 'bad'
+        if result.get("bytes") is not None and result["bytes"] < MIN_VALID_BYTES:
+            return 'bad'
+        return 'ok'
+    if status in HEAD_UNSUPPORTED:
+        return 'unknown'
+    return 'bad'
+
+def plan_task(task, cache, limiter, timeout):
+    """HEAD a task's candidates, best host first, until one looks good; returns its plan entry"""
+    checked = []
+    ranked = limiter.rank(task.candidates, probe=False)
+    for url in ranked:
+        result = cache.get(url)
+        cached = result is not None
+        if not cached:
+            result = head(url, timeout, limiter)
+            if verdict(result) != 'unreachable':
+                cache.put(url, result)
+        checked.append({"url": url, "verdict": verdict(result), "status": result.get("status"),
+                        "bytes": result.get("bytes"), "cached": cached})
+        if checked[-1]["verdict"] == 'ok':
+            break
+
+    # Best first: confirmed, then HEAD-rejecting, then unreachable, then never checked; drop known-bad
+    rank = {'ok': 0, 'unknown': 1, 'unreachable': 2}
+    usable = sorted((c for c in checked if c["verdict"] != 'bad'), key=lambda c: rank[c["verdict"]])
+    candidates = [c["url"] for c in usable] + ranked[len(checked):]
+    chosen = usable[0] if usable else None
+    return {
+        "task_id": task.task_id,
+        "name": task.name,
+        "filename": task.filename,
+        "sources": task.sources,
+        "action": 'fetch' if candidates else 'unavailable',
+        "url": chosen["url"] if chosen else None,
+        "bytes": chosen["bytes"] if chosen else None,
+        "candidates": candidates,
+        "checked": checked,
+    }
+
+def cached_entry(task, size):
+    """Plan entry for a task the raw-source cache can restore without any request"""
+    return {
+        "task_id": task.task_id,
+        "name": task.name,
+        "filename": task.filename,
+        "sources": task.sources,
+        "action": 'cached',
+        "url": None,
+        "bytes": size,
+        "candidates": task.candidates,
+        "checked": [],
+    }
+
+def estimate(entries, limiter, workers):
+    """Fill in per-entry seconds; returns (eta seconds, {host: summary})"""
+    known = [entry["bytes"] for entry in entries if entry["bytes"]]
+    typical = statistics.median(known) if known else DEFAULT_BYTES
+
+    hosts = {}
+    for entry in entries:
+        url = entry["url"] or entry["candidates"][0]
+        host = host_of(url)
+        if host not in hosts:
+            limit, ttfb, throughput = limiter.estimates(host)
+            hosts[host] = {
+                "limit": round(limit, 2),
+                "ttfb": ttfb or DEFAULT_TTFB,
+                "throughput": throughput or DEFAULT_THROUGHPUT,
+                "measured": throughput is not None,
+                "tasks": 0,
+                "bytes": 0,
+                "seconds": 0.0,
+            }
+        stats = hosts[host]
+        size = entry["bytes"] or typical
+        seconds = stats["ttfb"] + size / stats["throughput"]
+        entry["expected_seconds"] = round(seconds, 2)
+        stats["tasks"] += 1
+        stats["bytes"] += size
+        stats["seconds"] += seconds
+
+    slowest = max((stats["seconds"] / max(1, int(stats["limit"])) for stats in hosts.values()), default=0)
+    total = sum(stats["seconds"] for stats in hosts.values())
+    return max(slowest, total / max(1, workers)), hosts
+
+def build_plan(tasks, limiter, workers, timeout, directory=OUTPUT_DIR, refresh=False, giphy_width=TARGET_WIDTH):
+    """Plan every task; missing files are HEAD-checked concurrently"""
+    cache = HeadCache(refresh=refresh)
+    sources = SourceCache()
+    renditions = RenditionCache(limiter=limiter)
+    missing = [task for task in tasks if not output_path(task, directory).exists()]
+    held = {}
+    for task in missing:
+        sha = sources.lookup(task.filename, task.candidates)
+        if sha:
+            held[task.task_id] = sources.object_path(sha).stat().st_size
+
+    def plan_one(task):
+        if task.task_id in held:
+            return cached_entry(task, held[task.task_id])
+        return plan_task(renditions.with_renditions(task, giphy_width, timeout), cache, limiter, timeout)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        entries = list(pool.map(plan_one, missing))
+    cache.save()
+    renditions.save()
+
+    planned = [entry for entry in entries if entry["action"] == 'fetch']
+    eta, hosts = estimate(planned, limiter, workers)
+    return {
+        "version": PLAN_VERSION,
+        "created": round(time.time()),
+        "output_dir": str(directory),
+        "workers": workers,
+        "total_bytes": sum(entry["bytes"] or 0 for entry in planned),
+        "unknown_sizes": sum(1 for entry in planned if entry["bytes"] is None),
+        "eta_seconds": round(eta, 1),
+        "on_disk": len(tasks) - len(missing),
+        "cached": len(held),
+        "hosts": hosts,
+        "tasks": entries,
+    }
+
+def save_plan(plan, path=PLAN_PATH):
+    write_json(path, plan)
+
+def load_plan(path=PLAN_PATH):
+    """Read a saved plan; returns (plan, FetchTasks to run)"""
+    if not path.exists():
+        raise PipelineError(f"No fetch plan at {path} (create one with: fetch --plan)")
+    with open(path, 'r') as f:
+        plan = json.load(f)
+    if plan.get("version") != PLAN_VERSION:
+        raise PipelineError(f"Unsupported plan version in {path}; re-run fetch --plan")
+    tasks = [
+        FetchTask(entry["task_id"], entry["name"], entry["filename"], entry["candidates"], entry["sources"])
+        for entry in plan["tasks"] if entry["action"] in ('fetch', 'cached')
+    ]
+    return plan, tasks
+
+def format_duration(seconds):
+    """Format seconds as e.g. 45s or 3m 20s"""
+    seconds = round(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    return f"{seconds // 60}m {seconds % 60:02d}s"
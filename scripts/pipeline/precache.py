@@ -0,0 +1,104 @@
+"""
+Service-worker precache manifest
+
+Ranks catalog GIFs by how often their exercises appear in the workout
+templates, the generator's exercise pools and (optionally) an anonymized
+history export, then fills a byte budget with the most-used assets first.
+
+Output (public/exercise-gifs/precache-manifest.json):
+    {
+      "budget": 5242880,
+      "total_bytes": 4980012,
+      "entries": [
+        {"url": "/exercise-gifs/bench-press.gif", "revision": "5d8f4c24...", "size": 316421, "uses": 7},
+        ...
+      ]
+    }
+
+`url` + `revision` is the shape Workbox's precacheAndRoute() expects.
+
+Usage:
+    python3 scripts/media_pipeline.py precache
+    python3 scripts/media_pipeline.py precache --budget 3MB --history history-export.json
+"""
+
+from pathlib import Path
+
+from .config import OUTPUT_DIR, catalog_files, format_size, parse_size
+from .manifest import file_sha256, format_compressed, load_manifest, write_json
+from .usage import usage_counts
+
+PRECACHE_PATH = OUTPUT_DIR / "precache-manifest.json"
+DEFAULT_BUDGET = '5MB'
+URL_PREFIX = '/exercise-gifs/'
+
+def rank_assets(files, counts):
+    """Most used first; among equals, smaller files first so more fit"""
+    return sorted(files, key=lambda f: (-counts.get(f.name, 0), f.stat().st_size, f.name))
+
+def build_precache(files, counts, budget, manifest, include_unused=False):
+    """Greedily fill the budget in rank order; returns (entries, skipped)"""
+    entries = []
+    skipped = []
+    total = 0
+    for filepath in rank_assets(files, counts):
+        uses = counts.get(filepath.name, 0)
+        if uses == 0 and not include_unused:
+            skipped.append(filepath.name)
+            continue
+
+        size = filepath.stat().st_size
+        if total + size > budget:
+            # A smaller, less-used asset may still fit
+            skipped.append(filepath.name)
+            continue
+
+        known = manifest["assets"].get(filepath.name, {})
+        sha = known.get("sha256") if known.get("bytes") == size else None
+        entries.append({
+            "url": URL_PREFIX + filepath.name,
+            "revision": sha or file_sha256(filepath),
+            "size": size,
+            "uses": uses,
+        })
+        total += size
+    return entries, skipped
+
+def run(args):
+    budget = parse_size(args.budget)
+    history = Path(args.history) if args.history else None
+    counts, sources = usage_counts(history)
+    files = catalog_files()
+    manifest = load_manifest()
+
+    print(f"📶 Building precache manifest (budget {format_size(budget)})...\n")
+    for source, count in sources.items():
+        print(f"  {source}: {count} exercise mentions")
+    print()
+
+    entries, skipped = build_precache(files, counts, budget, manifest, args.include_unused)
+    total = sum(entry["size"] for entry in entries)
+    artifact = write_json(args.output, {
+        "version": 1,
+        "budget": budget,
+        "total_bytes": total,
+        "entries": entries,
+    }, precompress=True)
+
+    for entry in entries:
+        print(f"  ✅ {entry['url']} ({entry['uses']} uses, {format_size(entry['size'])})")
+
+    print("\n" + "="*60)
+    print(f"✅ Precached: {len(entries)} assets, {format_size(total)} of {format_size(budget)}")
+    print(f"⏭️  Left to on-demand fetch: {len(skipped)}")
+    print(f"📄 {args.output} (→ {artifact['file']}, {format_compressed(artifact)})")
+    print("="*60 + "\n")
+
+def register(subparsers):
+    parser = subparsers.add_parser('precache', help='Usage-ranked service-worker precache manifest')
+    parser.add_argument('--budget', default=DEFAULT_BUDGET, help='Max total bytes, e.g. 5MB')
+    parser.add_argument('--history', help='Anonymized history/templates JSON export to count usage from')
+    parser.add_argument('--include-unused', action='store_true',
+                        help='Also fill leftover budget with assets no workout references')
+    parser.add_argument('--output', type=Path, default=PRECACHE_PATH, help='Where to write the manifest')
+    parser.set_defaults(func=run)
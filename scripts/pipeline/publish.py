@@ -0,0 +1,171 @@
+"""
+Delta publishing
+
+Deploys used to copy all of dist/ to the server, every exercise GIF
+included, even when nothing had changed. Instead, the build records what it
+contains and the deploy ships only the difference:
+
+    publish manifest   hash every file under dist/ into dist/publish-manifest.json
+    publish diff       compare with the manifest already deployed and list
+                       what to upload and what to delete
+
+Manifest format:
+    {
+      "version": 1,
+      "files": {
+        "exercise-gifs/squat.gif": {"sha256": "...", "bytes": 215904},
+        ...
+      }
+    }
+
+If the deployed manifest is missing or unreadable (first deploy, or a
+server that predates this), everything counts as added: a full upload.
+
+Usage:
+    python3 scripts/media_pipeline.py publish manifest --root dist
+    python3 scripts/media_pipeline.py publish diff --root dist --deployed deployed.json
+    python3 scripts/media_pipeline.py publish diff --root dist --deployed deployed.json \\
+        --stage publish-delta --json delta.json
+"""
+
+import json
+import os
+import shutil
+from pathlib import Path, PurePosixPath
+
+from .config import PROJECT_ROOT, PipelineError, format_size
+from .manifest import file_sha256, write_json
+
+DIST_DIR = PROJECT_ROOT / "dist"
+PUBLISH_MANIFEST = "publish-manifest.json"
+REMOVE_LIST = "publish-remove.txt"
+PUBLISH_VERSION = 1
+
+def build_manifest(root):
+    """{relative posix path: {sha256, bytes}} for every file under root"""
+    files = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            path = Path(dirpath) / filename
+            relative = path.relative_to(root).as_posix()
+            if relative == PUBLISH_MANIFEST or not path.is_file():
+                continue
+            files[relative] = {"sha256": file_sha256(path), "bytes": path.stat().st_size}
+    return {"version": PUBLISH_VERSION, "files": files}
+
+def load_publish_manifest(path):
+    """Read a publish manifest; returns None if it is missing or not one of ours"""
+    try:
+        with open(path, 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(manifest, dict) or manifest.get("version") != PUBLISH_VERSION:
+        return None
+    return manifest
+
+def safe_path(relative):
+    """Reject manifest paths that could escape the deploy directory"""
+    path = PurePosixPath(relative)
+    if path.is_absolute() or '..' in path.parts or not path.parts:
+        raise PipelineError(f"Unsafe path in publish manifest: {relative}")
+    return relative
+
+def diff_manifests(local, deployed):
+    """{add, change, remove, unchanged} path lists between two manifests"""
+    current = local["files"]
+    previous = deployed["files"] if deployed else {}
+    delta = {"add": [], "change": [], "remove": [], "unchanged": []}
+    for path, entry in sorted(current.items()):
+        if path not in previous:
+            delta["add"].append(path)
+        elif previous[path].get("sha256") != entry["sha256"]:
+            delta["change"].append(path)
+        else:
+            delta["unchanged"].append(path)
+    delta["remove"] = sorted(safe_path(path) for path in previous if path not in current)
+    return delta
+
+def stage_delta(root, delta, stage):
+    """Lay out the files to upload under stage/<root name>/, plus the removal list"""
+    if stage.exists():
+        shutil.rmtree(stage)
+    target_root = stage / root.name
+    for relative in delta["add"] + delta["change"] + [PUBLISH_MANIFEST]:
+        source = root / relative
+        target = target_root / relative
+        target.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copy2(source, target)
+    with open(stage / REMOVE_LIST, 'w') as f:
+        for relative in delta["remove"]:
+            f.write(relative + "\n")
+
+def run_manifest(args):
+    if not args.root.is_dir():
+        raise PipelineError(f"Not a directory: {args.root} (run the build first)")
+    manifest = build_manifest(args.root)
+    path = args.root / PUBLISH_MANIFEST
+    write_json(path, manifest)
+    total = sum(entry["bytes"] for entry in manifest["files"].values())
+    print("📦 Publish manifest\n")
+    print(f"  Files: {len(manifest['files'])} ({format_size(total)})")
+    print(f"  📄 {path}\n")
+
+def run_diff(args):
+    manifest_path = args.root / PUBLISH_MANIFEST
+    local = load_publish_manifest(manifest_path)
+    if local is None:
+        raise PipelineError(f"No publish manifest at {manifest_path} (create one with: publish manifest)")
+    deployed = load_publish_manifest(args.deployed) if args.deployed else None
+
+    print("📦 Publish diff\n")
+    if deployed is None:
+        print(f"⚠️  No usable deployed manifest{f' at {args.deployed}' if args.deployed else ''}; "
+              "planning a full upload\n")
+    delta = diff_manifests(local, deployed)
+    files = local["files"]
+
+    for path in delta["add"]:
+        print(f"  ➕ {path} ({format_size(files[path]['bytes'])})")
+    for path in delta["change"]:
+        print(f"  ✏️  {path} ({format_size(files[path]['bytes'])})")
+    for path in delta["remove"]:
+        print(f"  ➖ {path}")
+
+    upload = sum(files[path]["bytes"] for path in delta["add"] + delta["change"])
+    total = sum(entry["bytes"] for entry in files.values())
+    print("\n" + "="*60)
+    print(f"➕ Added: {len(delta['add'])}")
+    print(f"✏️  Changed: {len(delta['change'])}")
+    print(f"➖ Removed: {len(delta['remove'])}")
+    print(f"⏭️  Unchanged: {len(delta['unchanged'])}")
+    print(f"📤 Upload: {format_size(upload)} of {format_size(total)}"
+          + (f" ({upload * 100 / total:.1f}%)" if total else ""))
+    print("="*60 + "\n")
+
+    if args.json:
+        write_json(args.json, {key: delta[key] for key in ('add', 'change', 'remove')})
+        print(f"📄 Delta written to {args.json}")
+    if args.stage:
+        stage_delta(args.root, delta, args.stage)
+        print(f"📁 Staged {len(delta['add']) + len(delta['change'])} file(s) in {args.stage / args.root.name}, "
+              f"removals in {args.stage / REMOVE_LIST}")
+
+def run(args):
+    if args.action == 'manifest':
+        return run_manifest(args)
+    return run_diff(args)
+
+def register(subparsers):
+    parser = subparsers.add_parser('publish', help='Publish manifest of dist/ and the delta against a deployed one')
+    parser.add_argument('action', choices=['manifest', 'diff'])
+    parser.add_argument('--root', type=Path, default=DIST_DIR, help='Build output to publish (default: dist)')
+    parser.add_argument('--deployed', type=Path, help='diff: the publish manifest currently on the server')
+    parser.add_argument('--json', type=Path, help='diff: also write {add, change, remove} as JSON here')
+    parser.add_argument('--stage', type=Path,
+                        help=f'diff: copy files to upload into STAGE/<root name>/ and write STAGE/{REMOVE_LIST}')
+    parser.set_defaults(func=run)
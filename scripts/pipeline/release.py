@@ -0,0 +1,219 @@
+"""
+Versioned catalog releases
+
+Stages write into public/exercise-gifs in place, so anything reading it
+mid-run (the dev server, a build) can see new files with an old manifest,
+or the reverse. A release freezes the catalog into its own directory and
+switches to it in one step:
+
+    .media-cache/catalog/
+      versions/0001/          complete catalog + catalog-version.json
+      versions/0002/
+      current -> versions/0002
+
+- Unchanged files are hard-linked from the previous version, so a release
+  costs O(changed files). A file whose (size, mtime, inode) match the
+  previous release is not even hashed.
+- Changed files are copied, never linked, so later edits to
+  public/exercise-gifs cannot reach into a published version.
+- `current` is replaced with rename(2), an atomic swap. Readers see the old
+  version or the new one, never a mix.
+- The last --keep versions are kept for instant rollback.
+
+vite.config.js serves /exercise-gifs from `current` (dev server and build)
+whenever a release exists.
+
+Usage:
+    python3 scripts/media_pipeline.py release publish [--keep 5]
+    python3 scripts/media_pipeline.py release list
+    python3 scripts/media_pipeline.py release rollback [VERSION]
+    python3 scripts/media_pipeline.py release prune --keep 3
+"""
+
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+from .config import CACHE_DIR, OUTPUT_DIR, PipelineError, format_size
+from .manifest import file_sha256, manifest_lock, write_json
+
+RELEASE_ROOT = CACHE_DIR / "catalog"
+VERSION_FILE = "catalog-version.json"
+DEFAULT_KEEP = 5
+
+def source_files(source):
+    """Relative posix paths of every file in the working catalog"""
+    files = []
+    for dirpath, dirnames, filenames in os.walk(source):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            path = Path(dirpath) / filename
+            if filename.endswith('.tmp') or not path.is_file():
+                continue
+            files.append(path.relative_to(source).as_posix())
+    return files
+
+def stat_key(stat):
+    return [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+
+class Releases:
+    """Numbered catalog versions under root, with a `current` symlink"""
+
+    def __init__(self, root=RELEASE_ROOT):
+        self.root = root
+        self.versions_dir = root / "versions"
+        self.current_link = root / "current"
+
+    def versions(self):
+        """Published version names, oldest first"""
+        if not self.versions_dir.is_dir():
+            return []
+        return sorted(p.name for p in self.versions_dir.iterdir()
+                      if p.is_dir() and (p / VERSION_FILE).exists())
+
+    def current(self):
+        """Name of the live version, or None"""
+        if not self.current_link.is_symlink():
+            return None
+        return Path(os.readlink(self.current_link)).name
+
+    def info(self, version):
+        with open(self.versions_dir / version / VERSION_FILE, 'r') as f:
+            return json.load(f)
+
+    def switch(self, version):
+        """Point `current` at a version atomically"""
+        if not (self.versions_dir / version / VERSION_FILE).exists():
+            raise PipelineError(f"No such catalog version: {version}")
+        tmp_link = self.root / f"current.{os.getpid()}.tmp"
+        tmp_link.unlink(missing_ok=True)
+        os.symlink(Path("versions") / version, tmp_link)
+        os.replace(tmp_link, self.current_link)
+
+    def publish(self, source=OUTPUT_DIR):
+        """Snapshot source as a new version and make it current; returns (version, stats) or (None, stats)"""
+        previous = self.current()
+        old = self.info(previous) if previous else {"files": {}}
+        old_dir = self.versions_dir / previous if previous else None
+        stats = {"linked": 0, "copied": 0, "removed": 0, "hashed": 0, "bytes_copied": 0}
+
+        files = {}
+        plan = []
+        for relative in source_files(source):
+            path = source / relative
+            stat = path.stat()
+            before = old["files"].get(relative)
+            if before and before["source"] == stat_key(stat):
+                sha = before["sha256"]
+            else:
+                sha = file_sha256(path)
+                stats["hashed"] += 1
+            unchanged = before is not None and before["sha256"] == sha
+            files[relative] = {"sha256": sha, "bytes": stat.st_size, "source": stat_key(stat)}
+            plan.append((relative, unchanged))
+        stats["removed"] = len(set(old["files"]) - set(files))
+
+        if previous and stats["removed"] == 0 and all(unchanged for _, unchanged in plan):
+            return None, stats
+
+        # Numbered after the newest version, not the current one, which may be a rollback
+        version = f"{max([int(v) for v in self.versions()] + [0]) + 1:04d}"
+        staging = self.versions_dir / f"{version}.tmp"
+        if staging.exists():
+            shutil.rmtree(staging)
+        for relative, unchanged in plan:
+            target = staging / relative
+            target.parent.mkdir(parents=True, exist_ok=True)
+            if unchanged:
+                os.link(old_dir / relative, target)
+                stats["linked"] += 1
+            else:
+                shutil.copy2(source / relative, target)
+                stats["copied"] += 1
+                stats["bytes_copied"] += files[relative]["bytes"]
+        write_json(staging / VERSION_FILE, {
+            "version": version,
+            "parent": previous,
+            "created": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "files": files,
+        })
+        os.rename(staging, self.versions_dir / version)
+        self.switch(version)
+        return version, stats
+
+    def prune(self, keep):
+        """Delete all but the newest `keep` versions (never the current one); returns the removed names"""
+        current = self.current()
+        versions = self.versions()
+        removed = []
+        for version in versions[:max(len(versions) - keep, 0)]:
+            if version == current:
+                continue
+            shutil.rmtree(self.versions_dir / version)
+            removed.append(version)
+        return removed
+
+def print_versions(releases):
+    current = releases.current()
+    versions = releases.versions()
+    if not versions:
+        print("  No releases yet (create one with: release publish)")
+    for version in versions:
+        info = releases.info(version)
+        total = sum(entry["bytes"] for entry in info["files"].values())
+        marker = "👉" if version == current else "  "
+        print(f"  {marker} {version}  {info['created']}  {len(info['files'])} files, {format_size(total)}")
+
+def run(args):
+    releases = Releases(args.root)
+    print("🏷️  Catalog releases\n")
+    print(f"  Location: {releases.root}\n")
+
+    with manifest_lock(releases.root / "release"):
+        if args.action == 'publish':
+            if not args.source.is_dir():
+                raise PipelineError(f"Catalog directory not found: {args.source}")
+            releases.versions_dir.mkdir(parents=True, exist_ok=True)
+            start = time.time()
+            version, stats = releases.publish(args.source)
+            if version is None:
+                print(f"⏭️  Catalog unchanged since {releases.current()}, nothing to publish")
+            else:
+                print(f"✅ Published {version} in {time.time() - start:.2f}s")
+                print(f"  🔗 Linked:  {stats['linked']} unchanged")
+                print(f"  📄 Copied:  {stats['copied']} changed ({format_size(stats['bytes_copied'])})")
+                print(f"  ➖ Dropped: {stats['removed']}")
+                print(f"  #️⃣  Hashed:  {stats['hashed']} (others matched by size/mtime/inode)")
+            args.action = 'prune'
+        elif args.action == 'rollback':
+            versions = releases.versions()
+            current = releases.current()
+            if args.version:
+                target = args.version
+            else:
+                older = [v for v in versions if current and v < current]
+                if not older:
+                    raise PipelineError("No earlier version to roll back to")
+                target = older[-1]
+            releases.switch(target)
+            print(f"↩️  current -> {target} (was {current})")
+
+        if args.action == 'prune':
+            removed = releases.prune(args.keep)
+            if removed:
+                print(f"🗑️  Pruned: {', '.join(removed)}")
+
+    print()
+    print_versions(releases)
+    print()
+
+def register(subparsers):
+    parser = subparsers.add_parser('release', help='Versioned catalog snapshots with atomic switch and rollback')
+    parser.add_argument('action', choices=['publish', 'list', 'rollback', 'prune'])
+    parser.add_argument('version', nargs='?', help='rollback: version to switch to (default: the previous one)')
+    parser.add_argument('--source', type=Path, default=OUTPUT_DIR, help='Working catalog (default: public/exercise-gifs)')
+    parser.add_argument('--root', type=Path, default=RELEASE_ROOT, help='Release directory (default: .media-cache/catalog)')
+    parser.add_argument('--keep', type=int, default=DEFAULT_KEEP, help=f'Versions to keep (default: {DEFAULT_KEEP})')
+    parser.set_defaults(func=run)
@@ -0,0 +1,78 @@
+"""
+Priority scheduling for fetch workers
+
+Workers pull the highest-priority task whose first host has a free slot
+in the host limiter, so a full host never blocks more valuable work on
+other hosts. The scheduler ranks each task's candidates itself (the
+limiter's ranking, reprobes included) and hands them out in that order,
+so the host it checked is the host the download tries first. When every
+host is full, workers sleep until the limiter releases a slot. With a deadline (fetch --time-budget), nothing new starts
+once it passes; downloads already in flight finish and the remaining
+tasks stay in the journal for the next run. With keep_first (fetch
+--from-plan), a task's first host is the one its plan chose.
+"""
+
+import heapq
+import threading
+import time
+
+from .hostlimits import host_of
+
+class PriorityScheduler:
+    """Thread-safe priority queue of fetch tasks"""
+
+    def __init__(self, tasks, priorities, limiter=None, deadline=None, keep_first=False):
+        self.limiter = limiter
+        self.deadline = deadline
+        self.keep_first = keep_first
+        self.stopped = False
+        self._cond = threading.Condition()
+        # Highest priority first; catalog order breaks ties
+        self._heap = [(-priorities.get(task.filename, 0), i, task) for i, task in enumerate(tasks)]
+        heapq.heapify(self._heap)
+        if limiter:
+            limiter.on_release(self._wake)
+
+    def _wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def expired(self):
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def next(self):
+        """Next task to run, candidates in the order to try them; None when empty, stopped or out of time"""
+        with self._cond:
+            while True:
+                if self.stopped or self.expired() or not self._heap:
+                    return None
+                deferred = []
+                chosen = None
+                while self._heap:
+                    item = heapq.heappop(self._heap)
+                    task = item[2]
+                    if self.limiter is None:
+                        chosen = task
+                        break
+                    order = self.limiter.rank(task.candidates, keep_first=self.keep_first, peek=True)
+                    if self.limiter.has_capacity(host_of(order[0])):
+                        # Same order again, this time using up the reprobe if it picked one
+                        chosen = task._replace(candidates=self.limiter.rank(task.candidates,
+                                                                            keep_first=self.keep_first))
+                        break
+                    deferred.append(item)
+                for item in deferred:
+                    heapq.heappush(self._heap, item)
+                if chosen:
+                    return chosen
+                # Every remaining host is at its limit: sleep until a release (or the deadline)
+                self._cond.wait(max(0.0, self.deadline - time.monotonic()) if self.deadline else None)
+
+    def stop(self):
+        with self._cond:
+            self.stopped = True
+            self._cond.notify_all()
+
+    def remaining(self):
+        with self._cond:
+            return [item[2] for item in sorted(self._heap)]
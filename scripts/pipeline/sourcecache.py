@@ -0,0 +1,296 @@
+"""
+Raw-source cache
+
+Downloaded originals are kept in .media-cache/sources, separate from the
+published (trimmed, re-encoded) files in public/exercise-gifs. They are
+stored by content hash:
+
+    sources/
+      index.json              url -> sha, published filename -> sha, last use
+      objects/ab/abcdef....gif
+
+Objects are hard-linked to the published file when the filesystem allows
+it (every stage replaces files atomically, so a link never sees a
+rewrite), otherwise copied.
+
+- fetch restores a missing file from the cache instead of downloading it,
+  and adds every new download.
+- loop-trim, and encode for assets loop-trim left alone, read the original
+  from here. Reprocessing with new settings starts from the source, not from
+  the previous output.
+
+The cache is bounded by a quota (DEFAULT_QUOTA, or `sources quota`).
+Eviction removes the least recently used objects first and never removes
+originals of GIFs that src/utils/exerciseMedia.js references.
+
+Usage:
+    python3 scripts/media_pipeline.py sources status
+    python3 scripts/media_pipeline.py sources import            # seed from untouched published GIFs
+    python3 scripts/media_pipeline.py sources restore [--force] # put originals back in public/
+    python3 scripts/media_pipeline.py sources quota 1GB
+    python3 scripts/media_pipeline.py sources gc
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+
+from .catalog import load_media_map
+from .config import CACHE_DIR, OUTPUT_DIR, PipelineError, catalog_files, format_size, parse_size
+from .manifest import file_sha256, load_manifest, manifest_lock, write_json
+
+SOURCE_CACHE_DIR = CACHE_DIR / "sources"
+INDEX_VERSION = 1
+DEFAULT_QUOTA = '2GB'
+
+def _link_or_copy(source, target):
+    """Place source at target atomically, sharing the inode when possible"""
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = target.with_name(f"{target.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        try:
+            os.link(source, tmp_path)
+        except OSError:
+            shutil.copyfile(source, tmp_path)
+        os.replace(tmp_path, target)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+class SourceCache:
+    """Content-addressed store of original downloads with LRU eviction"""
+
+    def __init__(self, directory=SOURCE_CACHE_DIR):
+        self.directory = directory
+        self.index_path = directory / "index.json"
+        self.objects_dir = directory / "objects"
+
+    def _load(self):
+        if self.index_path.exists():
+            with open(self.index_path, 'r') as f:
+                index = json.load(f)
+            if index.get("version") == INDEX_VERSION:
+                return index
+        return {"version": INDEX_VERSION, "quota": None, "objects": {}, "urls": {}, "files": {}}
+
+    def _update(self, change):
+        """Apply change(index) under the cross-process lock and save"""
+        with manifest_lock(self.index_path):
+            index = self._load()
+            result = change(index)
+            write_json(self.index_path, index)
+        return result
+
+    def object_path(self, sha):
+        return self.objects_dir / sha[:2] / f"{sha}.gif"
+
+    def _held(self, index, sha):
+        return sha in index["objects"] and self.object_path(sha).exists()
+
+    @property
+    def quota(self):
+        return self._load().get("quota") or parse_size(DEFAULT_QUOTA)
+
+    def set_quota(self, size):
+        def change(index):
+            index["quota"] = size
+        self._update(change)
+
+    def add(self, path, url=None, filename=None):
+        """Store a downloaded original; returns its sha256"""
+        sha = file_sha256(path)
+        target = self.object_path(sha)
+        if not target.exists():
+            _link_or_copy(path, target)
+
+        def change(index):
+            now = round(time.time())
+            entry = index["objects"].setdefault(sha, {"bytes": path.stat().st_size, "added": now,
+                                                      "urls": [], "files": []})
+            entry["used"] = now
+            if url and url not in entry["urls"]:
+                entry["urls"].append(url)
+                index["urls"][url] = sha
+            if filename:
+                if filename not in entry["files"]:
+                    entry["files"].append(filename)
+                index["files"][filename] = sha
+        self._update(change)
+        return sha
+
+    def lookup(self, filename=None, urls=()):
+        """sha of a held original for this published filename or any of these URLs"""
+        index = self._load()
+        candidates = [index["files"].get(filename)] + [index["urls"].get(url) for url in urls]
+        return next((sha for sha in candidates if sha and self._held(index, sha)), None)
+
+    def published(self):
+        """{published filename: sha of its held original}"""
+        return dict(self._load()["files"])
+
+    def touch(self, sha):
+        def change(index):
+            if sha in index["objects"]:
+                index["objects"][sha]["used"] = round(time.time())
+        self._update(change)
+
+    def original(self, filename):
+        """Path of the held original for a published filename (marks it used), or None"""
+        sha = self.lookup(filename)
+        if sha is None:
+            return None
+        self.touch(sha)
+        return self.object_path(sha)
+
+    def restore(self, sha, target, filename=None):
+        """Materialize a held object at target; returns {url, bytes, sha256}"""
+        _link_or_copy(self.object_path(sha), target)
+        entry = {}
+
+        def change(index):
+            entry.update(index["objects"][sha])
+            entry["used"] = round(time.time())
+            index["objects"][sha]["used"] = entry["used"]
+            if filename:
+                index["files"][filename] = sha
+                if filename not in index["objects"][sha]["files"]:
+                    index["objects"][sha]["files"].append(filename)
+        self._update(change)
+        return {"url": entry["urls"][0] if entry["urls"] else None, "bytes": entry["bytes"], "sha256": sha}
+
+    def pinned(self, index, referenced=None):
+        """shas of originals for GIFs the app references"""
+        if referenced is None:
+            try:
+                referenced = {filename for filename, _ in load_media_map().values()}
+            except PipelineError:
+                referenced = set()
+        return {sha for filename, sha in index["files"].items() if filename in referenced}
+
+    def usage(self):
+        """(total bytes, object count, pinned bytes)"""
+        index = self._load()
+        pinned = self.pinned(index)
+        total = sum(entry["bytes"] for entry in index["objects"].values())
+        pinned_bytes = sum(index["objects"][sha]["bytes"] for sha in pinned if sha in index["objects"])
+        return total, len(index["objects"]), pinned_bytes
+
+    def evict(self, quota=None):
+        """Drop least recently used, unpinned objects until under quota; returns [(sha, bytes)]"""
+        def change(index):
+            limit = quota or index.get("quota") or parse_size(DEFAULT_QUOTA)
+            pinned = self.pinned(index)
+            # Objects whose file vanished are dropped from the index first
+            for sha in [sha for sha in index["objects"] if not self.object_path(sha).exists()]:
+                self._forget(index, sha)
+            total = sum(entry["bytes"] for entry in index["objects"].values())
+            removed = []
+            for sha, entry in sorted(index["objects"].items(), key=lambda item: item[1].get("used", 0)):
+                if total <= limit:
+                    break
+                if sha in pinned:
+                    continue
+                self.object_path(sha).unlink(missing_ok=True)
+                self._forget(index, sha)
+                total -= entry["bytes"]
+                removed.append((sha, entry["bytes"]))
+            return removed
+        return self._update(change)
+
+    @staticmethod
+    def _forget(index, sha):
+        entry = index["objects"].pop(sha)
+        for url in entry["urls"]:
+            if index["urls"].get(url) == sha:
+                del index["urls"][url]
+        for filename in entry["files"]:
+            if index["files"].get(filename) == sha:
+                del index["files"][filename]
+
+def place_original(source, filepath):
+    """Make the published file a copy of the original a stage read, if it is not already"""
+    if source != filepath and (not filepath.exists() or file_sha256(filepath) != file_sha256(source)):
+        _link_or_copy(source, filepath)
+
+def stage_input(filepath, entry, cache):
+    """The file a processing stage should read for a published asset
+
+    The held original, unless loop-trim rewrote the asset. Then the trimmed
+    file in public/ is the input the later stages build on.
+    """
+    if cache is None or (entry.get("loop") or {}).get("trimmed"):
+        return filepath
+    return cache.original(filepath.name) or filepath
+
+def untouched(entry):
+    """True if no stage has rewritten a published GIF since it was downloaded"""
+    if (entry.get("loop") or {}).get("trimmed"):
+        return False
+    encoded = (entry.get("encode") or {}).get("gif")
+    return not encoded or encoded["output_sha256"] == encoded["source_sha256"]
+
+def print_status(cache):
+    total, count, pinned = cache.usage()
+    quota = cache.quota
+    print(f"  Objects: {count}")
+    print(f"  Size:    {format_size(total)} of {format_size(quota)} quota ({total * 100 / quota:.0f}%)")
+    print(f"  Pinned:  {format_size(pinned)} (referenced by exerciseMedia.js)")
+    if pinned > quota:
+        print("  ⚠️  Pinned originals alone exceed the quota; raise it with: sources quota <size>")
+
+def run(args):
+    cache = SourceCache()
+    print("🗄️  Raw-source cache\n")
+    print(f"  Location: {cache.directory}")
+
+    if args.action == 'quota':
+        if not args.size:
+            raise PipelineError("Usage: sources quota <size>, e.g. 1GB")
+        cache.set_quota(parse_size(args.size))
+        print(f"  Quota set to {format_size(cache.quota)}")
+        args.action = 'gc'
+
+    if args.action == 'import':
+        # Only GIFs no stage has rewritten are originals
+        manifest = load_manifest()
+        added = 0
+        for filepath in catalog_files():
+            entry = manifest["assets"].get(filepath.name, {})
+            if cache.lookup(filepath.name) or not untouched(entry):
+                continue
+            cache.add(filepath, filename=filepath.name)
+            added += 1
+        print(f"  Imported: {added} untouched GIF(s) from {OUTPUT_DIR}")
+        args.action = 'gc'
+
+    if args.action == 'restore':
+        index = cache._load()
+        restored = 0
+        for filename, sha in sorted(index["files"].items()):
+            target = OUTPUT_DIR / filename
+            if not cache._held(index, sha) or (target.exists() and not args.force):
+                continue
+            if target.exists() and file_sha256(target) == sha:
+                continue
+            cache.restore(sha, target, filename)
+            restored += 1
+        print(f"  Restored: {restored} original(s) into {OUTPUT_DIR}")
+        if restored and args.force:
+            print("  Re-run loop-trim/encode/placeholders to rebuild the published files.")
+
+    if args.action == 'gc':
+        removed = cache.evict(parse_size(args.quota) if args.quota else None)
+        print(f"  Evicted: {len(removed)} object(s), {format_size(sum(size for _, size in removed))}")
+
+    print()
+    print_status(cache)
+    print()
+
+def register(subparsers):
+    parser = subparsers.add_parser('sources', help='Raw-source cache: status, import, restore, quota, gc')
+    parser.add_argument('action', choices=['status', 'import', 'restore', 'quota', 'gc'])
+    parser.add_argument('size', nargs='?', help='New quota for "quota", e.g. 1GB')
+    parser.add_argument('--quota', help='Evict down to this size instead of the configured quota (gc)')
+    parser.add_argument('--force', action='store_true', help='restore: overwrite processed files too')
+    parser.set_defaults(func=run)
@@ -0,0 +1,98 @@
+"""
+Fetch sources
+
+Collects the exercise → URL lists that the individual download scripts
+carry, so the pipeline can fetch them as one catalog run. Each exercise
+becomes one task; when several scripts list the same exercise, their URLs
+become fallback candidates in SOURCES order.
+"""
+
+import contextlib
+import importlib
+import io
+from collections import namedtuple
+
+from .config import OUTPUT_DIR, PipelineError, to_kebab_case
+
+# task_id: stable key for journals/queues, candidates: URLs to try in order
+FetchTask = namedtuple('FetchTask', ['task_id', 'name', 'filename', 'candidates', 'sources'])
+
+# (source name, script module, attribute holding its list)
+SOURCES = [
+    ('url-file', 'download_gifs_from_file', None),
+    ('verified', 'download_verified_gifs', 'KNOWN_GIFS'),
+    ('home', 'download_home_workout_gifs', 'HOME_WORKOUT_GIFS'),
+    ('multi-source', 'download_multi_source', 'MULTI_SOURCE_EXERCISES'),
+    ('giphy', 'download_giphy_exercises', 'EXERCISE_GIFS'),
+    ('manual', 'download_gifs', 'EXERCISE_URLS'),
+    ('discovered', 'pipeline.discover', None),
+]
+
+SOURCE_NAMES = [name for name, _, _ in SOURCES]
+
+def read_url_file(path):
+    """(name, url) pairs from a file in the gif-urls.txt format ("Name | URL")"""
+    entries = []
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            parts = [part.strip() for part in line.split('|')]
+            if len(parts) == 2 and parts[1].startswith('http'):
+                entries.append(tuple(parts))
+    return entries
+
+def _source_entries(module_name, attribute):
+    """Yield (exercise name, url) pairs from one download script"""
+    module = importlib.import_module(module_name)
+    if module_name == 'pipeline.discover':
+        # Cached mappings from `discover`; reading them never hits the network
+        yield from module.cached_entries()
+        return
+    if attribute is None:
+        # gif-urls.txt prints its own warnings for malformed lines
+        with contextlib.redirect_stdout(io.StringIO()):
+            entries = module.parse_input_file() or []
+        yield from entries
+        return
+
+    value = getattr(module, attribute)
+    items = value.items() if isinstance(value, dict) else value
+    for name, urls in items:
+        for url in ([urls] if isinstance(urls, str) else urls):
+            yield name, url
+
+def load_tasks(only=None, url_file=None):
+    """Build fetch tasks from the download scripts, merged by output filename
+
+    url_file replaces scripts/gif-urls.txt as the url-file source.
+    """
+    unknown = set(only or []) - set(SOURCE_NAMES)
+    if unknown:
+        raise PipelineError(f"Unknown source(s): {', '.join(sorted(unknown))} "
+                            f"(choose from {', '.join(SOURCE_NAMES)})")
+
+    tasks = {}
+    for source, module_name, attribute in SOURCES:
+        if only and source not in only:
+            continue
+        if source == 'url-file' and url_file:
+            entries = read_url_file(url_file)
+        else:
+            entries = _source_entries(module_name, attribute)
+        for name, url in entries:
+            filename = f"{to_kebab_case(name)}.gif"
+            task = tasks.get(filename)
+            if task is None:
+                task = FetchTask(f"fetch:{filename}", name, filename, [], [])
+                tasks[filename] = task
+            if url not in task.candidates:
+                task.candidates.append(url)
+            if source not in task.sources:
+                task.sources.append(source)
+    return list(tasks.values())
+
+def output_path(task, directory=OUTPUT_DIR):
+    """Where a fetch task's GIF is published"""
+    return directory / task.filename
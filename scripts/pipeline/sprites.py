@@ -0,0 +1,131 @@
+"""
+Poster sprite atlas
+
+History, WorkoutTemplates and WorkoutCard show many exercises at once. Instead
+of one request per exercise, the first frame of every GIF is packed into a
+few sprite sheets (one per category by default) and the manifest records
+where each poster sits.
+
+Usage:
+    python3 scripts/media_pipeline.py sprites
+    python3 scripts/media_pipeline.py sprites --group all --cell 128
+"""
+
+import hashlib
+import io
+import math
+
+from .catalog import file_categories, load_media_map
+from .config import OUTPUT_DIR, PipelineError, catalog_files, format_size
+from .frames import load_poster, require_imaging, write_atomic
+from .manifest import asset_entry, file_sha256, load_manifest, save_manifest
+
+SPRITES_DIR = OUTPUT_DIR / "sprites"
+DEFAULT_CELL = 96
+SHEET_QUALITY = 80
+
+def group_files(files, grouping):
+    """Split catalog files into {group name: [paths]}; no group is ever empty"""
+    if grouping == 'all':
+        return {'all': files} if files else {}
+    categories = file_categories(load_media_map())
+    groups = {}
+    for filepath in files:
+        groups.setdefault(categories.get(filepath.name, 'other'), []).append(filepath)
+    return groups
+
+def sheet_key(files, cell):
+    """Fingerprint of a sheet's inputs, used to skip unchanged sheets"""
+    digest = hashlib.sha256(f"cell={cell};q={SHEET_QUALITY}".encode())
+    for filepath in files:
+        digest.update(f"{filepath.name}={file_sha256(filepath)};".encode())
+    return digest.hexdigest()
+
+def build_sheet(files, cell):
+    """Pack first-frame posters into a grid; returns (webp bytes, size, {filename: rect})"""
+    if not files:
+        raise PipelineError("A sprite sheet needs at least one poster")
+    _, Image = require_imaging()
+    columns = math.ceil(math.sqrt(len(files)))
+    rows = math.ceil(len(files) / columns)
+    sheet = Image.new('RGB', (columns * cell, rows * cell), (255, 255, 255))
+
+    rects = {}
+    for index, filepath in enumerate(files):
+        poster, _ = load_poster(filepath)
+        poster.thumbnail((cell, cell), Image.LANCZOS)
+        x = (index % columns) * cell
+        y = (index // columns) * cell
+        # Center inside the cell; the rect is the cell so CSS offsets stay on the grid
+        sheet.paste(poster, (x + (cell - poster.width) // 2, y + (cell - poster.height) // 2))
+        rects[filepath.name] = {"x": x, "y": y, "w": cell, "h": cell}
+
+    buffer = io.BytesIO()
+    sheet.save(buffer, format='WEBP', quality=SHEET_QUALITY, method=6)
+    return buffer.getvalue(), sheet.size, rects
+
+def run(args):
+    files = catalog_files()
+    groups = group_files(files, args.group)
+    manifest = load_manifest()
+    sheets = manifest.setdefault("sprites", {})
+
+    print(f"🧩 Packing {len(files)} posters into {len(groups)} sprite sheet(s)...\n")
+
+    SPRITES_DIR.mkdir(parents=True, exist_ok=True)
+    built = 0
+    total_bytes = 0
+    for group, members in sorted(groups.items()):
+        print(f"  {group} ({len(members)} posters)... ", end='', flush=True)
+        key = sheet_key(members, args.cell)
+        sheet_path = SPRITES_DIR / f"{group}.webp"
+
+        previous = sheets.get(group)
+        if previous and previous.get("inputs") == key and sheet_path.exists():
+            total_bytes += previous["bytes"]
+            print("⏭️  (unchanged)")
+            continue
+
+        data, (width, height), rects = build_sheet(members, args.cell)
+        write_atomic(sheet_path, data)
+        total_bytes += len(data)
+        built += 1
+
+        sheets[group] = {
+            "file": f"sprites/{sheet_path.name}",
+            "width": width,
+            "height": height,
+            "cell": args.cell,
+            "count": len(members),
+            "bytes": len(data),
+            "sha256": hashlib.sha256(data).hexdigest(),
+            "inputs": key,
+        }
+        for filename, rect in rects.items():
+            asset_entry(manifest, filename)["sprite"] = {"sheet": group, **rect}
+        print(f"✅ {width}×{height} ({format_size(len(data))})")
+
+    # Drop sheets for groups that no longer exist
+    for group in set(sheets) - set(groups):
+        stale = SPRITES_DIR / f"{group}.webp"
+        if stale.exists():
+            stale.unlink()
+        del sheets[group]
+    for filename, entry in manifest["assets"].items():
+        if "sprite" in entry and entry["sprite"]["sheet"] not in groups:
+            del entry["sprite"]
+
+    save_manifest(manifest)
+
+    print("\n" + "="*60)
+    print(f"✅ Built: {built}")
+    print(f"⏭️  Unchanged: {len(groups) - built}")
+    print(f"📦 {len(groups)} sheet(s), {format_size(total_bytes)} for {len(files)} posters")
+    print("="*60 + "\n")
+
+def register(subparsers):
+    parser = subparsers.add_parser('sprites', help='Pack first-frame posters into sprite sheets')
+    parser.add_argument('--group', choices=['category', 'all'], default='category',
+                        help='One sheet per exerciseMedia.js category, or a single sheet')
+    parser.add_argument('--cell', type=int, default=DEFAULT_CELL, help='Cell size in pixels')
+    parser.set_defaults(func=run)
@@ -0,0 +1,70 @@
+"""
+Structural similarity (SSIM) for animations
+
+Frames are compared in grayscale with a uniform 7x7 window. Window sums come
+from summed-area tables, so a whole stack of frames is scored with a handful
+of NumPy operations and no per-pixel Python loops.
+"""
+
+from .frames import require_imaging
+
+WINDOW = 7
+C1 = (0.01 * 255) ** 2
+C2 = (0.03 * 255) ** 2
+
+def _window_mean(stack, window=WINDOW):
+    """Mean over every window x window patch of each frame in an (N, H, W) stack"""
+    np, _ = require_imaging()
+    padded = np.pad(stack, ((0, 0), (1, 0), (1, 0)))
+    table = padded.cumsum(axis=1).cumsum(axis=2)
+    sums = (table[:, window:, window:] - table[:, :-window, window:]
+            - table[:, window:, :-window] + table[:, :-window, :-window])
+    return sums / (window * window)
+
+def gray_stack(frames):
+    """Stack PIL frames as an (N, H, W) float64 grayscale array"""
+    np, _ = require_imaging()
+    return np.stack([np.asarray(frame.convert('L'), dtype=np.float64) for frame in frames])
+
+def ssim_per_frame(reference, candidate):
+    """SSIM of each frame pair in two equally shaped (N, H, W) stacks"""
+    mu_x = _window_mean(reference)
+    mu_y = _window_mean(candidate)
+    var_x = _window_mean(reference * reference) - mu_x * mu_x
+    var_y = _window_mean(candidate * candidate) - mu_y * mu_y
+    cov = _window_mean(reference * candidate) - mu_x * mu_y
+
+    ssim_map = ((2 * mu_x * mu_y + C1) * (2 * cov + C2)) / (
+        (mu_x * mu_x + mu_y * mu_y + C1) * (var_x + var_y + C2))
+    return ssim_map.mean(axis=(1, 2))
+
+def sample_indices(count, samples):
+    """Evenly spaced frame indices, at most `samples` of them"""
+    if count <= samples:
+        return list(range(count))
+    step = count / samples
+    return [int(i * step) for i in range(samples)]
+
+def frame_at(durations, t):
+    """Index of the frame showing at time t (ms)"""
+    elapsed = 0
+    for i, delay in enumerate(durations):
+        elapsed += delay
+        if t < elapsed:
+            return i
+    return len(durations) - 1
+
+def clip_ssim(original, encoded, samples=8):
+    """Compare two clips at sampled timestamps; returns (mean, min) SSIM
+
+    The encoded clip may have fewer frames (reduced FPS), so each sampled
+    original frame is matched with whatever encoded frame is on screen at
+    the same moment.
+    """
+    indices = sample_indices(len(original.frames), samples)
+    starts = [sum(original.durations[:i]) for i in indices]
+    reference = gray_stack([original.frames[i] for i in indices])
+    candidate = gray_stack([encoded.frames[frame_at(encoded.durations, t)] for t in starts])
+
+    scores = ssim_per_frame(reference, candidate)
+    return float(scores.mean()), float(scores.min())
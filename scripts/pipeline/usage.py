@@ -0,0 +1,162 @@
+"""
+Exercise usage
+
+Counts how often each exercise (and therefore each GIF) shows up in the
+places the app draws workouts from:
+
+    src/utils/workoutTemplates.js   literal exercise names
+    src/services/api.js             the generator's evidence-based exercise pools
+                                    and the example workouts in its prompts
+    history export (optional)       JSON exported from the app (workouts,
+                                    templates, or the whole localStorage dump)
+
+Names are resolved to files with the same rules as getExerciseMedia() in
+src/utils/exerciseMedia.js.
+"""
+
+import json
+import re
+from collections import Counter
+
+from .catalog import load_media_map
+from .config import PROJECT_ROOT, PipelineError
+
+TEMPLATES_PATH = PROJECT_ROOT / "src" / "utils" / "workoutTemplates.js"
+GENERATOR_PATH = PROJECT_ROOT / "src" / "services" / "api.js"
+
+_NAME_FIELD_RE = re.compile(r"""["']?name["']?\s*:\s*(?:"([^"]+)"|'([^']+)')""")
+_POOL_HEADING_RE = re.compile(r"^[A-Z][A-Z /-]+\(top \d+\):\s*$")
+_POOL_ITEM_RE = re.compile(r"^-\s+(.+?)\s*$")
+_PARENTHETICAL_RE = re.compile(r"\s*\([^)]*\)")
+_PLACEHOLDER_NAMES = {'exercise name', 'template name', 'stretch name'}
+
+# Same word lists as getExerciseMedia()
+_EQUIPMENT_RE = re.compile(r"\b(barbell|dumbbell|db|bb|cable|machine|smith)\b", re.IGNORECASE)
+_POSITION_RE = re.compile(r"\b(standing|seated|lying|incline|decline)\b", re.IGNORECASE)
+
+def resolve_media(name, media_map):
+    """Python port of getExerciseMedia(): exercise name → GIF filename or None"""
+    if not name:
+        return None
+
+    if name in media_map:
+        return media_map[name][0]
+
+    normalized = name.lower().strip()
+    for key, (filename, _) in media_map.items():
+        if key.lower() == normalized:
+            return filename
+
+    cleaned = _POSITION_RE.sub('', _EQUIPMENT_RE.sub('', normalized))
+    cleaned = re.sub(r"\s+", ' ', cleaned).strip()
+    if cleaned:
+        for key, (filename, _) in media_map.items():
+            lowered = key.lower()
+            if cleaned in lowered or lowered in cleaned:
+                return filename
+
+    for key, (filename, _) in media_map.items():
+        lowered = key.lower()
+        if lowered in normalized or normalized in lowered:
+            return filename
+
+    return None
+
+def _literal_names(text):
+    """Exercise names written as `name: '...'` literals"""
+    names = []
+    for match in _NAME_FIELD_RE.finditer(text):
+        name = (match.group(1) or match.group(2)).strip()
+        if name.lower() not in _PLACEHOLDER_NAMES:
+            names.append(name)
+    return names
+
+def template_names(path=TEMPLATES_PATH):
+    """Exercise names hard-coded in the templates module"""
+    if not path.exists():
+        return []
+    return _literal_names(path.read_text())
+
+def generator_names(path=GENERATOR_PATH):
+    """Exercise names from the generator's pools and prompt examples"""
+    if not path.exists():
+        return []
+    text = path.read_text()
+
+    names = []
+    in_pool = False
+    for line in text.splitlines():
+        stripped = line.strip()
+        if _POOL_HEADING_RE.match(stripped):
+            in_pool = True
+            continue
+        item = _POOL_ITEM_RE.match(stripped) if in_pool else None
+        if item:
+            names.append(_PARENTHETICAL_RE.sub('', item.group(1)).strip())
+        elif in_pool:
+            in_pool = False
+    return names + _literal_names(text)
+
+def _walk_exercises(node, names):
+    if isinstance(node, dict):
+        exercises = node.get('exercises')
+        if isinstance(exercises, list):
+            for exercise in exercises:
+                if isinstance(exercise, dict) and isinstance(exercise.get('name'), str):
+                    names.append(exercise['name'])
+        for key, value in node.items():
+            if key == 'exercises':
+                continue
+            # localStorage dumps keep nested state as JSON strings
+            if isinstance(value, str) and value[:1] in '[{':
+                try:
+                    value = json.loads(value)
+                except ValueError:
+                    continue
+            _walk_exercises(value, names)
+    elif isinstance(node, list):
+        for item in node:
+            _walk_exercises(item, names)
+
+def history_names(path):
+    """Exercise names from an exported history/templates JSON file"""
+    if not path.exists():
+        raise PipelineError(f"History export not found: {path}")
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except ValueError as e:
+        raise PipelineError(f"History export is not valid JSON: {e}")
+    names = []
+    _walk_exercises(data, names)
+    return names
+
+def usage_counts(history_path=None, media_map=None):
+    """Count uses per GIF filename; returns (Counter, sources summary)"""
+    media_map = media_map if media_map is not None else load_media_map()
+    sources = {
+        'templates': template_names(),
+        'generator': generator_names(),
+    }
+    if history_path:
+        sources['history'] = history_names(history_path)
+
+    counts = Counter()
+    for names in sources.values():
+        for name in names:
+            filename = resolve_media(name, media_map)
+            if filename:
+                counts[filename] += 1
+    return counts, {source: len(names) for source, names in sources.items()}
+
+def fetch_priorities(filenames, history_path=None):
+    """Scheduling priority per filename: uses first, then whether the app maps to it
+
+    A file the app's mapping points at but that is missing from disk shows
+    a broken image, so among equally used files those come first. Scores
+    are ints (2 × uses + mapped) so they fit the work queue's priority column.
+    """
+    media_map = load_media_map()
+    counts, _ = usage_counts(history_path, media_map)
+    mapped = {filename for filename, _ in media_map.values()}
+    return {filename: 2 * counts[filename] + (filename in mapped) for filename in filenames}
@@ -0,0 +1,391 @@
+"""
+On-demand variant server
+
+Serves resized/re-encoded variants of the catalog GIFs without generating
+them all ahead of time:
+
+    GET /exercise-gifs/squat.gif                 the catalog file itself
+    GET /exercise-gifs/squat.gif?w=320&fmt=webp  320px-wide animated WebP
+    GET /exercise-gifs/squat?fmt=gif&w=160
+
+- A variant is encoded on its first request, from the catalog file, with
+  the parameters `encode` stored in the manifest for that format (or the
+  encoder defaults). It is cached on disk in .media-cache/variants.
+- The cache is LRU with a byte budget. Hits bump the file's mtime, so
+  recency survives restarts. Least recently used variants are deleted once
+  the budget is exceeded.
+- Concurrent first requests for the same variant wait on one encode
+  rather than each encoding it.
+- Widths are rounded up to a fixed ladder (WIDTHS) and never upscaled, so
+  arbitrary ?w= values cannot fill the cache.
+- Responses carry a strong ETag (the hash of original + variant
+  parameters) and answer If-None-Match with 304. Single byte ranges (and
+  If-Range) are supported. Bodies go out with os.sendfile, falling back to
+  a buffered copy where sendfile is unavailable.
+
+Usage:
+    python3 scripts/media_pipeline.py serve
+    python3 scripts/media_pipeline.py serve --port 8090 --budget 512MB
+    curl -I 'http://localhost:8090/exercise-gifs/bench-press.gif?w=320&fmt=webp'
+"""
+
+import email.utils
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from .config import CACHE_DIR, OUTPUT_DIR, PipelineError, format_size, parse_size
+from .encode import encode
+from .frames import Clip, load_clip, require_imaging, write_atomic
+from .manifest import file_sha256, load_manifest
+
+VARIANT_DIR = CACHE_DIR / "variants"
+DEFAULT_PORT = 8090
+DEFAULT_BUDGET = '256MB'
+URL_PREFIX = '/exercise-gifs/'
+WIDTHS = (96, 160, 240, 320, 480, 640, 960)
+FORMATS = {'gif': 'image/gif', 'webp': 'image/webp'}
+# Used when the manifest has no `encode` result for the format
+DEFAULT_PARAMS = {'gif': {"value": 256, "frame_step": 1}, 'webp': {"value": 80, "frame_step": 1}}
+CACHE_CONTROL = 'public, max-age=300'
+VARIANT_VERSION = 1
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+def snap_width(width):
+    """Round a requested width up to the ladder (the largest rung caps it)"""
+    return next((rung for rung in WIDTHS if rung >= width), WIDTHS[-1])
+
+def resize_clip(clip, width):
+    """Downscale every frame to width, keeping the aspect ratio; never upscales"""
+    _, Image = require_imaging()
+    if width >= clip.size[0]:
+        return clip
+    height = max(1, round(clip.size[1] * width / clip.size[0]))
+    frames = [frame.resize((width, height), Image.LANCZOS) for frame in clip.frames]
+    return Clip(frames, clip.durations, (width, height))
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single-range header, None to send everything, or 'unsatisfiable'"""
+    match = RANGE_PATTERN.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        # Multiple ranges or garbage: a full response is always allowed
+        return None
+    first, last = match.groups()
+    if first == '':
+        length = int(last)
+        if length == 0:
+            return 'unsatisfiable'
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return 'unsatisfiable'
+    return start, end
+
+class VariantCache:
+    """Encoded variants on disk, evicted least recently used first to stay under a byte budget"""
+
+    def __init__(self, directory=VARIANT_DIR, budget=parse_size(DEFAULT_BUDGET)):
+        self.directory = directory
+        self.budget = budget
+        self.lock = threading.Lock()
+        self.pending = {}  # key -> Future of the encode in flight
+        self.entries = OrderedDict()  # key -> (path, bytes), oldest first
+        self.total = 0
+        self.stats = {'hit': 0, 'miss': 0, 'coalesced': 0, 'evicted': 0}
+        self._originals = {}  # original path -> (stat key, sha256, width)
+        self._scan()
+
+    def _scan(self):
+        """Rebuild the LRU order from disk; mtimes carry recency across restarts"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        files = []
+        for path in self.directory.glob('*/*'):
+            if path.suffix.lstrip('.') in FORMATS:
+                stat = path.stat()
+                files.append((stat.st_mtime_ns, path.stem, path, stat.st_size))
+            elif path.name.endswith('.tmp'):
+                path.unlink(missing_ok=True)
+        for _, key, path, size in sorted(files):
+            self.entries[key] = (path, size)
+            self.total += size
+
+    def original_info(self, path):
+        """(sha256, width) of a catalog file, re-read only when its (size, mtime, inode) change"""
+        _, Image = require_imaging()
+        stat = path.stat()
+        stat_key = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        cached = self._originals.get(path)
+        if cached and cached[0] == stat_key:
+            return cached[1:]
+        with Image.open(path) as im:
+            width = im.size[0]
+        self._originals[path] = (stat_key, file_sha256(path), width)
+        return self._originals[path][1:]
+
+    def get(self, original, width, fmt):
+        """(path, etag, outcome) of the variant (width None: full size), encoding it on first request"""
+        params = encode_params(original.name, fmt)
+        source_sha, original_width = self.original_info(original)
+        if width and width >= original_width:
+            # Never upscaled, so this is the full-size variant
+            width = None
+        key = hashlib.sha256(
+            f"{VARIANT_VERSION}:{source_sha}:{width}:{fmt}:{params['value']}:{params['frame_step']}".encode()
+        ).hexdigest()[:32]
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0].exists():
+                self.entries.move_to_end(key)
+                self.stats['hit'] += 1
+                outcome = 'hit'
+            elif key in self.pending:
+                future = self.pending[key]
+                self.stats['coalesced'] += 1
+                outcome = 'coalesced'
+            else:
+                future = self.pending[key] = Future()
+                self.stats['miss'] += 1
+                outcome = 'miss'
+
+        if outcome == 'hit':
+            path = entry[0]
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            return path, key, outcome
+        if outcome == 'coalesced':
+            return future.result(), key, outcome
+
+        try:
+            path = self._encode(original, key, width, fmt, params)
+            future.set_result(path)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.pending[key]
+        return path, key, outcome
+
+    def _encode(self, original, key, width, fmt, params):
+        clip = load_clip(original)
+        if width:
+            clip = resize_clip(clip, width)
+        data = encode(clip, fmt, params["value"], params["frame_step"])
+        path = self.directory / key[:2] / f"{key}.{fmt}"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(path, data)
+        with self.lock:
+            self.entries[key] = (path, len(data))
+            self.total += len(data)
+            self._evict(keep=key)
+        return path
+
+    def _evict(self, keep):
+        """Drop least recently used variants until under budget (caller holds the lock)"""
+        for key in list(self.entries):
+            if self.total <= self.budget:
+                break
+            if key == keep or key in self.pending:
+                continue
+            path, size = self.entries.pop(key)
+            # A response already streaming from this file keeps its open descriptor
+            path.unlink(missing_ok=True)
+            self.total -= size
+            self.stats['evicted'] += 1
+
+def encode_params(filename, fmt):
+    """The parameters `encode` chose for this asset and format, or the defaults"""
+    try:
+        record = load_manifest()["assets"].get(filename, {}).get("encode", {}).get(fmt)
+    except (OSError, ValueError):
+        record = None
+    return record["params"] if record else DEFAULT_PARAMS[fmt]
+
+class VariantHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'media-variants'
+
+    def do_HEAD(self):
+        self.handle_request(head=True)
+
+    def do_GET(self):
+        self.handle_request(head=False)
+
+    def log_request(self, code='-', size='-'):
+        # One line per request is written by handle_request/send_text, with the cache outcome
+        pass
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def send_text(self, status, message, headers=()):
+        body = f"{message}\n".encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+        self.log_message('"%s" %d %s', self.requestline, status, message)
+
+    def resolve(self):
+        """(file to send, etag, content type, outcome) for the request, or None after an error response"""
+        url = urlsplit(self.path)
+        path = unquote(url.path)
+        if not path.startswith(URL_PREFIX):
+            self.send_text(404, "Not found")
+            return None
+        name = path[len(URL_PREFIX):]
+        if not name.endswith('.gif'):
+            name += '.gif'
+        original = self.server.catalog / name
+        if '/' in name or name.startswith('.') or not original.is_file():
+            self.send_text(404, "Not found")
+            return None
+
+        query = parse_qs(url.query)
+        fmt = query.get('fmt', ['gif'])[0]
+        if fmt not in FORMATS:
+            self.send_text(400, f"fmt must be one of: {', '.join(FORMATS)}")
+            return None
+        width = query.get('w', [None])[0]
+        if width is not None:
+            if not width.isdigit() or int(width) == 0:
+                self.send_text(400, "w must be a positive integer")
+                return None
+            width = snap_width(int(width))
+
+        if fmt == 'gif' and (width is None or width >= self.server.cache.original_info(original)[1]):
+            return original, self.server.cache.original_info(original)[0][:32], FORMATS[fmt], 'original'
+        variant, etag, outcome = self.server.cache.get(original, width, fmt)
+        return variant, etag, FORMATS[fmt], outcome
+
+    def handle_request(self, head):
+        started = time.monotonic()
+        try:
+            resolved = self.resolve()
+        except PipelineError as e:
+            self.send_text(500, str(e))
+            return
+        except Exception as e:
+            self.send_text(500, f"Encode failed: {e}")
+            return
+        if resolved is None:
+            return
+        path, etag, content_type, outcome = resolved
+        etag = f'"{etag}"'
+
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            # Evicted between lookup and open; the next request re-encodes
+            self.send_text(503, "Variant evicted, retry", [('Retry-After', '0')])
+            return
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            common = [('ETag', etag), ('Cache-Control', CACHE_CONTROL), ('Accept-Ranges', 'bytes'),
+                      ('X-Variant-Cache', outcome)]
+
+            if etag in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+                self.send_response(304)
+                for name, value in common:
+                    self.send_header(name, value)
+                self.end_headers()
+                self.log_message('"%s" 304 %s', self.requestline, outcome)
+                return
+
+            byte_range = None
+            if self.headers.get('Range') and self.headers.get('If-Range', etag) == etag:
+                byte_range = parse_range(self.headers['Range'], size)
+            if byte_range == 'unsatisfiable':
+                self.send_text(416, "Range not satisfiable", [('Content-Range', f'bytes */{size}')] + common)
+                return
+
+            start, end = byte_range or (0, size - 1)
+            length = end - start + 1 if size else 0
+            self.send_response(206 if byte_range else 200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(length))
+            self.send_header('Last-Modified', email.utils.formatdate(os.fstat(f.fileno()).st_mtime, usegmt=True))
+            if byte_range:
+                self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+            for name, value in common:
+                self.send_header(name, value)
+            self.end_headers()
+            if not head and length:
+                self.send_body(f, start, length)
+        self.log_message('"%s" %d %s %s %.0fms', self.requestline, 206 if byte_range else 200, outcome,
+                         format_size(length), (time.monotonic() - started) * 1000)
+
+    def send_body(self, f, offset, count):
+        """Zero-copy with sendfile(2) when the platform has it"""
+        try:
+            while count:
+                sent = os.sendfile(self.connection.fileno(), f.fileno(), offset, count)
+                if sent == 0:
+                    break
+                offset += sent
+                count -= sent
+        except (AttributeError, OSError) as e:
+            if isinstance(e, (BrokenPipeError, ConnectionResetError)):
+                return
+            f.seek(offset)
+            remaining = count
+            while remaining:
+                chunk = f.read(min(remaining, 64 * 1024))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+class VariantServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, catalog, cache, quiet=False):
+        self.catalog = catalog
+        self.cache = cache
+        self.quiet = quiet
+        super().__init__(address, VariantHandler)
+
+def run(args):
+    require_imaging()
+    if not args.catalog.is_dir():
+        raise PipelineError(f"Catalog directory not found: {args.catalog}")
+    cache = VariantCache(args.cache_dir, parse_size(args.budget))
+    server = VariantServer((args.host, args.port), args.catalog, cache, args.quiet)
+
+    print("🎞️  Variant server\n")
+    print(f"  Catalog: {args.catalog}")
+    print(f"  Cache:   {cache.directory} ({format_size(cache.total)} of {format_size(cache.budget)})")
+    print(f"  URL:     http://{args.host}:{args.port}{URL_PREFIX}<name>?w=320&fmt=webp\n")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        stats = cache.stats
+        print(f"\nVariants: {stats['hit']} hit, {stats['miss']} encoded, {stats['coalesced']} coalesced, "
+              f"{stats['evicted']} evicted ({format_size(cache.total)} cached)")
+
+def register(subparsers):
+    parser = subparsers.add_parser('serve', help='On-demand resized/WebP variants with an LRU disk cache')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--catalog', type=Path, default=OUTPUT_DIR, help='Originals to serve (default: public/exercise-gifs)')
+    parser.add_argument('--cache-dir', type=Path, default=VARIANT_DIR, help='Where encoded variants are kept')
+    parser.add_argument('--budget', default=DEFAULT_BUDGET, help=f'Variant cache size limit (default: {DEFAULT_BUDGET})')
+    parser.add_argument('--quiet', action='store_true', help='No per-request log lines')
+    parser.set_defaults(func=run)
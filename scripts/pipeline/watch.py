@@ -0,0 +1,323 @@
+"""
+Watch mode
+
+Long-running incremental rebuild for local media work. Watches:
+
+    scripts/gif-urls.txt            -> fetch --source url-file, then process new GIFs
+    src/utils/exerciseMedia.js      -> sprites, precache
+    public/exercise-gifs/*.gif      -> loop-trim, encode, placeholders for those files,
+                                       then sprites, precache
+    .media-cache/sources/index.json -> the same, for GIFs whose original changed
+
+Changes are debounced (an editor save is several events) and each batch
+runs only the steps it affects, in-process, usually within a second or two
+of the save. A new release is published too when `release` is in use.
+
+Changes are detected with inotify (through ctypes, no dependency). Where
+inotify is unavailable (macOS, some containers) it falls back to polling
+mtimes. Either way, a GIF counts as changed only if its (size, mtime,
+inode) differ from what the last batch left. The stages' own rewrites
+never trigger another batch.
+
+A GIF dropped in by hand is a new original. It is added to the source cache
+first, so loop-trim and encode start from it, not from an older download.
+A GIF whose hash the manifest already records (the output of an encode or
+loop-trim run in another terminal, or `sources restore`) is not: it only
+triggers sprites and precache. A GIF whose original in the raw-source cache
+changed (a fetch or `sources import` elsewhere) is reprocessed from it.
+
+Usage:
+    python3 scripts/media_pipeline.py watch
+    python3 scripts/media_pipeline.py watch --skip encode --skip fetch
+    python3 scripts/media_pipeline.py watch --poll    # force the polling backend
+"""
+
+import argparse
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+import traceback
+from pathlib import Path
+
+from . import encode, fetch, loop_trim, placeholders, precache, release, sprites
+from .catalog import MEDIA_MAP_PATH
+from .config import OUTPUT_DIR, SCRIPT_DIR, PipelineError
+from .manifest import file_sha256, load_manifest
+from .sourcecache import SOURCE_CACHE_DIR, SourceCache
+
+URL_FILE = SCRIPT_DIR / "gif-urls.txt"
+SOURCE_INDEX = SOURCE_CACHE_DIR / "index.json"
+DEBOUNCE = 0.3
+MAX_DELAY = 2.0
+POLL_INTERVAL = 0.5
+STEPS = ['fetch', 'loop-trim', 'encode', 'placeholders', 'sprites', 'precache', 'release']
+
+# From <sys/inotify.h>
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_DELETE = 0x200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE
+EVENT_HEADER = struct.Struct('iIII')
+
+class InotifyWatcher:
+    """Directory watches through libc's inotify; wait() returns changed paths"""
+
+    def __init__(self, directories):
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            raise OSError("libc not found")
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError("inotify not available")
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.directories = {}
+        for directory in directories:
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                os.close(self.fd)
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {directory}")
+            self.directories[wd] = directory
+
+    def wait(self, timeout):
+        """Changed paths, waiting up to timeout seconds for the first one"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, _, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if wd in self.directories and name:
+                changed.add(self.directories[wd] / os.fsdecode(name))
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher:
+    """Fallback for systems without inotify: compares directory listings and mtimes"""
+
+    def __init__(self, directories, interval=POLL_INTERVAL):
+        self.directories = directories
+        self.interval = interval
+        self.state = self._scan()
+
+    def _scan(self):
+        state = {}
+        for directory in self.directories:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        state[directory / entry.name] = (stat.st_size, stat.st_mtime_ns)
+        return state
+
+    def wait(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            state = self._scan()
+            changed = {path for path in state.keys() | self.state.keys()
+                       if state.get(path) != self.state.get(path)}
+            self.state = state
+            if changed or time.monotonic() >= deadline:
+                return changed
+            time.sleep(min(self.interval, max(deadline - time.monotonic(), 0)))
+
+    def close(self):
+        pass
+
+def open_watcher(directories, poll=False):
+    """inotify when the platform has it, else polling; returns (watcher, backend name)"""
+    if not poll:
+        try:
+            return InotifyWatcher(directories), 'inotify'
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(directories), 'polling'
+
+def gif_state(directory=OUTPUT_DIR):
+    """{filename: (size, mtime, inode)} for the catalog GIFs"""
+    state = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.endswith('.gif') and entry.is_file():
+                stat = entry.stat()
+                state[entry.name] = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+    return state
+
+def known_shas(entry, held=None):
+    """Hashes the manifest (or the source cache) already has for an asset"""
+    shas = {
+        entry.get("sha256"),
+        (entry.get("loop") or {}).get("output_sha256"),
+        ((entry.get("encode") or {}).get("gif") or {}).get("output_sha256"),
+        held,
+    }
+    shas.discard(None)
+    return shas
+
+def split_edited(edited, assets, originals, directory=OUTPUT_DIR):
+    """(new originals, rewrites the pipeline already knows) among edited GIFs
+
+    originals is the source cache as of the previous batch. A fetch in this
+    batch indexes its downloads before they get here, and those are new.
+    """
+    new = [name for name in edited
+           if file_sha256(directory / name) not in known_shas(assets.get(name, {}), originals.get(name))]
+    return new, [name for name in edited if name not in new]
+
+def stage_parser():
+    """The stage commands, parsed exactly as on the command line"""
+    parser = argparse.ArgumentParser(prog='watch')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for module in (fetch, loop_trim, encode, placeholders, sprites, precache, release):
+        module.register(subparsers)
+    return parser
+
+class Watch:
+    """Debounced change batches -> the pipeline steps they affect"""
+
+    def __init__(self, args):
+        self.args = args
+        self.skip = set(args.skip or [])
+        self.parser = stage_parser()
+        self.cache = SourceCache()
+        self.gifs = gif_state()
+        self.originals = self.cache.published()
+        self.mapping_mtime = self._mtime(MEDIA_MAP_PATH)
+        self.url_mtime = self._mtime(args.url_file)
+
+    @staticmethod
+    def _mtime(path):
+        try:
+            return path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def step(self, name, *argv):
+        """Run one stage in-process; failures are reported and the watch goes on"""
+        if name in self.skip:
+            return
+        print(f"\n▶️  {name} {' '.join(argv)}".rstrip())
+        try:
+            args = self.parser.parse_args([name, *argv])
+            args.func(args)
+        except PipelineError as e:
+            print(f"❌ {name}: {e}")
+        except SystemExit:
+            print(f"❌ {name}: exited")
+        except Exception:
+            traceback.print_exc()
+
+    def batch(self, changed):
+        """Work out what a batch of changed paths affects and rebuild it"""
+        started = time.monotonic()
+        url_mtime = self._mtime(self.args.url_file)
+        mapping_mtime = self._mtime(MEDIA_MAP_PATH)
+        url_changed = url_mtime != self.url_mtime and self.args.url_file in changed
+        mapping_changed = mapping_mtime != self.mapping_mtime and MEDIA_MAP_PATH in changed
+        self.url_mtime, self.mapping_mtime = url_mtime, mapping_mtime
+
+        if url_changed:
+            print(f"\n🔔 {self.args.url_file.name} changed")
+            self.step('fetch', '--source', 'url-file', '--url-file', str(self.args.url_file), '--quiet')
+
+        current = gif_state()
+        edited = sorted(name for name, key in current.items() if self.gifs.get(name) != key)
+        removed = sorted(set(self.gifs) - set(current))
+        originals = self.cache.published()
+        resourced = sorted(name for name, sha in originals.items()
+                           if self.originals.get(name) != sha and name in current and name not in edited)
+        assets = load_manifest()["assets"] if edited else {}
+        new, rewritten = split_edited(edited, assets, self.originals)
+        if new:
+            print(f"\n🔔 {len(new)} GIF(s) new or changed: {', '.join(new)}")
+            for name in new:
+                # Whatever is in public/ now, not an older download, is the original to build from
+                self.cache.add(OUTPUT_DIR / name, filename=name)
+        if rewritten:
+            print(f"\n🔔 {len(rewritten)} GIF(s) rewritten by another pipeline run: {', '.join(rewritten)}")
+        if resourced:
+            print(f"\n🔔 {len(resourced)} original(s) changed in the source cache: {', '.join(resourced)}")
+        process = new + resourced
+        if process:
+            self.step('loop-trim', *process)
+            self.step('encode', *process)
+            self.step('placeholders', *process)
+        if removed:
+            print(f"\n🔔 {len(removed)} GIF(s) removed: {', '.join(removed)}")
+        if mapping_changed:
+            print(f"\n🔔 {MEDIA_MAP_PATH.name} changed")
+
+        ran = bool(edited or resourced or removed or mapping_changed)
+        if ran:
+            self.step('sprites')
+            self.step('precache')
+            if (release.RELEASE_ROOT / "current").is_symlink():
+                self.step('release', 'publish')
+        # Our own rewrites are the new baseline, not changes
+        self.gifs = gif_state()
+        self.originals = self.cache.published()
+        if ran or url_changed:
+            print(f"\n✅ Rebuilt in {time.monotonic() - started:.1f}s, watching...")
+
+    def relevant(self, path):
+        if path.parent == OUTPUT_DIR:
+            return path.suffix == '.gif'
+        return path in (self.args.url_file, MEDIA_MAP_PATH, SOURCE_INDEX)
+
+    def run(self, watcher):
+        while True:
+            changed = {path for path in watcher.wait(3600) if self.relevant(path)}
+            if not changed:
+                continue
+            # Debounce: collect until quiet for DEBOUNCE seconds, but never wait past MAX_DELAY
+            first = time.monotonic()
+            while time.monotonic() - first < MAX_DELAY:
+                more = watcher.wait(self.args.debounce)
+                if not more:
+                    break
+                changed |= {path for path in more if self.relevant(path)}
+            self.batch(changed)
+
+def run(args):
+    args.url_file = args.url_file.resolve()
+    SOURCE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    directories = sorted({OUTPUT_DIR, MEDIA_MAP_PATH.parent, args.url_file.parent, SOURCE_CACHE_DIR})
+    watcher, backend = open_watcher(directories, args.poll)
+    print(f"👀 Watching ({backend})")
+    print(f"  {args.url_file}")
+    print(f"  {MEDIA_MAP_PATH}")
+    print(f"  {OUTPUT_DIR}/*.gif")
+    print(f"  {SOURCE_INDEX}")
+    if args.skip:
+        print(f"  Skipping: {', '.join(args.skip)}")
+    print("\nPress Ctrl+C to stop.")
+    try:
+        Watch(args).run(watcher)
+    finally:
+        watcher.close()
+
+def register(subparsers):
+    parser = subparsers.add_parser('watch', help='Rebuild only the affected media steps when inputs change')
+    parser.add_argument('--url-file', type=Path, default=URL_FILE, help='URL list to watch (default: scripts/gif-urls.txt)')
+    parser.add_argument('--skip', action='append', choices=STEPS, help='Never run this step (repeatable)')
+    parser.add_argument('--debounce', type=float, default=DEBOUNCE,
+                        help=f'Quiet period before a batch runs, seconds (default: {DEBOUNCE})')
+    parser.add_argument('--poll', action='store_true', help='Poll for changes instead of using inotify')
+    parser.set_defaults(func=run)
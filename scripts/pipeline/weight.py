@@ -0,0 +1,187 @@
+"""
+Per-workout media weight
+
+How many media bytes does opening a workout make a phone download? Each
+exercise is resolved to its GIF with the getExerciseMedia() rules
+(usage.resolve_media). The distinct assets of each workout are then summed
+per format:
+
+    gif    the catalog file in public/exercise-gifs
+    webp   the `encode --format webp` output, where one exists
+    best   what a WebP-capable browser loads: webp where available, else gif
+
+Workouts come from JSON exports: saved workouts, templates (the app keeps
+them in localStorage under `workoutTemplates`), a whole localStorage dump,
+or generator responses. Any object with an `exercises` list counts as one
+workout. Without exports, the literal names in workoutTemplates.js and the
+generator's exercise pools in api.js are analyzed as two pseudo-workouts.
+
+The report lists the heaviest workouts and the assets that contribute most
+bytes across all of them, i.e. where encoding effort pays off first.
+
+Usage:
+    python3 scripts/media_pipeline.py weight history-export.json templates.json
+    python3 scripts/media_pipeline.py weight --top 20 --json weight.json
+"""
+
+import json
+from collections import Counter, namedtuple
+from pathlib import Path
+
+from .catalog import load_media_map
+from .config import OUTPUT_DIR, PipelineError, format_size
+from .manifest import load_manifest, write_json
+from .usage import generator_names, resolve_media, template_names
+
+FORMATS = ('gif', 'webp', 'best')
+DEFAULT_TOP = 10
+
+# names: exercise names in order; source: file the workout came from
+Workout = namedtuple('Workout', ['label', 'source', 'names'])
+
+def _collect(node, source, path, workouts):
+    if isinstance(node, dict):
+        exercises = node.get('exercises')
+        if isinstance(exercises, list):
+            names = [exercise['name'] for exercise in exercises
+                     if isinstance(exercise, dict) and isinstance(exercise.get('name'), str)]
+            label = next((str(node[key]) for key in ('name', 'date', 'id') if node.get(key)), path or 'workout')
+            workouts.append(Workout(label, source, names))
+        for key, value in node.items():
+            if key == 'exercises':
+                continue
+            # localStorage dumps keep nested state as JSON strings
+            if isinstance(value, str) and value[:1] in '[{':
+                try:
+                    value = json.loads(value)
+                except ValueError:
+                    continue
+            _collect(value, source, f"{path}/{key}" if path else str(key), workouts)
+    elif isinstance(node, list):
+        for index, item in enumerate(node):
+            _collect(item, source, f"{path}[{index}]", workouts)
+
+def load_workouts(paths):
+    """Every object with an `exercises` list in the given JSON files"""
+    workouts = []
+    for path in paths:
+        if not path.exists():
+            raise PipelineError(f"Export not found: {path}")
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except ValueError as e:
+            raise PipelineError(f"{path} is not valid JSON: {e}")
+        _collect(data, path.name, '', workouts)
+    return workouts
+
+def builtin_workouts():
+    """The templates module and generator pools as two pseudo-workouts"""
+    return [workout for workout in (
+        Workout('workoutTemplates.js literals', 'templates', template_names()),
+        Workout('generator exercise pools', 'api.js', generator_names()),
+    ) if workout.names]
+
+def asset_sizes(filename, manifest, directory=OUTPUT_DIR):
+    """{gif, webp, best} bytes for one asset; None where the file does not exist"""
+    gif_path = directory / filename
+    gif = gif_path.stat().st_size if gif_path.exists() else None
+    record = (manifest["assets"].get(filename, {}).get("encode") or {}).get("webp")
+    webp_path = directory / record["output"] if record else gif_path.with_suffix('.webp')
+    webp = webp_path.stat().st_size if webp_path.exists() else None
+    candidates = [size for size in (gif, webp) if size is not None]
+    return {"gif": gif, "webp": webp, "best": min(candidates) if candidates else None}
+
+def analyze(workouts, media_map, manifest):
+    """Per-workout totals and per-asset contributions"""
+    sizes = {}
+    rows = []
+    contributions = {fmt: Counter() for fmt in FORMATS}
+    appearances = Counter()
+    unresolved = Counter()
+    missing = set()
+
+    for workout in workouts:
+        files = []
+        for name in workout.names:
+            filename = resolve_media(name, media_map)
+            if filename is None:
+                unresolved[name] += 1
+            elif filename not in files:
+                # The browser fetches a GIF once per workout however often it appears
+                files.append(filename)
+        totals = dict.fromkeys(FORMATS, 0)
+        for filename in files:
+            if filename not in sizes:
+                sizes[filename] = asset_sizes(filename, manifest)
+            if sizes[filename]["gif"] is None:
+                missing.add(filename)
+            appearances[filename] += 1
+            for fmt in FORMATS:
+                size = sizes[filename][fmt] if fmt != 'webp' else sizes[filename]["webp"] or sizes[filename]["gif"]
+                totals[fmt] += size or 0
+                contributions[fmt][filename] += size or 0
+        rows.append({"workout": workout.label, "source": workout.source, "exercises": len(workout.names),
+                     "assets": len(files), "bytes": totals})
+
+    rows.sort(key=lambda row: row["bytes"]["gif"], reverse=True)
+    return {
+        "workouts": rows,
+        "assets": [{"file": filename, "workouts": appearances[filename], "sizes": sizes[filename],
+                    "bytes": {fmt: contributions[fmt][filename] for fmt in FORMATS}}
+                   for filename, _ in contributions["gif"].most_common()],
+        "unresolved": dict(unresolved.most_common()),
+        "missing": sorted(missing),
+    }
+
+def print_report(report, top):
+    rows = report["workouts"]
+    total = {fmt: sum(row["bytes"][fmt] for row in rows) for fmt in FORMATS}
+
+    print(f"🏋️  Heaviest workouts (top {min(top, len(rows))} of {len(rows)})\n")
+    print(f"  {'GIF':>9} {'WebP*':>9} {'Best':>9}  Assets  Workout")
+    for row in rows[:top]:
+        sizes = row["bytes"]
+        print(f"  {format_size(sizes['gif']):>9} {format_size(sizes['webp']):>9} {format_size(sizes['best']):>9}"
+              f"  {row['assets']:>6}  {row['workout']} ({row['source']})")
+
+    print("\n📦 Assets contributing most (across all workouts)\n")
+    for asset in report["assets"][:top]:
+        share = asset["bytes"]["gif"] * 100 / total["gif"] if total["gif"] else 0
+        sizes = asset["sizes"]
+        webp = f"{format_size(sizes['webp'])} webp" if sizes["webp"] is not None else "no webp"
+        print(f"  {format_size(asset['bytes']['gif']):>9} {share:5.1f}%  {asset['file']} "
+              f"(in {asset['workouts']} workout(s), {format_size(sizes['gif'] or 0)} gif, {webp})")
+
+    average = {fmt: total[fmt] / len(rows) if rows else 0 for fmt in FORMATS}
+    print("\n" + "="*60)
+    print(f"🏋️  Workouts: {len(rows)}")
+    print(f"📦 Average per workout: {format_size(average['gif'])} GIF, "
+          f"{format_size(average['webp'])} WebP*, {format_size(average['best'])} best")
+    if report["missing"]:
+        print(f"❌ Referenced but not on disk: {len(report['missing'])} ({', '.join(report['missing'][:5])}"
+              f"{', ...' if len(report['missing']) > 5 else ''})")
+    if report["unresolved"]:
+        print(f"➖ Exercises with no media: {len(report['unresolved'])}")
+    print("="*60)
+    print("* WebP column falls back to the GIF for assets without a WebP encode\n")
+
+def run(args):
+    workouts = load_workouts(args.exports) if args.exports else builtin_workouts()
+    if not workouts:
+        raise PipelineError("No workouts found (pass JSON exports containing objects with an `exercises` list)")
+    if not args.exports:
+        print("ℹ️  No exports given; analyzing the templates module and generator pools\n")
+    report = analyze(workouts, load_media_map(), load_manifest())
+    print_report(report, args.top)
+    if args.json:
+        write_json(args.json, report)
+        print(f"📄 Report written to {args.json}")
+
+def register(subparsers):
+    parser = subparsers.add_parser('weight', help='Media bytes per workout and the assets that weigh most')
+    parser.add_argument('exports', nargs='*', type=Path,
+                        help='Workout/template/localStorage/generator JSON exports (default: built-in lists)')
+    parser.add_argument('--top', type=int, default=DEFAULT_TOP, help=f'Rows per table (default: {DEFAULT_TOP})')
+    parser.add_argument('--json', type=Path, help='Also write the full report as JSON')
+    parser.set_defaults(func=run)
@@ -0,0 +1,460 @@
+"""
+SQLite work queue
+
+Shards the media build across any number of worker processes or containers
+that share one SQLite file (on a local disk or volume, not NFS). A worker
+claims a task by taking a time-limited lease, renews it with heartbeats
+while working, and completes it only if it still owns the lease. When a
+worker dies, its lease expires and another worker picks the task up.
+Delivery is at-least-once: a worker that stalls past its lease may still
+finish the task after another worker has started it, so every handler has
+to be safe to run twice (they write atomically and skip finished work).
+
+Fetch tasks in a worker process share one per-host limiter (see
+hostlimits.py), so candidates are ranked and per-host concurrency adapts
+as in `fetch`. Limits are saved when the worker exits.
+
+Task kinds (each depends on the one before it for the same file):
+    fetch          download the GIF from its candidate URLs
+    loop-trim      trim multi-rep clips to one repetition
+    encode         SSIM-targeted WebP/GIF encode
+    placeholders   BlurHash/LQIP/dimensions
+
+Usage:
+    python3 scripts/media_pipeline.py queue enqueue
+    python3 scripts/media_pipeline.py queue enqueue --format gif --threshold 0.97
+    python3 scripts/media_pipeline.py queue work --processes 4
+    python3 scripts/media_pipeline.py queue status
+    python3 scripts/media_pipeline.py queue retry
+"""
+
+import copy
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from . import encode as encode_stage
+from . import loop_trim, placeholders
+from .config import CACHE_DIR, OUTPUT_DIR, PipelineError, catalog_files
+from .fetcher import DEFAULT_TIMEOUT, FetchError, fetch_candidates
+from .giphy import TARGET_WIDTH, RenditionCache
+from .hostlimits import HostLimiter
+from .manifest import load_manifest, manifest_lock, merge_asset, publish_manifest
+from .sourcecache import SourceCache
+from .sources import FetchTask, SOURCE_NAMES, load_tasks, output_path
+from .usage import fetch_priorities
+
+QUEUE_PATH = CACHE_DIR / "queue.sqlite3"
+KINDS = ['fetch', 'loop-trim', 'encode', 'placeholders']
+DEFAULT_LEASE = 60
+MAX_ATTEMPTS = 3
+RETRY_BACKOFF = 5  # seconds, doubled per attempt
+POLL_INTERVAL = 1.0
+
+# Per worker process, created by the first fetch task (see worker_limiter)
+_limiter = None
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id            TEXT PRIMARY KEY,
+    kind          TEXT NOT NULL,
+    payload       TEXT NOT NULL,
+    after         TEXT,
+    priority      INTEGER NOT NULL DEFAULT 0,
+    status        TEXT NOT NULL DEFAULT 'queued',
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    available_at  REAL NOT NULL DEFAULT 0,
+    lease_owner   TEXT,
+    lease_expires REAL,
+    result        TEXT,
+    error         TEXT,
+    updated_at    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tasks_claim ON tasks (status, available_at, priority);
+"""
+
+class WorkQueue:
+    """Lease-based task queue in a shared SQLite file"""
+
+    def __init__(self, path=QUEUE_PATH):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def _write(self, fn):
+        """Run fn(cursor) inside an IMMEDIATE transaction (one writer at a time)"""
+        with self._lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self.db)
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+            self.db.execute("COMMIT")
+            return result
+
+    def enqueue(self, task_id, kind, payload, after=None, priority=0):
+        """Add a task; finished tasks are re-queued, active ones are left alone"""
+        def insert(db):
+            db.execute("""
+                INSERT INTO tasks (id, kind, payload, after, priority, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                    payload = excluded.payload, after = excluded.after, priority = excluded.priority,
+                    status = 'queued', attempts = 0, available_at = 0, error = NULL,
+                    updated_at = excluded.updated_at
+                WHERE tasks.status IN ('done', 'failed')
+            """, (task_id, kind, json.dumps(payload), after, priority, time.time()))
+        self._write(insert)
+
+    def claim(self, owner, lease=DEFAULT_LEASE, max_attempts=MAX_ATTEMPTS):
+        """Lease the next runnable task; returns (id, kind, payload) or None"""
+        def take(db):
+            now = time.time()
+            # Expired leases past their attempt budget fail instead of looping forever
+            db.execute("""
+                UPDATE tasks SET status = 'failed', error = 'lease expired too many times', updated_at = ?
+                WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?
+            """, (now, now, max_attempts))
+            self._fail_dependents(db, now)
+
+            row = db.execute("""
+                SELECT id, kind, payload FROM tasks
+                WHERE ((status = 'queued' AND available_at <= ?)
+                       OR (status = 'leased' AND lease_expires < ?))
+                  AND (after IS NULL OR after IN (SELECT id FROM tasks WHERE status = 'done'))
+                ORDER BY priority DESC, available_at, id
+                LIMIT 1
+            """, (now, now)).fetchone()
+            if row is None:
+                return None
+            db.execute("""
+                UPDATE tasks SET status = 'leased', lease_owner = ?, lease_expires = ?,
+                                 attempts = attempts + 1, updated_at = ?
+                WHERE id = ?
+            """, (owner, now + lease, now, row[0]))
+            return row[0], row[1], json.loads(row[2])
+        return self._write(take)
+
+    def heartbeat(self, task_id, owner, lease=DEFAULT_LEASE):
+        """Extend a lease; returns False if another worker has taken the task over"""
+        def renew(db):
+            now = time.time()
+            cursor = db.execute("""
+                UPDATE tasks SET lease_expires = ?, updated_at = ?
+                WHERE id = ? AND status = 'leased' AND lease_owner = ?
+            """, (now + lease, now, task_id, owner))
+            return cursor.rowcount == 1
+        return self._write(renew)
+
+    def complete(self, task_id, owner, result=None):
+        """Mark a task done if we still hold its lease"""
+        def finish(db):
+            cursor = db.execute("""
+                UPDATE tasks SET status = 'done', result = ?, error = NULL, lease_owner = NULL,
+                                 lease_expires = NULL, updated_at = ?
+                WHERE id = ? AND status = 'leased' AND lease_owner = ?
+            """, (json.dumps(result), time.time(), task_id, owner))
+            return cursor.rowcount == 1
+        return self._write(finish)
+
+    def fail(self, task_id, owner, error, max_attempts=MAX_ATTEMPTS):
+        """Release a task after an error: retry with backoff, or fail for good"""
+        def release(db):
+            now = time.time()
+            row = db.execute("SELECT attempts FROM tasks WHERE id = ? AND lease_owner = ?",
+                             (task_id, owner)).fetchone()
+            if row is None:
+                return False
+            attempts = row[0]
+            if attempts < max_attempts:
+                db.execute("""
+                    UPDATE tasks SET status = 'queued', available_at = ?, error = ?,
+                                     lease_owner = NULL, lease_expires = NULL, updated_at = ?
+                    WHERE id = ?
+                """, (now + RETRY_BACKOFF * 2 ** (attempts - 1), error, now, task_id))
+            else:
+                db.execute("""
+                    UPDATE tasks SET status = 'failed', error = ?, lease_owner = NULL,
+                                     lease_expires = NULL, updated_at = ?
+                    WHERE id = ?
+                """, (error, now, task_id))
+                self._fail_dependents(db, now)
+            return True
+        return self._write(release)
+
+    def _fail_dependents(self, db, now):
+        """Tasks waiting on a failed task can never run"""
+        while True:
+            cursor = db.execute("""
+                UPDATE tasks SET status = 'failed', error = 'dependency failed', updated_at = ?
+                WHERE status = 'queued' AND after IN (SELECT id FROM tasks WHERE status = 'failed')
+            """, (now,))
+            if cursor.rowcount == 0:
+                break
+
+    def retry_failed(self):
+        """Put failed tasks back in the queue"""
+        def reset(db):
+            return db.execute("""
+                UPDATE tasks SET status = 'queued', attempts = 0, available_at = 0, error = NULL,
+                                 updated_at = ?
+                WHERE status = 'failed'
+            """, (time.time(),)).rowcount
+        return self._write(reset)
+
+    def counts(self):
+        """{kind: {status: count}}"""
+        summary = {}
+        for kind, status, count in self.db.execute(
+                "SELECT kind, status, COUNT(*) FROM tasks GROUP BY kind, status"):
+            summary.setdefault(kind, {})[status] = count
+        return summary
+
+    def active(self):
+        """Number of tasks still queued or leased"""
+        return self.db.execute(
+            "SELECT COUNT(*) FROM tasks WHERE status IN ('queued', 'leased')").fetchone()[0]
+
+    def failures(self, limit=20):
+        return self.db.execute(
+            "SELECT id, error FROM tasks WHERE status = 'failed' ORDER BY updated_at DESC LIMIT ?",
+            (limit,)).fetchall()
+
+# ===== TASK HANDLERS =====
+
+def _asset_stage(filename, stage):
+    """Run a manifest-writing stage on a private copy of one entry, then merge it back"""
+    with manifest_lock():
+        snapshot = load_manifest()
+    scratch = {"assets": {filename: copy.deepcopy(snapshot["assets"].get(filename, {}))}}
+    status, _ = stage(scratch)
+    merge_asset(filename, scratch["assets"][filename])
+    return {"status": status}
+
+def worker_limiter():
+    """This process's host limiter, shared by all its fetch tasks"""
+    global _limiter
+    if _limiter is None:
+        _limiter = HostLimiter()
+    return _limiter
+
+def handle_fetch(payload):
+    task = FetchTask(*(payload[field] for field in FetchTask._fields))
+    timeout = payload.get("timeout", DEFAULT_TIMEOUT)
+    filepath = output_path(task)
+    if filepath.exists():
+        return {"status": 'exists'}
+    cache = SourceCache()
+    held = cache.lookup(task.filename, task.candidates)
+    if held:
+        return {"status": 'cached', **cache.restore(held, filepath, task.filename)}
+    renditions = RenditionCache(limiter=worker_limiter())
+    try:
+        task = renditions.with_renditions(task, payload.get("giphy_width", TARGET_WIDTH), timeout)
+        result = fetch_candidates(task, filepath, timeout, limiter=worker_limiter())
+    except FetchError as e:
+        raise PipelineError(str(e))
+    finally:
+        renditions.save()
+    cache.add(filepath, result["url"], task.filename)
+    return result
+
+def handle_loop_trim(payload):
+    filepath = OUTPUT_DIR / payload["file"]
+    return _asset_stage(payload["file"], lambda manifest: loop_trim.trim_file(filepath, manifest, cache=SourceCache()))
+
+def handle_encode(payload):
+    filepath = OUTPUT_DIR / payload["file"]
+    return _asset_stage(payload["file"], lambda manifest: encode_stage.encode_file(
+        filepath, manifest, payload["format"], payload["threshold"], cache=SourceCache()))
+
+def handle_placeholders(payload):
+    filepath = OUTPUT_DIR / payload["file"]
+    return _asset_stage(payload["file"], lambda manifest: placeholders.placeholder_file(filepath, manifest))
+
+HANDLERS = {
+    'fetch': handle_fetch,
+    'loop-trim': handle_loop_trim,
+    'encode': handle_encode,
+    'placeholders': handle_placeholders,
+}
+
+# ===== WORKER =====
+
+def work(queue_path, owner, lease=DEFAULT_LEASE, exit_when_idle=True):
+    """Claim and run tasks until the queue is drained; returns (done, failed)"""
+    queue = WorkQueue(queue_path)
+    try:
+        return _work(queue, owner, lease, exit_when_idle)
+    finally:
+        if _limiter is not None:
+            _limiter.save()
+
+def _work(queue, owner, lease, exit_when_idle):
+    done = 0
+    failed = 0
+    while True:
+        claimed = queue.claim(owner, lease)
+        if claimed is None:
+            if exit_when_idle and queue.active() == 0:
+                if done:
+                    publish_manifest()
+                return done, failed
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        task_id, kind, payload = claimed
+        stop = threading.Event()
+        lost = threading.Event()
+
+        def keep_alive():
+            while not stop.wait(lease / 3):
+                if not queue.heartbeat(task_id, owner, lease):
+                    lost.set()
+                    return
+
+        beat = threading.Thread(target=keep_alive, daemon=True)
+        beat.start()
+        try:
+            result = HANDLERS[kind](payload)
+        except Exception as e:
+            stop.set()
+            beat.join()
+            queue.fail(task_id, owner, f"{type(e).__name__}: {e}")
+            failed += 1
+            print(f"  [{owner}] ❌ {task_id}: {e}", flush=True)
+            continue
+        stop.set()
+        beat.join()
+
+        if lost.is_set() or not queue.complete(task_id, owner, result):
+            print(f"  [{owner}] ⚠️  lost lease on {task_id}; another worker owns it now", flush=True)
+            continue
+        done += 1
+        print(f"  [{owner}] ✅ {task_id} ({result.get('status', 'ok')})", flush=True)
+
+def _worker_process(queue_path, owner, lease):
+    try:
+        work(queue_path, owner, lease)
+    except KeyboardInterrupt:
+        pass
+
+# ===== COMMANDS =====
+
+def enqueue_catalog(queue, kinds, sources=None, fmt='webp', threshold=encode_stage.DEFAULT_THRESHOLD,
+                    giphy_width=TARGET_WIDTH, timeout=DEFAULT_TIMEOUT):
+    """Queue fetch tasks for missing GIFs and processing tasks for every file"""
+    files = {path.name: None for path in catalog_files()}
+    added = {kind: 0 for kind in kinds}
+    fetch_tasks = load_tasks(sources) if 'fetch' in kinds else []
+    # Most-used exercises are claimed first by every worker
+    priorities = fetch_priorities(list(files) + [task.filename for task in fetch_tasks])
+
+    if 'fetch' in kinds:
+        for task in fetch_tasks:
+            if output_path(task).exists():
+                continue
+            payload = {**task._asdict(), "giphy_width": giphy_width, "timeout": timeout}
+            queue.enqueue(task.task_id, 'fetch', payload, priority=priorities[task.filename])
+            files[task.filename] = task.task_id
+            added['fetch'] += 1
+
+    stages = [
+        ('loop-trim', lambda name: {"file": name}),
+        ('encode', lambda name: {"file": name, "format": fmt, "threshold": threshold}),
+        ('placeholders', lambda name: {"file": name}),
+    ]
+    for filename, fetch_id in sorted(files.items()):
+        previous = fetch_id
+        for kind, payload in stages:
+            if kind not in kinds:
+                continue
+            task_id = f"{kind}:{filename}" if kind != 'encode' else f"encode:{fmt}:{filename}"
+            queue.enqueue(task_id, kind, payload(filename), after=previous, priority=priorities[filename])
+            previous = task_id
+            added[kind] += 1
+    return added
+
+def print_status(queue):
+    counts = queue.counts()
+    print(f"📊 Queue {queue.path}\n")
+    if not counts:
+        print("  (empty)\n")
+        return
+    statuses = ['queued', 'leased', 'done', 'failed']
+    print(f"  {'kind':<14}" + ''.join(f"{s:>9}" for s in statuses))
+    for kind in KINDS:
+        if kind in counts:
+            print(f"  {kind:<14}" + ''.join(f"{counts[kind].get(s, 0):>9}" for s in statuses))
+    failures = queue.failures()
+    if failures:
+        print("\n  Recent failures:")
+        for task_id, error in failures:
+            print(f"    ❌ {task_id}: {error}")
+    print()
+
+def run(args):
+    queue = WorkQueue(args.db)
+
+    if args.action == 'enqueue':
+        kinds = args.kinds.split(',') if args.kinds else KINDS
+        unknown = set(kinds) - set(KINDS)
+        if unknown:
+            raise PipelineError(f"Unknown task kind(s): {', '.join(sorted(unknown))}")
+        added = enqueue_catalog(queue, kinds, args.source, args.format, args.threshold, args.giphy_width,
+                                args.timeout)
+        print("📋 Enqueued: " + ', '.join(f"{kind} {count}" for kind, count in added.items()) + "\n")
+        print_status(queue)
+
+    elif args.action == 'work':
+        host = socket.gethostname()
+        print(f"👷 Starting {args.processes} worker(s) on {queue.path}\n")
+        if args.processes == 1:
+            done, failed = work(args.db, f"{host}:{os.getpid()}", args.lease)
+            print(f"\n✅ Done: {done}  ❌ Failed: {failed}\n")
+        else:
+            workers = [
+                multiprocessing.Process(target=_worker_process,
+                                        args=(args.db, f"{host}:{os.getpid()}:{n}", args.lease))
+                for n in range(args.processes)
+            ]
+            for process in workers:
+                process.start()
+            for process in workers:
+                process.join()
+        print_status(queue)
+
+    elif args.action == 'retry':
+        print(f"🔁 Re-queued {queue.retry_failed()} failed task(s)\n")
+
+    else:
+        print_status(queue)
+
+def register(subparsers):
+    parser = subparsers.add_parser('queue', help='Shared SQLite work queue for multi-worker builds')
+    parser.add_argument('action', choices=['enqueue', 'work', 'status', 'retry'])
+    parser.add_argument('--db', type=Path, default=QUEUE_PATH, help='Queue database shared by all workers')
+    parser.add_argument('--kinds', help=f"Comma-separated task kinds to enqueue (default: {','.join(KINDS)})")
+    parser.add_argument('--source', action='append', choices=SOURCE_NAMES, help='Fetch sources to enqueue')
+    parser.add_argument('--format', choices=sorted(encode_stage.PARAM_RANGES), default='webp',
+                        help='Encode format for encode tasks')
+    parser.add_argument('--threshold', type=float, default=encode_stage.DEFAULT_THRESHOLD,
+                        help='Minimum mean SSIM against the original for encode tasks')
+    parser.add_argument('--giphy-width', type=int, default=TARGET_WIDTH,
+                        help='Smallest Giphy rendition at least this wide for fetch tasks; 0 always fetches '
+                             'the original')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT,
+                        help='Per-request timeout for fetch tasks (seconds)')
+    parser.add_argument('--processes', type=int, default=1, help='Worker processes to start (work)')
+    parser.add_argument('--lease', type=float, default=DEFAULT_LEASE, help='Lease length in seconds')
+    parser.set_defaults(func=run)
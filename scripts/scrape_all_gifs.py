@@ -3,22 +3,22 @@
 Comprehensive Exercise GIF Scraper
 Scrapes exercise GIFs from multiple fitness websites
 
+Real GIF URLs are found from each site's sitemaps and exercise pages
+(see pipeline/discover.py) instead of guessing upload paths. Discovered
+URLs are cached, so re-running only looks up exercises that were not
+resolved recently.
+
 Usage:
     python3 scripts/scrape_all_gifs.py
+    python3 scripts/scrape_all_gifs.py --refresh   # ignore cached lookups
 """
 
-import os
 import sys
-import urllib.request
-import urllib.error
-from pathlib import Path
-import time
-import re
-from html.parser import HTMLParser
 
-SCRIPT_DIR = Path(__file__).parent
-PROJECT_ROOT = SCRIPT_DIR.parent
-OUTPUT_DIR = PROJECT_ROOT / "public" / "exercise-gifs"
+from pipeline.config import OUTPUT_DIR, format_size, to_kebab_case
+from pipeline.discover import Discovery, DiscoveryCache
+from pipeline.fetcher import FetchError, download
+from pipeline.hostlimits import HostLimiter
 
 # ===== EXERCISE DATABASES =====
 
@@ -69,98 +69,43 @@ EXERCISES = [
     "V-Ups", "Hollow Hold", "Dragon Flag",
 ]
 
-# URL patterns for different websites
-URL_PATTERNS = {
-    'fitnessprogramer': [
-        "https://fitnessprogramer.com/wp-content/uploads/2021/02/{}-{}.gif",
-        "https://fitnessprogramer.com/wp-content/uploads/2021/04/{}-{}.gif",
-        "https://fitnessprogramer.com/wp-content/uploads/2022/02/{}-{}.gif",
-    ],
-}
-
-def to_kebab_case(text):
-    """Convert exercise name to kebab-case"""
-    return text.lower().replace(' ', '-').replace('_', '-')
-
-def to_title_case(text):
-    """Convert to Title Case for URLs"""
-    return '-'.join(word.capitalize() for word in text.split())
-
-def format_size(size_bytes):
-    """Format bytes to MB"""
-    return f"{size_bytes / (1024 * 1024):.2f} MB"
-
-def download_file(url, filepath):
-    """Download a file from URL"""
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-    }
-    req = urllib.request.Request(url, headers=headers)
-    
-    with urllib.request.urlopen(req, timeout=10) as response:
-        if response.status != 200:
-            raise Exception(f"HTTP {response.status}")
-        
-        with open(filepath, 'wb') as f:
-            f.write(response.read())
+def try_download_exercise(exercise_name, entry, limiter):
+    """Download an exercise GIF from its discovered URL"""
+    filepath = OUTPUT_DIR / f"{to_kebab_case(exercise_name)}.gif"
 
-def try_download_exercise(exercise_name, patterns):
-    """Try to download an exercise GIF from multiple URL patterns"""
-    filename = f"{to_kebab_case(exercise_name)}.gif"
-    filepath = OUTPUT_DIR / filename
-    
     # Skip if already exists
     if filepath.exists():
         return 'skip', 0
-    
-    # Try different URL patterns
-    kebab = to_kebab_case(exercise_name)
-    title = to_title_case(exercise_name)
-    
-    url_variants = []
-    
-    # Generate URL variants for FitnessProgramer
-    for pattern in patterns.get('fitnessprogramer', []):
-        # Handle different word counts safely
-        parts = exercise_name.split()
-        
-        try:
-            if len(parts) == 1:
-                # Single word: "Plank" -> "Plank"
-                single_pattern = pattern.replace("{}-{}", "{}")
-                url_variants.append(single_pattern.format(title))
-            elif len(parts) == 2:
-                # Two words: "Bench Press" -> "Bench-Press"
-                url_variants.append(pattern.format(parts[0].capitalize(), parts[1].capitalize()))
-            elif len(parts) >= 3:
-                # Three+ words: "Close Grip Bench Press" -> "Close-Grip-Bench-Press"
-                url_variants.append(pattern.replace("{}-{}", "{}").format(title))
-        except:
-            # If format fails, try kebab case
-            url_variants.append(pattern.replace("{}-{}", "{}").format(title))
-    
-    # Try each URL
-    for url in url_variants:
-        url = url.replace('--', '-').rstrip('-').replace('--', '-')
-        try:
-            download_file(url, filepath)
-            size = filepath.stat().st_size
-            if size > 1000:  # At least 1KB
-                return 'success', size
-            else:
-                filepath.unlink()
-        except:
-            continue
-    
-    return 'fail', 0
+    if not entry or not entry["url"]:
+        return 'fail', 0
+
+    try:
+        result = download(entry["url"], filepath, timeout=10, limiter=limiter)
+    except FetchError:
+        return 'fail', 0
+    return 'success', result["bytes"]
 
 def main():
+    refresh = '--refresh' in sys.argv[1:]
     print("🌐 Comprehensive Exercise GIF Scraper\n")
     print(f"Searching for {len(EXERCISES)} exercises across multiple websites...\n")
     
     # Create output directory
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
     
+    # Look up only what is missing on disk; sitemaps and pages are fetched concurrently
+    missing = [name for name in dict.fromkeys(EXERCISES)
+               if not (OUTPUT_DIR / f"{to_kebab_case(name)}.gif").exists()]
+    cache = DiscoveryCache(refresh=refresh)
+    limiter = HostLimiter()
+    discovery = Discovery(cache, limiter)
+    try:
+        found = discovery.resolve(missing)
+    finally:
+        cache.save()
+    print(f"🔎 Discovered {sum(1 for entry in found.values() if entry['url'])}/{len(missing)} "
+          f"missing exercise(s) with {discovery.requests} request(s)\n")
+    
     success_count = 0
     skip_count = 0
     fail_count = 0
@@ -169,7 +114,7 @@ def main():
         progress = f"[{i}/{len(EXERCISES)}]"
         print(f"{progress} {exercise}... ", end='', flush=True)
         
-        result, size = try_download_exercise(exercise, URL_PATTERNS)
+        result, size = try_download_exercise(exercise, found.get(exercise), limiter)
         
         if result == 'skip':
             print("⏭️  (already exists)")
@@ -177,15 +122,11 @@ def main():
         elif result == 'success':
             print(f"✅ ({format_size(size)})")
             success_count += 1
-            time.sleep(0.3)  # Be nice to servers
         else:
             print("❌")
             fail_count += 1
-        
-        # Brief pause every 10 requests
-        if i % 10 == 0:
-            time.sleep(1)
     
+    limiter.save()
     print("\n" + "="*60)
     print(f"✅ Successfully downloaded: {success_count}")
     if skip_count > 0:
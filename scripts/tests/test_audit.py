@@ -0,0 +1,37 @@
+import pytest
+
+from pipeline.audit import Malformed, Truncated, check_gif
+
+def gif(frames=1, width=3, height=2):
+    """A minimal GIF: global color table, then frames of one LZW sub-block each"""
+    data = b'GIF89a' + width.to_bytes(2, 'little') + height.to_bytes(2, 'little') + bytes([0x80, 0, 0])
+    data += b'\0' * 6  # two-entry color table
+    data += b'\x21\xf9\x04\x00\x0a\x00\x00\x00'  # graphic control extension
+    for _ in range(frames):
+        data += b'\x2c' + bytes(4) + width.to_bytes(2, 'little') + height.to_bytes(2, 'little') + b'\x00'
+        data += b'\x02\x02\x44\x01\x00'
+    return data + b'\x3b'
+
+def test_check_gif():
+    assert check_gif(gif(frames=3, width=48, height=32)) == {"frames": 3, "width": 48, "height": 32}
+
+def test_check_gif_accepts_memoryview():
+    assert check_gif(memoryview(gif()))["frames"] == 1
+
+@pytest.mark.parametrize("cut", [5, 20, -1, -3])
+def test_check_gif_truncated(cut):
+    with pytest.raises(Truncated):
+        check_gif(gif()[:cut])
+
+def test_check_gif_bad_signature():
+    with pytest.raises(Malformed):
+        check_gif(b'PNG89a' + gif()[6:])
+
+def test_check_gif_without_frames():
+    with pytest.raises(Malformed):
+        check_gif(gif(frames=0))
+
+def test_check_gif_unknown_block():
+    data = gif()
+    with pytest.raises(Malformed):
+        check_gif(data[:-1] + b'\x99' + data[-1:])
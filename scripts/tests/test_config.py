@@ -0,0 +1,19 @@
+import pytest
+
+from pipeline.config import PipelineError, parse_size
+
+@pytest.mark.parametrize("value, expected", [
+    ('1048576', 1048576),
+    ('750KB', 750 * 1024),
+    ('5MB', 5 * 1024 ** 2),
+    ('1.5 mb', int(1.5 * 1024 ** 2)),
+    ('2G', 2 * 1024 ** 3),
+    (4096, 4096),
+])
+def test_parse_size(value, expected):
+    assert parse_size(value) == expected
+
+@pytest.mark.parametrize("value", ['', 'MB', '5TB', 'five', '1.2.3MB'])
+def test_parse_size_rejects(value):
+    with pytest.raises(PipelineError):
+        parse_size(value)
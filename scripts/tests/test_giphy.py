@@ -0,0 +1,33 @@
+from pipeline.giphy import ORIGINAL, choose, media_id
+
+def rendition(width, size):
+    return {"width": width, "height": width, "bytes": size}
+
+RENDITIONS = {
+    '100w.gif': rendition(100, 50_000),
+    '200w.gif': rendition(200, 150_000),
+    '200.gif': None,
+    'giphy-downsized.gif': rendition(480, 400_000),
+    ORIGINAL: rendition(600, 900_000),
+}
+
+def test_choose_smallest_wide_enough():
+    assert choose(RENDITIONS, 480) == 'giphy-downsized.gif'
+    assert choose(RENDITIONS, 150) == '200w.gif'
+    assert choose(RENDITIONS, 100) == '100w.gif'
+
+def test_choose_caps_target_at_the_widest():
+    assert choose(RENDITIONS, 1000) == ORIGINAL
+
+def test_choose_prefers_known_sizes():
+    renditions = {**RENDITIONS, 'giphy-downsized.gif': rendition(480, None)}
+    assert choose(renditions, 480) == ORIGINAL
+
+def test_choose_nothing_answered():
+    assert choose({name: None for name in RENDITIONS}) is None
+
+def test_media_id():
+    assert media_id('https://media.giphy.com/media/abc123/giphy.gif') == 'abc123'
+    assert media_id('https://media2.giphy.com/media/abc123/200w.gif') == 'abc123'
+    assert media_id('https://i.giphy.com/abc123.gif') == 'abc123'
+    assert media_id('https://example.com/media/abc123/giphy.gif') is None
@@ -0,0 +1,33 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from pipeline.loop_trim import find_loop
+
+def clip(period, repetitions, lead_in=0, size=64, seed=1):
+    """Frame vectors for a clip that repeats every period frames after lead_in unrelated ones"""
+    rng = np.random.default_rng(seed)
+    cycle = rng.random((period, size), dtype=np.float32)
+    frames = [rng.random(size, dtype=np.float32) for _ in range(lead_in)]
+    frames += [cycle[i % period] for i in range(period * repetitions)]
+    return np.stack(frames)
+
+@pytest.mark.parametrize("period, repetitions", [(4, 2), (6, 3), (12, 4)])
+def test_find_loop_period(period, repetitions):
+    found, _, seam_error = find_loop(clip(period, repetitions))
+    assert found == period
+    assert seam_error == pytest.approx(0, abs=1e-6)
+
+def test_find_loop_skips_lead_in():
+    found, start, _ = find_loop(clip(8, 3, lead_in=3))
+    assert found == 8
+    assert start >= 3
+
+def test_find_loop_single_repetition():
+    assert find_loop(clip(10, 1)) is None
+
+def test_find_loop_still_clip():
+    assert find_loop(np.zeros((20, 64), dtype=np.float32)) is None
+
+def test_find_loop_too_short():
+    assert find_loop(clip(3, 2), min_period=4) is None
@@ -0,0 +1,45 @@
+import hashlib
+
+import pytest
+
+from pipeline.config import PipelineError
+from pipeline.pack import HEADER, PackReader, parse_header, parse_index, write_pack
+
+@pytest.fixture
+def members(tmp_path):
+    files = {'squat.gif': b'GIF89a' + b'\1' * 5000, 'plank.gif': b'GIF89a' + b'\2' * 10, 'empty.gif': b''}
+    paths = []
+    for name, data in files.items():
+        (tmp_path / name).write_bytes(data)
+        paths.append((name, tmp_path / name))
+    return files, paths
+
+def test_write_pack_round_trip(tmp_path, members):
+    files, paths = members
+    pack = tmp_path / "packs" / "all.pack"
+    entries = write_pack(pack, paths, alignment=512)
+
+    data = pack.read_bytes()
+    count, index_length = parse_header(data)
+    index = parse_index(data[HEADER.size:HEADER.size + index_length], count)
+    assert list(index) == [name for name, _ in paths]
+    for entry in entries:
+        assert index[entry.name] == entry
+        assert entry.offset % 512 == 0
+        assert data[entry.offset:entry.offset + entry.length] == files[entry.name]
+        assert entry.sha256 == hashlib.sha256(files[entry.name]).hexdigest()
+    assert not list(pack.parent.glob('*.tmp'))
+
+def test_pack_reader(tmp_path, members):
+    files, paths = members
+    pack = tmp_path / "all.pack"
+    write_pack(pack, paths)
+    with PackReader(pack) as reader:
+        assert reader.names() == list(files)
+        assert bytes(reader.read('squat.gif')) == files['squat.gif']
+        assert reader.verify() == []
+
+@pytest.mark.parametrize("data", [b'EXPK', b'NOPE' + bytes(12), b'EXPK\x09\x00' + bytes(10)])
+def test_parse_header_rejects(data):
+    with pytest.raises(PipelineError):
+        parse_header(data)
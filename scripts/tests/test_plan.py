@@ -0,0 +1,37 @@
+import pytest
+
+from pipeline import plan
+from pipeline.sources import FetchTask
+
+@pytest.mark.parametrize("result, expected", [
+    ({"status": 200, "bytes": 50_000, "content_type": 'image/gif'}, 'ok'),
+    ({"status": 200, "bytes": None, "content_type": 'image/gif'}, 'ok'),
+    ({"status": 200, "bytes": 50_000, "content_type": 'text/html'}, 'bad'),
+    ({"status": 200, "bytes": 10, "content_type": 'image/gif'}, 'bad'),
+    ({"status": 404}, 'bad'),
+    ({"status": 405}, 'unknown'),
+    ({"status": None, "error": 'timed out'}, 'unreachable'),
+    ({"status": 503}, 'unreachable'),
+])
+def test_verdict(result, expected):
+    assert plan.verdict(result) == expected
+
+class Limiter:
+    def rank(self, urls, probe=True):
+        return list(urls)
+
+def test_unreachable_candidates_stay_in_the_plan(tmp_path, monkeypatch):
+    results = {
+        'https://a.example/x.gif': {"status": None, "error": 'timed out'},
+        'https://b.example/x.gif': {"status": 404},
+        'https://c.example/x.gif': {"status": 405},
+    }
+    monkeypatch.setattr(plan, 'head', lambda url, timeout, limiter: results[url])
+    cache = plan.HeadCache(tmp_path / "head-cache.json")
+    task = FetchTask('x', 'X', 'x.gif', list(results), ['test'])
+
+    entry = plan.plan_task(task, cache, Limiter(), 5)
+    assert entry["action"] == 'fetch'
+    assert entry["candidates"] == ['https://c.example/x.gif', 'https://a.example/x.gif']
+    # Only real answers are cached
+    assert set(cache.entries) == {'https://b.example/x.gif', 'https://c.example/x.gif'}
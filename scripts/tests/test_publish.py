@@ -0,0 +1,44 @@
+import pytest
+
+from pipeline.config import PipelineError
+from pipeline.publish import build_manifest, diff_manifests, load_publish_manifest
+
+def manifest(files=None):
+    """A publish manifest from {path: sha256}"""
+    return {"version": 1, "files": {path: {"sha256": sha, "bytes": 1} for path, sha in (files or {}).items()}}
+
+def test_diff_manifests():
+    local = manifest({'index.html': 'a', 'gifs/squat.gif': 'b', 'gifs/plank.gif': 'c'})
+    deployed = manifest({'index.html': 'a', 'gifs/squat.gif': 'old', 'gifs/lunge.gif': 'd'})
+    assert diff_manifests(local, deployed) == {
+        "add": ['gifs/plank.gif'],
+        "change": ['gifs/squat.gif'],
+        "remove": ['gifs/lunge.gif'],
+        "unchanged": ['index.html'],
+    }
+
+def test_diff_without_deployed_manifest_uploads_everything():
+    delta = diff_manifests(manifest({'a.gif': '1', 'b.gif': '2'}), None)
+    assert delta["add"] == ['a.gif', 'b.gif'] and not delta["change"] and not delta["remove"]
+
+@pytest.mark.parametrize("path", ['../etc/passwd', '/etc/passwd', 'gifs/../../x'])
+def test_diff_rejects_unsafe_removals(path):
+    deployed = {"version": 1, "files": {path: {"sha256": 'x', "bytes": 1}}}
+    with pytest.raises(PipelineError):
+        diff_manifests(manifest(), deployed)
+
+def test_build_manifest_round_trip(tmp_path):
+    (tmp_path / "gifs").mkdir()
+    (tmp_path / "gifs" / "squat.gif").write_bytes(b'GIF89a')
+    (tmp_path / "index.html").write_text('<html>')
+    built = build_manifest(tmp_path)
+    assert sorted(built["files"]) == ['gifs/squat.gif', 'index.html']
+    assert diff_manifests(built, built)["unchanged"] == ['gifs/squat.gif', 'index.html']
+
+def test_load_publish_manifest_tolerates_garbage(tmp_path):
+    path = tmp_path / "publish-manifest.json"
+    assert load_publish_manifest(path) is None
+    path.write_text('{"trunc')
+    assert load_publish_manifest(path) is None
+    path.write_text('{"version": 99, "files": {}}')
+    assert load_publish_manifest(path) is None
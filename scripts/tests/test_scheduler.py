@@ -0,0 +1,54 @@
+import threading
+import time
+
+from pipeline.hostlimits import HostLimiter, REPROBE_INTERVAL
+from pipeline.scheduler import PriorityScheduler
+from pipeline.sources import FetchTask
+
+def task(name, *urls):
+    return FetchTask(name, name, f"{name}.gif", list(urls), ['test'])
+
+def limiter(tmp_path):
+    return HostLimiter(tmp_path / "host-limits.json")
+
+def test_hands_out_the_order_the_download_uses(tmp_path):
+    hosts = limiter(tmp_path)
+    for _ in range(5):
+        hosts.record('down.example', False)
+    hosts.hosts['down.example'].last_attempt = time.time() - REPROBE_INTERVAL - 1
+    urls = ['https://up.example/a.gif', 'https://down.example/a.gif']
+    scheduler = PriorityScheduler([task('a', *urls), task('b', *urls)], {}, hosts)
+    # The demoted host is reprobed once per run: first task only
+    assert scheduler.next().candidates == ['https://down.example/a.gif', 'https://up.example/a.gif']
+    assert scheduler.next().candidates == urls
+
+def test_full_host_is_skipped_for_a_free_one(tmp_path):
+    hosts = limiter(tmp_path)
+    hosts.acquire('busy.example')
+    hosts.acquire('busy.example')
+    scheduler = PriorityScheduler([task('a', 'https://busy.example/a.gif'), task('b', 'https://free.example/b.gif')],
+                                  {'a.gif': 10}, hosts)
+    assert scheduler.next().name == 'b'
+
+def test_waits_for_a_release(tmp_path):
+    hosts = limiter(tmp_path)
+    hosts.acquire('busy.example')
+    hosts.acquire('busy.example')
+    scheduler = PriorityScheduler([task('a', 'https://busy.example/a.gif')], {}, hosts)
+    got = []
+    worker = threading.Thread(target=lambda: got.append(scheduler.next()))
+    worker.start()
+    time.sleep(0.2)
+    assert not got
+    hosts.release('busy.example')
+    worker.join(2)
+    assert got and got[0].name == 'a'
+
+def test_deadline_ends_the_wait(tmp_path):
+    hosts = limiter(tmp_path)
+    hosts.acquire('busy.example')
+    hosts.acquire('busy.example')
+    scheduler = PriorityScheduler([task('a', 'https://busy.example/a.gif')], {}, hosts,
+                                  deadline=time.monotonic() + 0.2)
+    assert scheduler.next() is None
+    assert [t.name for t in scheduler.remaining()] == ['a']
@@ -0,0 +1,23 @@
+import pytest
+
+from pipeline.config import PipelineError
+from pipeline.sprites import build_sheet, group_files
+
+def test_empty_catalog_has_no_groups():
+    assert group_files([], 'all') == {}
+
+def test_build_sheet_rejects_an_empty_group():
+    with pytest.raises(PipelineError):
+        build_sheet([], 64)
+
+def test_build_sheet_layout(tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+    files = []
+    for i in range(5):
+        path = tmp_path / f"{i}.gif"
+        Image.new('RGB', (40, 20), (i * 40, 0, 0)).save(path)
+        files.append(path)
+    data, size, rects = build_sheet(files, 32)
+    assert data[:4] == b'RIFF'
+    assert size == (3 * 32, 2 * 32)
+    assert rects['4.gif'] == {"x": 32, "y": 32, "w": 32, "h": 32}
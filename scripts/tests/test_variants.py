@@ -0,0 +1,28 @@
+import pytest
+
+from pipeline.variants import WIDTHS, parse_range, snap_width
+
+@pytest.mark.parametrize("header, expected", [
+    ('bytes=0-9', (0, 9)),
+    ('bytes=10-', (10, 99)),
+    ('bytes=90-500', (90, 99)),
+    ('bytes=-10', (90, 99)),
+    ('bytes=-500', (0, 99)),
+    (' bytes=5-5 ', (5, 5)),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 100) == expected
+
+@pytest.mark.parametrize("header", ['bytes=100-', 'bytes=50-10', 'bytes=-0'])
+def test_parse_range_unsatisfiable(header):
+    assert parse_range(header, 100) == 'unsatisfiable'
+
+@pytest.mark.parametrize("header", ['bytes=0-1,5-9', 'bytes=-', 'items=0-9', 'garbage'])
+def test_parse_range_falls_back_to_full_response(header):
+    assert parse_range(header, 100) is None
+
+def test_snap_width():
+    assert snap_width(1) == WIDTHS[0]
+    assert snap_width(320) == 320
+    assert snap_width(321) == 480
+    assert snap_width(10 ** 6) == WIDTHS[-1]
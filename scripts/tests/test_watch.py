@@ -0,0 +1,34 @@
+from pipeline.manifest import file_sha256
+from pipeline.sourcecache import SourceCache
+from pipeline.watch import split_edited
+
+def write_gif(directory, name, body):
+    path = directory / name
+    path.write_bytes(b'GIF89a' + body)
+    return path
+
+def test_fetched_in_the_same_batch_is_new(tmp_path):
+    cache = SourceCache(tmp_path / "sources")
+    baseline = cache.published()
+    # The batch's fetch step downloads the GIF and indexes it before watch looks
+    path = write_gif(tmp_path, 'squat.gif', b'fetched')
+    cache.add(path, 'https://example.com/squat.gif', 'squat.gif')
+    assert split_edited(['squat.gif'], {}, baseline, tmp_path) == (['squat.gif'], [])
+
+def test_restored_original_is_not_new(tmp_path):
+    cache = SourceCache(tmp_path / "sources")
+    cache.add(write_gif(tmp_path, 'squat.gif', b'original'), filename='squat.gif')
+    baseline = cache.published()
+    write_gif(tmp_path, 'squat.gif', b'original')
+    assert split_edited(['squat.gif'], {}, baseline, tmp_path) == ([], ['squat.gif'])
+
+def test_pipeline_output_is_not_new(tmp_path):
+    path = write_gif(tmp_path, 'squat.gif', b'trimmed')
+    assets = {'squat.gif': {"loop": {"output_sha256": file_sha256(path)}}}
+    assert split_edited(['squat.gif'], assets, {}, tmp_path) == ([], ['squat.gif'])
+
+def test_changed_by_hand_is_new(tmp_path):
+    trimmed = file_sha256(write_gif(tmp_path, 'squat.gif', b'trimmed'))
+    write_gif(tmp_path, 'squat.gif', b'edited by hand')
+    assets = {'squat.gif': {"sha256": trimmed}}
+    assert split_edited(['squat.gif'], assets, {}, tmp_path) == (['squat.gif'], [])
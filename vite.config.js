@@ -1,8 +1,38 @@
 import { defineConfig } from 'vite'
 import react from '@vitejs/plugin-react'
+import fs from 'node:fs'
+import path from 'node:path'
+
+// Published media catalog (scripts/media_pipeline.py release). When it exists,
+// /exercise-gifs comes from the current snapshot instead of the working copy in public/
+const catalogLink = path.resolve('.media-cache/catalog/current')
+const catalogTypes = { '.gif': 'image/gif', '.webp': 'image/webp', '.json': 'application/json', '.gz': 'application/gzip' }
+
+function exerciseCatalog() {
+  return {
+    name: 'exercise-catalog',
+    configureServer(server) {
+      server.middlewares.use('/exercise-gifs', (req, res, next) => {
+        if (!fs.existsSync(catalogLink)) return next()
+        // Resolve the symlink once per request so a response never mixes versions
+        const root = fs.realpathSync(catalogLink)
+        const file = path.join(root, decodeURIComponent(req.url.split('?')[0]))
+        if (!file.startsWith(root + path.sep) || !fs.statSync(file, { throwIfNoEntry: false })?.isFile()) return next()
+        res.setHeader('Content-Type', catalogTypes[path.extname(file)] || 'application/octet-stream')
+        fs.createReadStream(file).pipe(res)
+      })
+    },
+    writeBundle(options) {
+      if (!fs.existsSync(catalogLink)) return
+      const target = path.join(options.dir, 'exercise-gifs')
+      fs.rmSync(target, { recursive: true, force: true })
+      fs.cpSync(fs.realpathSync(catalogLink), target, { recursive: true })
+    }
+  }
+}
 
 export default defineConfig({
-  plugins: [react()],
+  plugins: [react(), exerciseCatalog()],
   server: {
     port: 3000,
     host: true